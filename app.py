@@ -8,9 +8,12 @@ import traceback
 import threading
 import uuid
 import re
-import sqlite3
 import json
 import random
+import socket
+import hashlib
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText           # ← 修正這行
 from email.mime.multipart import MIMEMultipart # ← 修正這行
 from datetime import datetime, date, timedelta
@@ -19,6 +22,19 @@ import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseUpload
+from gspread.utils import rowcol_to_a1
+from task_queue import (
+    TaskQueue, DEFAULT_LEASE_SECONDS, DEFAULT_AGING_SECONDS, PRIORITY_INTERACTIVE, PRIORITY_APPEAL, PRIORITY_BULK,
+)
+from sheet_replica import SheetReplica
+from reference_data import (
+    clean_id, values_to_frame, parse_settings, parse_roster, parse_sorted_classes,
+    parse_teacher_emails, parse_inspector_list, parse_duty, DEFAULT_INSPECTORS,
+)
+from scoring import approved_record_ids, entry_deductions, filter_range, day_totals, parse_dates
+from score_table import ScoreTable
+from image_processing import process_image, detect_format, mimetype_for
+from thumbnail_cache import ThumbnailCache
 
 # --- 1. 網頁設定 ---
 st.set_page_config(page_title="衛生糾察評分系統(雲端旗艦版)", layout="wide", page_icon="🧹")
@@ -32,6 +48,36 @@ try:
 
     MAX_IMAGE_BYTES = 10 * 1024 * 1024  # 單檔圖片 10MB 上限
     QUEUE_DB_PATH = "task_queue.db"     # SQLite 佇列檔案
+    WORKER_BATCH_SIZE = 20              # 背景 worker 批次模式每次最多領取的任務數
+    TASK_LEASE_SECONDS = DEFAULT_LEASE_SECONDS  # 任務租約長度，worker 當掉後超過此時間任務會被其他 worker 接手
+    QUEUE_AGING_SECONDS = DEFAULT_AGING_SECONDS  # 任務每排隊這麼久優先權提高一級，整批任務不會一直被插隊
+    # 任務種類 → 優先順序分道：糾察單筆評分 > 申訴 > 整批登錄
+    TASK_PRIORITIES = {
+        "main_entry": PRIORITY_INTERACTIVE,
+        "appeal_entry": PRIORITY_APPEAL,
+        "main_entry_bulk": PRIORITY_BULK,
+    }
+    IDLE_POLL_MIN_SECONDS = 0.2         # 佇列空閒時的輪詢間隔（起始值）
+    IDLE_POLL_MAX_SECONDS = 5.0         # 佇列空閒時的輪詢間隔（上限，逐次加倍）
+    QUEUE_RETENTION_DAYS = 7            # DONE / FAILED 任務保留天數，之後搬到封存檔（可用 system_config.queue_retention_days 覆寫）
+    QUEUE_MAINTENANCE_INTERVAL = 3600   # 佇列封存／清理暫存照片的執行間隔（秒）
+    ORPHAN_IMAGE_GRACE_SECONDS = 3600   # 暫存照片至少存在這麼久、且沒有任務引用才會被刪除
+    REPLICA_DB_PATH = "sheet_replica.db"  # main_data / appeals 本機唯讀副本
+    REPLICA_SYNC_SECONDS = 120          # 副本定期同步間隔（秒）；背景寫入完成後會立即觸發同步
+    # 平常只抓新增的列（刪除、插入列與改表頭會被偵測到並改為整份重抓）；每隔這麼久整份重抓一次。
+    # 直接在試算表上修改既有列的儲存格（紀錄ID / 登錄時間以外）最多會有這麼久看不到。
+    REPLICA_FULL_SYNC_SECONDS = 1800
+    SCORE_DB_PATH = REPLICA_DB_PATH     # 成績彙總表（每日／每週扣分）與副本放在同一個檔案
+    UPLOAD_MAX_WORKERS = 4              # 同時上傳 Drive 的照片數上限
+    RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024  # 超過此大小改用可續傳分段上傳
+    UPLOAD_CHUNK_SIZE = 1024 * 1024     # 分段上傳每段大小（須為 256KB 的倍數）
+    IMAGE_MAX_EDGE = 1600               # 上傳前照片長邊縮到此像素（可用 system_config.image_max_edge 覆寫）
+    IMAGE_JPEG_QUALITY = 80             # 重新壓縮的 JPEG 品質（可用 system_config.image_quality 覆寫）
+    THUMBNAIL_EDGE = 320                # 頁面顯示用縮圖的長邊像素（可用 system_config.thumbnail_edge 覆寫）
+    THUMBNAIL_CACHE_DB_PATH = "thumbnail_cache.db"  # 縮圖本機快取
+    THUMBNAIL_CACHE_MB = 64             # 縮圖快取大小上限，超過時淘汰最久沒看的（可用 system_config.thumbnail_cache_mb 覆寫）
+    THUMBNAIL_FETCH_TIMEOUT = 10        # 快取沒有時向 Drive 抓縮圖的逾時（秒）
+    RECORDS_PER_PAGE = 10               # 衛生股長頁每頁顯示的紀錄數
     
     # Google Sheet 網址
     SHEET_URL = "https://docs.google.com/spreadsheets/d/1nrX4v-K0xr-lygiBXrBwp4eWiNi9LY0-LIr-K1vBHDw/edit#gid=0"
@@ -111,8 +157,33 @@ try:
                 else: print(f"❌ 讀取分頁 '{tab_name}' 失敗: {e}"); return None
         return None
 
-    def upload_image_to_drive(file_obj, filename):
-        service = get_drive_service()
+    @st.cache_resource
+    def _get_drive_thread_local():
+        return threading.local()
+
+    def get_thread_drive_service():
+        """
+        googleapiclient 的 service 物件不是 thread-safe，
+        上傳執行緒池中每條執行緒各自建立一個 Drive service。
+        """
+        local = _get_drive_thread_local()
+        service = getattr(local, "service", None)
+        if service is None:
+            try:
+                creds = get_credentials()
+                if not creds: return None
+                service = build('drive', 'v3', credentials=creds, cache_discovery=False)
+            except Exception as e:
+                print(f"⚠️ Google Drive 連線失敗: {e}"); return None
+            local.service = service
+        return service
+
+    def _drive_thumbnail_link(file_id: str) -> str:
+        return f"https://drive.google.com/thumbnail?id={file_id}&sz=w1000"
+
+    def _upload_file_to_drive(file_obj, filename, service=None, mimetype='image/jpeg') -> str | None:
+        """上傳檔案到 Drive 並開放檢視權限，回傳 Drive file id（失敗回傳 None）。"""
+        service = service or get_drive_service()
         if not service: return None
         
         folder_id = st.secrets["system_config"].get("drive_folder_id")
@@ -122,23 +193,193 @@ try:
 
         try:
             file_metadata = {'name': filename, 'parents': [folder_id]}
-            media = MediaIoBaseUpload(file_obj, mimetype='image/jpeg')
-            file = service.files().create(
-                body=file_metadata, media_body=media, fields='id', supportsAllDrives=True
-            ).execute()
+            size = file_obj.seek(0, io.SEEK_END); file_obj.seek(0)
+            if size > RESUMABLE_UPLOAD_THRESHOLD:
+                # 大檔用可續傳分段上傳，單段失敗只需重送該段
+                media = MediaIoBaseUpload(file_obj, mimetype=mimetype, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+                request = service.files().create(
+                    body=file_metadata, media_body=media, fields='id', supportsAllDrives=True
+                )
+                file = None
+                while file is None:
+                    _, file = request.next_chunk(num_retries=3)
+            else:
+                media = MediaIoBaseUpload(file_obj, mimetype=mimetype)
+                file = service.files().create(
+                    body=file_metadata, media_body=media, fields='id', supportsAllDrives=True
+                ).execute()
             
             try:
                 service.permissions().create(fileId=file.get('id'), body={'role': 'reader', 'type': 'anyone'}).execute()
             except: pass 
-            return f"https://drive.google.com/thumbnail?id={file.get('id')}&sz=w1000"
+            return file.get('id')
         except Exception as e:
             print(f"⚠️ Drive 上傳失敗: {str(e)}"); return None
 
-    def clean_id(val):
+    def _file_sha256(path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @st.cache_resource
+    def get_upload_executor():
+        return ThreadPoolExecutor(max_workers=UPLOAD_MAX_WORKERS, thread_name_prefix="drive-upload")
+
+    def _image_settings() -> tuple[int, int, int]:
+        """(長邊上限, JPEG 品質, 縮圖長邊)，secrets 的 system_config 可覆寫。"""
+        try:
+            cfg = st.secrets["system_config"]
+            return (int(cfg.get("image_max_edge", IMAGE_MAX_EDGE)), int(cfg.get("image_quality", IMAGE_JPEG_QUALITY)),
+                    int(cfg.get("thumbnail_edge", THUMBNAIL_EDGE)))
+        except Exception:
+            return IMAGE_MAX_EDGE, IMAGE_JPEG_QUALITY, THUMBNAIL_EDGE
+
+    def _drive_file_id(link: str) -> str | None:
+        m = re.search(r"[?&]id=([\w-]+)", link or "")
+        return m.group(1) if m else None
+
+    @st.cache_resource
+    def get_thumbnail_cache() -> ThumbnailCache:
+        try:
+            max_mb = float(st.secrets["system_config"].get("thumbnail_cache_mb", THUMBNAIL_CACHE_MB))
+        except Exception:
+            max_mb = THUMBNAIL_CACHE_MB
+        return ThumbnailCache(THUMBNAIL_CACHE_DB_PATH, max_bytes=int(max_mb * 1024 * 1024))
+
+    @st.cache_resource
+    def get_thumbnail_fetch_executor():
+        return ThreadPoolExecutor(max_workers=4, thread_name_prefix="thumb-fetch")
+
+    def _save_thumbnail(file_id: str, data: bytes):
+        try:
+            get_thumbnail_cache().put(file_id, data)
+        except Exception as e:
+            print(f"⚠️ 縮圖寫入快取失敗 ({file_id}): {e}")
+
+    def _fetch_drive_thumbnail(file_id: str) -> bytes | None:
+        """向 Drive 抓一張縮圖（照片已開放檢視權限，不需憑證）並放進快取；失敗回傳 None。"""
+        url = f"https://drive.google.com/thumbnail?id={file_id}&sz=w{_image_settings()[2]}"
+        try:
+            with urllib.request.urlopen(url, timeout=THUMBNAIL_FETCH_TIMEOUT) as resp:
+                data = resp.read()
+        except Exception as e:
+            print(f"⚠️ 縮圖下載失敗 ({file_id}): {e}")
+            return None
+        if not detect_format(data):
+            return None
+        _save_thumbnail(file_id, data)
+        return data
+
+    def photo_display_sources(links: list[str]) -> list:
+        """
+        頁面顯示照片用：Drive 照片改用本機快取的縮圖 bytes，快取沒有的先向 Drive 抓一次（同時抓多張）再存入快取；
+        抓不到的沿用原連結，本機暫存路徑原樣回傳。
+        """
+        ids = [_drive_file_id(link) for link in links]
+        wanted = [i for i in ids if i]
+        if not wanted:
+            return list(links)
         try:
-            if pd.isna(val) or val == "": return ""
-            return str(int(float(val))).strip()
-        except: return str(val).strip()
+            cached = get_thumbnail_cache().get_many(wanted)
+        except Exception as e:
+            print(f"⚠️ 讀取縮圖快取失敗: {e}")
+            return list(links)
+        missing = [i for i in dict.fromkeys(wanted) if i not in cached]
+        if missing:
+            fetched = get_thumbnail_fetch_executor().map(_fetch_drive_thumbnail, missing)
+            cached.update({i: data for i, data in zip(missing, fetched) if data})
+        return [cached.get(i, link) if i else link for i, link in zip(ids, links)]
+
+
+    def _upload_one(path: str, filename: str) -> dict:
+        """
+        處理並上傳單一照片，回傳該檔的上傳紀錄。
+        照片先轉正、去除 EXIF、縮到 IMAGE_MAX_EDGE 並重新壓成 JPEG，縮圖放進本機縮圖快取；
+        無法辨識的檔案照原樣上傳（mimetype 依實際內容判斷）。
+        """
+        result = {"path": path, "filename": filename, "file_id": None, "link": None,
+                  "bytes": 0, "original_bytes": 0, "seconds": 0.0}
+        started = time.monotonic()
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            result["original_bytes"] = len(data)
+            max_edge, quality, thumb_edge = _image_settings()
+            processed = process_image(data, max_edge=max_edge, quality=quality, thumbnail_edge=thumb_edge)
+            if processed:
+                body, mimetype = processed["data"], processed["mimetype"]
+                filename = os.path.splitext(filename)[0] + ".jpg"
+            else:
+                body, mimetype = data, mimetype_for(detect_format(data))
+            result["bytes"] = len(body)
+            result["file_id"] = _upload_file_to_drive(io.BytesIO(body), filename, service=get_thread_drive_service(),
+                                                      mimetype=mimetype)
+            if result["file_id"]:
+                result["link"] = _drive_thumbnail_link(result["file_id"])
+                if processed:
+                    _save_thumbnail(result["file_id"], processed["thumbnail"])
+        except Exception as e:
+            print(f"⚠️ Drive 上傳失敗 ({filename}): {e}")
+        result["seconds"] = time.monotonic() - started
+        return result
+
+    def upload_files_parallel(jobs: list[tuple[str, str]], task_ids: list[str] | None = None) -> list[dict]:
+        """
+        以執行緒池同時上傳多張照片（可跨多筆任務），jobs 為 (本機路徑, 檔名)，task_ids 為各照片所屬的任務。
+        每張照片先算內容雜湊：已上傳過的（重試或不同任務的相同照片）直接沿用 upload_checkpoints 的連結，
+        同一批內相同內容也只上傳一次。回傳每個檔案的上傳紀錄（順序與 jobs 相同）。
+        """
+        if not jobs:
+            return []
+        started = time.monotonic()
+
+        results = []
+        for i, (path, filename) in enumerate(jobs):
+            r = {"path": path, "filename": filename, "file_id": None, "link": None, "task_id": task_ids[i] if task_ids else None,
+                 "bytes": 0, "original_bytes": 0, "seconds": 0.0, "hash": None, "reused": False}
+            if path and os.path.exists(path):
+                try:
+                    r["hash"] = _file_sha256(path)
+                except Exception as e:
+                    print(f"⚠️ 計算檔案雜湊失敗 ({filename}): {e}")
+            results.append(r)
+
+        known = get_upload_checkpoints([r["hash"] for r in results if r["hash"]])
+        to_upload: dict[str, tuple[str, str]] = {}
+        owners: dict[str, str | None] = {}
+        for r in results:
+            if not r["hash"]:
+                continue
+            if r["hash"] in known:
+                r["file_id"], r["link"] = known[r["hash"]]
+                r["reused"] = True
+            else:
+                to_upload.setdefault(r["hash"], (r["path"], r["filename"]))
+                owners.setdefault(r["hash"], r["task_id"])
+
+        executor = get_upload_executor()
+        uploaded = dict(zip(to_upload.keys(), executor.map(lambda job: _upload_one(*job), to_upload.values())))
+        for content_hash, u in uploaded.items():
+            if u["file_id"]:
+                save_upload_checkpoint(content_hash, u["file_id"], u["link"], u["filename"], owners[content_hash])
+        for r in results:
+            u = uploaded.get(r["hash"])
+            if u:
+                r.update(file_id=u["file_id"], link=u["link"], bytes=u["bytes"],
+                         original_bytes=u["original_bytes"], seconds=u["seconds"])
+
+        wall = time.monotonic() - started
+        serial = sum(u["seconds"] for u in uploaded.values())
+        ok_count = sum(1 for r in results if r["link"])
+        reused = sum(1 for r in results if r["reused"])
+        total_mb = sum(u["bytes"] for u in uploaded.values()) / (1024 * 1024)
+        original_mb = sum(u["original_bytes"] for u in uploaded.values()) / (1024 * 1024)
+        overlap = serial / wall if wall > 0 else 1.0
+        print(f"📤 照片 {ok_count}/{len(results)} 張就緒（新上傳 {len(uploaded)} 張 {total_mb:.1f} MB，原檔 {original_mb:.1f} MB，沿用 {reused} 張），"
+              f"耗時 {wall:.1f} 秒（逐張合計 {serial:.1f} 秒，重疊 {overlap:.1f} 倍）")
+        return results
 
     # ==========================================
     # 圖片暫存資料夾：只在本機短暫存放，避免記憶體爆掉
@@ -149,97 +390,119 @@ try:
     # ==========================================
     # SQLite 背景佇列系統 (Durable Queue)
     # ==========================================
-    _queue_lock = threading.Lock()
+    @st.cache_resource
+    def get_task_queue() -> TaskQueue:
+        """取得 SQLite 佇列（WAL 模式、每條執行緒各自連線），並初始化資料表。"""
+        return TaskQueue(QUEUE_DB_PATH, aging_seconds=QUEUE_AGING_SECONDS)
 
     @st.cache_resource
-    def get_queue_connection():
-        """取得 SQLite 連線並初始化 task_queue 資料表。"""
-        conn = sqlite3.connect(QUEUE_DB_PATH, check_same_thread=False)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS task_queue (
-                id TEXT PRIMARY KEY,
-                task_type TEXT NOT NULL,
-                created_ts TEXT NOT NULL,
-                payload_json TEXT NOT NULL,
-                status TEXT NOT NULL,          -- PENDING / IN_PROGRESS / RETRY / DONE / FAILED
-                attempts INTEGER NOT NULL DEFAULT 0,
-                last_error TEXT
-            )
-        """)
-        conn.commit()
-        return conn
+    def get_queue_wakeup() -> threading.Event:
+        """新任務入列時用來喚醒閒置中的 worker。"""
+        return threading.Event()
 
     def enqueue_task(task_type: str, payload: dict) -> str:
         """將任務寫入 SQLite 佇列（持久化）。"""
-        conn = get_queue_connection()
-        task_id = str(uuid.uuid4())
-        created_ts = datetime.utcnow().isoformat() + "Z"
-        payload_json = json.dumps(payload, ensure_ascii=False)
-
-        with _queue_lock:
-            conn.execute(
-                "INSERT INTO task_queue (id, task_type, created_ts, payload_json, status, attempts, last_error) "
-                "VALUES (?, ?, ?, ?, 'PENDING', 0, NULL)",
-                (task_id, task_type, created_ts, payload_json)
-            )
-            conn.commit()
+        task_id = get_task_queue().enqueue(task_type, payload, priority=TASK_PRIORITIES.get(task_type, PRIORITY_INTERACTIVE))
+        # 叫醒同一個 process 裡正在閒置等待的 worker
+        get_queue_wakeup().set()
         return task_id
 
-    def fetch_next_task(max_attempts: int = 6):
-        """從佇列中抓出下一筆要處理的任務（PENDING / RETRY，且重試次數未超過上限）。"""
-        conn = get_queue_connection()
-        with _queue_lock:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                SELECT id, task_type, created_ts, payload_json, status, attempts, last_error
-                FROM task_queue
-                WHERE status IN ('PENDING', 'RETRY')
-                  AND attempts < ?
-                ORDER BY created_ts ASC
-                LIMIT 1
-                """,
-                (max_attempts,)
-            )
-            row = cur.fetchone()
-        if not row:
-            return None
+    def claim_tasks(worker_id: str, limit: int = 1, max_attempts: int = 6,
+                    lease_seconds: float = TASK_LEASE_SECONDS) -> list[dict]:
+        """原子性地領取最多 limit 筆任務並寫入租約（詳見 TaskQueue.claim）。"""
+        return get_task_queue().claim(worker_id, limit, max_attempts=max_attempts, lease_seconds=lease_seconds)
 
-        task_id, task_type, created_ts, payload_json, status, attempts, last_error = row
-        try:
-            payload = json.loads(payload_json)
-        except Exception:
-            payload = {}
-        return {
-            "id": task_id,
-            "task_type": task_type,
-            "created_ts": created_ts,
-            "payload": payload,
-            "status": status,
-            "attempts": attempts,
-            "last_error": last_error,
-        }
+    def seconds_until_next_due(max_attempts: int = 6) -> float | None:
+        return get_task_queue().seconds_until_next_due(max_attempts)
 
-    def update_task_status(task_id: str, status: str, attempts: int, last_error: str | None):
-        """更新任務狀態／重試次數／錯誤訊息。"""
-        conn = get_queue_connection()
-        with _queue_lock:
-            conn.execute(
-                "UPDATE task_queue SET status = ?, attempts = ?, last_error = ? WHERE id = ?",
-                (status, attempts, last_error, task_id),
-            )
-            conn.commit()
+    def renew_leases(worker_id: str, task_ids: list[str], lease_seconds: float = TASK_LEASE_SECONDS):
+        get_task_queue().renew_leases(worker_id, task_ids, lease_seconds)
+
+    def update_tasks_status(updates: list[tuple], worker_id: str | None = None) -> list[str]:
+        """批次更新多筆任務狀態（詳見 TaskQueue.update_statuses），回傳實際有更新的 task id。"""
+        return get_task_queue().update_statuses(updates, worker_id=worker_id)
+
+    def get_upload_checkpoints(hashes: list[str]) -> dict[str, tuple[str, str]]:
+        return get_task_queue().get_upload_checkpoints(hashes)
+
+    def save_upload_checkpoint(content_hash: str, file_id: str, link: str, filename: str, task_id: str | None = None):
+        get_task_queue().save_upload_checkpoint(content_hash, file_id, link, filename, task_id)
+
+    def get_queue_lane_stats() -> pd.DataFrame:
+        """各優先順序分道的排隊筆數與等待時間（後台顯示用）。"""
+        stats = get_task_queue().lane_stats()
+        return pd.DataFrame([{
+            "分道": s["lane"], "排隊中": s["queued"], "處理中": s["in_progress"],
+            "最久等待(秒)": round(s["oldest_wait"], 1),
+            "近 1 小時開始處理": s["recent_started"],
+            "平均等待(秒)": round(s["avg_wait"], 1), "最長等待(秒)": round(s["max_wait"], 1),
+        } for s in stats])
 
     def get_queue_pending_count() -> int:
-        """回傳目前尚未處理完的任務數（PENDING / RETRY / IN_PROGRESS）。"""
-        conn = get_queue_connection()
-        with _queue_lock:
-            cur = conn.cursor()
-            cur.execute(
-                "SELECT COUNT(*) FROM task_queue WHERE status IN ('PENDING', 'RETRY', 'IN_PROGRESS')"
-            )
-            row = cur.fetchone()
-        return row[0] if row else 0
+        """回傳目前尚未處理完的任務數（PENDING / RETRY / IN_PROGRESS）；WAL 模式下不會擋住 worker 寫入。"""
+        return get_task_queue().pending_count()
+
+    def _payload_image_paths(payload) -> list[str]:
+        """列出任務 payload 引用的本機暫存照片路徑。"""
+        image_paths = []
+        if isinstance(payload, dict):
+            if "image_paths" in payload and isinstance(payload["image_paths"], list):
+                image_paths.extend(payload["image_paths"])
+            if "image_file" in payload and isinstance(payload["image_file"], dict):
+                p = payload["image_file"].get("path")
+                if p:
+                    image_paths.append(p)
+        return [p for p in image_paths if p]
+
+    def cleanup_orphan_images(grace_seconds: float = ORPHAN_IMAGE_GRACE_SECONDS) -> int:
+        """刪除 IMG_DIR 中沒有任何進行中任務引用、且超過 grace_seconds 的暫存照片，回傳刪除數量。"""
+        referenced = {
+            os.path.abspath(p)
+            for payload in get_task_queue().active_payloads()
+            for p in _payload_image_paths(payload)
+        }
+        removed = 0
+        cutoff = time.time() - grace_seconds
+        for name in os.listdir(IMG_DIR):
+            path = os.path.join(IMG_DIR, name)
+            try:
+                if (os.path.isfile(path) and os.path.abspath(path) not in referenced
+                        and os.path.getmtime(path) < cutoff):
+                    os.remove(path)
+                    removed += 1
+            except Exception as e:
+                print(f"⚠️ 刪除孤兒暫存檔失敗 ({name}): {e}")
+        return removed
+
+    def run_queue_maintenance():
+        """封存過期的 DONE / FAILED 任務、回收資料庫空間、清除沒人引用的暫存照片。"""
+        try:
+            retention_days = float(st.secrets["system_config"].get("queue_retention_days", QUEUE_RETENTION_DAYS))
+        except Exception:
+            retention_days = QUEUE_RETENTION_DAYS
+        archived = get_task_queue().archive_finished(retention_days * 86400)
+        removed = cleanup_orphan_images()
+        if archived or removed:
+            print(f"🧹 佇列維護：封存 {archived} 筆已結束任務，刪除 {removed} 個孤兒暫存檔")
+
+    @st.cache_resource
+    def _get_maintenance_state() -> dict:
+        return {"last_run": 0.0, "lock": threading.Lock()}
+
+    def _maybe_run_maintenance():
+        """worker 閒置時呼叫；每 QUEUE_MAINTENANCE_INTERVAL 秒最多執行一次，同 process 內只有一個 worker 會執行。"""
+        state = _get_maintenance_state()
+        if time.time() - state["last_run"] < QUEUE_MAINTENANCE_INTERVAL:
+            return
+        if not state["lock"].acquire(blocking=False):
+            return
+        try:
+            state["last_run"] = time.time()
+            run_queue_maintenance()
+        except Exception as e:
+            print(f"⚠️ 佇列維護失敗: {e}")
+        finally:
+            state["lock"].release()
 
     def _exp_backoff_seconds(attempts: int) -> float:
         """指數退避時間（秒），避免瘋狂重試打爆 Google API。"""
@@ -248,16 +511,7 @@ try:
         # 第一次失敗大約 1~2 秒，之後 2^n 放大，上限 32 秒
         return random.uniform(0, min(cap, base * (2 ** max(0, attempts))))
 
-    def _append_main_entry_row(entry: dict):
-        """實際執行 main_data 寫入（原本 background_worker 裡的那段寫入邏輯）。"""
-        ws = get_worksheet(SHEET_TABS["main"])
-        if not ws:
-            raise RuntimeError("無法取得 main_data 工作表")
-
-        all_vals = ws.get_all_values()
-        if not all_vals:
-            ws.append_row(EXPECTED_COLUMNS)
-
+    def _main_entry_to_row(entry: dict) -> list:
         row = []
         for col in EXPECTED_COLUMNS:
             val = entry.get(col, "")
@@ -266,189 +520,525 @@ try:
             if col == "日期":
                 val = str(val)
             row.append(val)
-        ws.append_row(row)
+        return row
+
+    def _appeal_entry_to_row(entry: dict) -> list:
+        return [str(entry.get(col, "")) for col in APPEAL_COLUMNS]
+
+    @st.cache_resource
+    def get_header_cache() -> dict:
+        """已驗證過表頭的工作表（worksheet id → 欄位），跨 rerun 共用，避免每次寫入前都下載整張表。"""
+        return {}
+
+    def invalidate_sheet_header(ws=None):
+        """讓表頭快取失效；ws 為 None 時全部清除（下次寫入前會重新檢查）。"""
+        cache = get_header_cache()
+        if ws is None:
+            cache.clear()
+        else:
+            cache.pop(getattr(ws, "id", None), None)
+
+    def _ensure_sheet_header(ws, columns: list[str]):
+        """
+        確認工作表第一列表頭存在且與 columns 一致，每個工作表只檢查一次：
+        - 空白 → 補上表頭
+        - 前幾欄與 columns 不符 → 拋出 RuntimeError，避免資料寫錯欄位
+        """
+        cache = get_header_cache()
+        key = getattr(ws, "id", None)
+        if cache.get(key) == tuple(columns):
+            return
+
+        header = [str(h).strip() for h in ws.row_values(1)]
+        if not any(header):
+            ws.append_row(columns)
+        elif header[:len(columns)] != list(columns):
+            missing = [c for c in columns if c not in header]
+            raise RuntimeError(f"工作表 '{ws.title}' 表頭與預期不符，缺少欄位: {missing or '順序不一致'}")
+        cache[key] = tuple(columns)
+
+    def _append_main_entry_row(entry: dict):
+        """實際執行 main_data 寫入（原本 background_worker 裡的那段寫入邏輯）。"""
+        _append_main_entry_rows([entry])
+
+    def _append_main_entry_rows(entries: list[dict]):
+        """多筆 main_data 一次以 append_rows 寫入（單一 API 呼叫）。"""
+        if not entries:
+            return
+        ws = get_worksheet(SHEET_TABS["main"])
+        if not ws:
+            raise RuntimeError("無法取得 main_data 工作表")
+
+        _ensure_sheet_header(ws, EXPECTED_COLUMNS)
+        try:
+            ws.append_rows([_main_entry_to_row(e) for e in entries])
+        except Exception:
+            # 寫入失敗可能是表頭被改動，下次重試時重新檢查
+            invalidate_sheet_header(ws)
+            raise
 
     def _append_appeal_row(entry: dict):
         """實際執行 appeals 寫入。"""
+        _append_appeal_rows([entry])
+
+    def _append_appeal_rows(entries: list[dict]):
+        """多筆 appeals 一次以 append_rows 寫入。"""
+        if not entries:
+            return
         ws = get_worksheet(SHEET_TABS["appeals"])
         if not ws:
             raise RuntimeError("無法取得 appeals 工作表")
 
-        all_vals = ws.get_all_values()
-        if not all_vals:
-            ws.append_row(APPEAL_COLUMNS)
-
-        row = [str(entry.get(col, "")) for col in APPEAL_COLUMNS]
-        ws.append_row(row)
+        _ensure_sheet_header(ws, APPEAL_COLUMNS)
+        try:
+            ws.append_rows([_appeal_entry_to_row(e) for e in entries])
+        except Exception:
+            invalidate_sheet_header(ws)
+            raise
 
-    def process_task(task: dict, max_attempts: int = 6) -> tuple[bool, str | None]:
+    def _task_upload_jobs(task: dict) -> list[tuple[str, str]]:
+        """列出任務需要上傳的照片 (本機路徑, 檔名)。"""
+        payload = task["payload"]
+        if task["task_type"] == "main_entry":
+            image_paths = payload.get("image_paths", []) or []
+            filenames = payload.get("filenames", []) or []
+            return list(zip(image_paths, filenames))
+        elif task["task_type"] == "appeal_entry":
+            image_info = payload.get("image_file")  # {"path": ..., "filename": ...}
+            if image_info and image_info.get("path") and os.path.exists(image_info["path"]):
+                return [(image_info["path"], image_info["filename"])]
+        return []
+
+    def _prepare_task_entry(task: dict, links: dict[str, str | None]) -> tuple[str | None, dict]:
         """
-        根據 task_type 執行實際處理：
-        - main_entry: 上傳照片到 Drive → 寫入 main_data
-        - appeal_entry: 上傳申訴佐證 → 寫入 appeals
-        回傳 (成功與否, 錯誤訊息)
+        依上傳結果 links（本機路徑 → Drive 連結）組出要寫入的 entry，回傳 (目標分頁 key, entry)：
+        - main_entry: 證據照片 → entry["照片路徑"]，目標 main
+        - appeal_entry: 申訴佐證 → entry["佐證照片"]，目標 appeals
+        - 未知任務種類回傳 (None, entry)
         """
         task_type = task["task_type"]
         payload = task["payload"]
         entry = payload.get("entry", {}) or {}
 
-        try:
-            if task_type == "main_entry":
-                image_paths = payload.get("image_paths", []) or []
-                filenames = payload.get("filenames", []) or []
-                drive_links = []
-
-                # 上傳證據照片
-                for path, fname in zip(image_paths, filenames):
-                    if not path or not os.path.exists(path):
-                        drive_links.append("UPLOAD_FAILED")
-                        continue
-                    with open(path, "rb") as f:
-                        link = upload_image_to_drive(f, fname)
-                    drive_links.append(link if link else "UPLOAD_FAILED")
-
-                if drive_links:
-                    entry["照片路徑"] = ";".join(drive_links)
+        if task_type == "main_entry":
+            drive_links = [links.get(path) or "UPLOAD_FAILED" for path, _ in _task_upload_jobs(task)]
+            if drive_links:
+                entry["照片路徑"] = ";".join(drive_links)
+            return "main", entry
 
-                _append_main_entry_row(entry)
-                return True, None
+        elif task_type == "appeal_entry":
+            jobs = _task_upload_jobs(task)
+            if jobs:
+                entry["佐證照片"] = links.get(jobs[0][0]) or "UPLOAD_FAILED"
+            else:
+                # 沒有照片就留空
+                entry["佐證照片"] = entry.get("佐證照片", "")
+            return "appeals", entry
 
-            elif task_type == "appeal_entry":
-                image_info = payload.get("image_file")  # {"path": ..., "filename": ...}
-                if image_info and image_info.get("path") and os.path.exists(image_info["path"]):
-                    with open(image_info["path"], "rb") as f:
-                        link = upload_image_to_drive(f, image_info["filename"])
-                    entry["佐證照片"] = link if link else "UPLOAD_FAILED"
-                else:
-                    # 沒有照片就留空
-                    entry["佐證照片"] = entry.get("佐證照片", "")
+        return None, entry
 
-                _append_appeal_row(entry)
-                return True, None
+    def _upload_task_photos(tasks: list[dict]) -> dict[str, str | None]:
+        """把多筆任務的照片丟進同一個上傳執行緒池，回傳 本機路徑 → Drive 連結。"""
+        jobs, task_ids = [], []
+        for task in tasks:
+            for job in _task_upload_jobs(task):
+                jobs.append(job)
+                task_ids.append(task["id"])
+        return {r["path"]: r["link"] for r in upload_files_parallel(jobs, task_ids)}
 
-            else:
-                # 未知任務種類，直接標記為失敗
+    def process_task(task: dict, max_attempts: int = 6) -> tuple[bool, str | None]:
+        """
+        根據 task_type 執行實際處理：
+        - main_entry: 上傳照片到 Drive → 寫入 main_data
+        - appeal_entry: 上傳申訴佐證 → 寫入 appeals
+        回傳 (成功與否, 錯誤訊息)
+        """
+        try:
+            if task["task_type"] == "main_entry_bulk":
+                _append_main_entry_rows(task["payload"].get("entries") or [])
                 return True, None
+            target, entry = _prepare_task_entry(task, _upload_task_photos([task]))
+            if target == "main":
+                _append_main_entry_row(entry)
+            elif target == "appeals":
+                _append_appeal_row(entry)
+            # 未知任務種類，直接標記為完成
+            return True, None
 
         except Exception as e:
             return False, str(e)
 
-    def background_worker(stop_event: threading.Event | None = None):
-        """背景 worker：從 SQLite 佇列抓任務，負責重試、退避與清理暫存檔。"""
-        max_attempts = 6
-        print("🚀 背景工作者已啟動...(SQLite Queue)")
-        while True:
-            if stop_event is not None and stop_event.is_set():
-                break
+    def process_task_batch(tasks: list[dict]) -> dict[str, tuple[bool, str | None]]:
+        """
+        批次處理多筆任務：整批照片平行上傳後，同一分頁的資料以一次 append_rows 寫入。
+        同一分頁的任務共用寫入結果（一起成功或一起重試），回傳 {task_id: (成功與否, 錯誤訊息)}。
+        """
+        results: dict[str, tuple[bool, str | None]] = {}
+        groups: dict[str, list[tuple[str, dict]]] = {"main": [], "appeals": []}
+        links = _upload_task_photos(tasks)
+
+        for task in tasks:
+            if task["task_type"] == "main_entry_bulk":
+                # 整批評分與其他 main_entry 併在同一次 append_rows
+                groups["main"].extend((task["id"], e) for e in task["payload"].get("entries") or [])
+                continue
+            try:
+                target, entry = _prepare_task_entry(task, links)
+            except Exception as e:
+                results[task["id"]] = (False, str(e))
+                continue
+            if target in groups:
+                groups[target].append((task["id"], entry))
+            else:
+                # 未知任務種類，直接標記為完成
+                results[task["id"]] = (True, None)
 
-            task = fetch_next_task(max_attempts=max_attempts)
-            if not task:
-                time.sleep(1.0)
+        writers = {"main": _append_main_entry_rows, "appeals": _append_appeal_rows}
+        for target, items in groups.items():
+            if not items:
                 continue
+            try:
+                writers[target]([entry for _, entry in items])
+                outcome = (True, None)
+            except Exception as e:
+                outcome = (False, str(e))
+            for task_id, _ in items:
+                results[task_id] = outcome
 
-            task_id = task["id"]
-            attempts = int(task["attempts"] or 0)
-            payload = task["payload"]
+        return results
 
-            # 標記為 IN_PROGRESS
-            update_task_status(task_id, "IN_PROGRESS", attempts + 1, None)
+    def _cleanup_task_files(payload):
+        """清理任務的本機暫存照片。"""
+        try:
+            for p in _payload_image_paths(payload):
+                if os.path.exists(p):
+                    os.remove(p)
+        except Exception as cleanup_e:
+            print(f"⚠️ 刪除暫存檔失敗: {cleanup_e}")
+
+    class _LeaseHeartbeat:
+        """處理期間在背景定期延長租約，避免長時間上傳被誤判為當掉而被其他 worker 接手。"""
+
+        def __init__(self, worker_id: str, task_ids: list[str], lease_seconds: float = TASK_LEASE_SECONDS):
+            self.worker_id = worker_id
+            self.task_ids = task_ids
+            self.lease_seconds = lease_seconds
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+
+        def _run(self):
+            while not self._stop.wait(self.lease_seconds / 3):
+                try:
+                    renew_leases(self.worker_id, self.task_ids, self.lease_seconds)
+                except Exception as e:
+                    print(f"⚠️ 租約續期失敗: {e}")
 
-            ok = False
-            err_msg = None
-            try:
-                ok, err_msg = process_task(task, max_attempts=max_attempts)
-            except Exception as e:
-                err_msg = f"UNHANDLED: {e}\n{traceback.format_exc()}"
-                ok = False
+        def __enter__(self):
+            self._thread.start()
+            return self
+
+        def __exit__(self, *exc):
+            self._stop.set()
+            self._thread.join(timeout=5)
+            return False
+
+    def _drain_batch(worker_id: str, batch_size: int, max_attempts: int) -> bool:
+        """
+        領取最多 batch_size 筆任務並處理：照片上傳後每個分頁只呼叫一次 append_rows，
+        再以單一交易更新整批狀態。回傳是否有處理到任務。
+        """
+        tasks = claim_tasks(worker_id, batch_size, max_attempts=max_attempts)
+        if not tasks:
+            return False
 
-            # 清理暫存檔（不管成功或失敗都做）
+        with _LeaseHeartbeat(worker_id, [t["id"] for t in tasks]):
             try:
-                image_paths = []
-                if isinstance(payload, dict):
-                    if "image_paths" in payload and isinstance(payload["image_paths"], list):
-                        image_paths.extend(payload["image_paths"])
-                    if "image_file" in payload and isinstance(payload["image_file"], dict):
-                        p = payload["image_file"].get("path")
-                        if p:
-                            image_paths.append(p)
-                for p in image_paths:
-                    if p and os.path.exists(p):
-                        os.remove(p)
-            except Exception as cleanup_e:
-                print(f"⚠️ 刪除暫存檔失敗: {cleanup_e}")
-
-            # 根據結果更新任務狀態
+                if len(tasks) == 1:
+                    results = {tasks[0]["id"]: process_task(tasks[0], max_attempts=max_attempts)}
+                else:
+                    results = process_task_batch(tasks)
+            except Exception as e:
+                err = f"UNHANDLED: {e}\n{traceback.format_exc()}"
+                results = {t["id"]: (False, err) for t in tasks}
+
+        updates = []
+        finished = []
+        landed = []
+        retry_count = 0
+        done_count = 0
+        for t in tasks:
+            attempts = int(t["attempts"] or 0) + 1
+            ok, err_msg = results.get(t["id"], (False, "missing result"))
             if ok:
-                update_task_status(task_id, "DONE", attempts + 1, None)
-                # 寫成功後清快取，讓前台查詢到最新資料
-                try:
-                    st.cache_data.clear()
-                except Exception:
-                    pass
-                print(f"✅ Task {task_id}({task['task_type']}) 完成")
+                updates.append((t["id"], "DONE", attempts, None))
+                finished.append(t)
+                done_count += 1
+                if t["task_type"] == "main_entry":
+                    landed.append(t["payload"].get("entry", {}))
+                elif t["task_type"] == "main_entry_bulk":
+                    landed.extend(t["payload"].get("entries") or [])
+            elif attempts >= max_attempts:
+                updates.append((t["id"], "FAILED", attempts, err_msg or "unknown error"))
+                finished.append(t)
+                print(f"❌ Task {t['id']} 永久失敗: {err_msg}")
             else:
-                if attempts + 1 >= max_attempts:
-                    update_task_status(task_id, "FAILED", attempts + 1, err_msg or "unknown error")
-                    print(f"❌ Task {task_id} 永久失敗: {err_msg}")
+                # 不在 worker 裡 sleep：記下下次可執行時間，其他任務照常處理
+                delay = _exp_backoff_seconds(attempts - 1)
+                updates.append((t["id"], "RETRY", attempts, err_msg or "unknown error", time.time() + delay))
+                retry_count += 1
+                print(f"⚠️ Task {t['id']} 失敗 (第 {attempts} 次)，{delay:.1f} 秒後重試。錯誤: {err_msg}")
+        updated = set(update_tasks_status(updates, worker_id=worker_id))
+        if len(updated) < len(updates):
+            print(f"⚠️ {len(updates) - len(updated)} 筆任務租約已被其他 worker 接手，略過狀態更新")
+
+        # 暫存檔保留到任務結束，重試時才能沿用上傳紀錄；
+        # 租約已被接手的任務由新的 worker 處理，它可能還要用到這些檔案
+        for t in finished:
+            if t["id"] in updated:
+                _cleanup_task_files(t["payload"])
+
+        if done_count:
+            # 新評分立即計入成績彙總表（以紀錄ID識別，之後副本同步到同一筆也不會重複計分）
+            if landed:
+                try: get_score_table().upsert_entries(landed)
+                except Exception as e: print(f"⚠️ 成績彙總表更新失敗（下次同步時補上）: {e}")
+            # 寫成功後同步本機副本（副本版本變動後 main / appeals 的快取自然失效，參考資料不受影響）
+            request_replica_sync()
+            print(f"✅ [{worker_id}] 完成 {done_count}/{len(tasks)} 筆任務")
+        return True
+
+    def background_worker(stop_event: threading.Event | None = None, batch_size: int = 1,
+                          worker_id: str | None = None):
+        """
+        背景 worker：從 SQLite 佇列領取任務，負責重試、退避與清理暫存檔。
+        batch_size > 1 時為批次模式，一次寫入多筆以節省 Google API 配額。
+        """
+        max_attempts = 6
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        wakeup = get_queue_wakeup()
+        idle_sleep = IDLE_POLL_MIN_SECONDS
+        print(f"🚀 背景工作者已啟動...(SQLite Queue, {worker_id})")
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                break
+            try:
+                if _drain_batch(worker_id, batch_size, max_attempts):
+                    idle_sleep = IDLE_POLL_MIN_SECONDS
+                    continue
+                _maybe_run_maintenance()
+                # 佇列空閒：輪詢間隔逐次加倍，但不超過最早一筆重試任務的到期時間；新任務入列會立即喚醒
+                due_in = seconds_until_next_due(max_attempts)
+                timeout = idle_sleep if due_in is None else min(idle_sleep, max(due_in, 0.05))
+                if wakeup.wait(timeout):
+                    # 被新任務喚醒：接下來多半還有一批，輪詢間隔回到起始值
+                    wakeup.clear()
+                    idle_sleep = IDLE_POLL_MIN_SECONDS
                 else:
-                    update_task_status(task_id, "RETRY", attempts + 1, err_msg or "unknown error")
-                    sleep_sec = _exp_backoff_seconds(attempts)
-                    print(f"⚠️ Task {task_id} 失敗 (第 {attempts+1} 次)，{sleep_sec:.1f} 秒後重試。錯誤: {err_msg}")
-                    time.sleep(sleep_sec)
+                    idle_sleep = min(idle_sleep * 2, IDLE_POLL_MAX_SECONDS)
+            except Exception as e:
+                # 例如資料庫被其他 process 鎖住太久；稍後再試，不讓 worker 執行緒死掉
+                print(f"⚠️ [{worker_id}] 佇列處理錯誤: {e}")
+                time.sleep(IDLE_POLL_MAX_SECONDS)
 
     @st.cache_resource
     def start_background_worker():
+        """依 secrets 的 system_config.worker_count 啟動多個 worker（預設 1 個）。"""
+        try:
+            worker_count = int(st.secrets["system_config"].get("worker_count", 1))
+        except Exception:
+            worker_count = 1
         stop_event = threading.Event()
-        t = threading.Thread(target=background_worker, args=(stop_event,), daemon=True)
-        t.start()
+        for i in range(max(0, worker_count)):
+            worker_id = f"{socket.gethostname()}:{os.getpid()}:{i}"
+            t = threading.Thread(target=background_worker, args=(stop_event, WORKER_BATCH_SIZE, worker_id), daemon=True)
+            t.start()
         return stop_event
 
-    # 啟動背景 worker
-    _worker_stop_event = start_background_worker()
-
     # ==========================================
     # 2. 資料讀寫邏輯
     # ==========================================
 
-    @st.cache_data(ttl=60)
-    def load_main_data():
-        ws = get_worksheet(SHEET_TABS["main"])
-        if not ws:
-            return pd.DataFrame(columns=EXPECTED_COLUMNS)
-        try:
-            data = ws.get_all_records()
-            df = pd.DataFrame(data)
-            if df.empty:
-                return pd.DataFrame(columns=EXPECTED_COLUMNS)
-
-            # 確保所有欄位存在
-            for col in EXPECTED_COLUMNS:
-                if col not in df.columns:
-                    df[col] = ""
-
-            # 確保紀錄ID存在且為字串
-            if "紀錄ID" not in df.columns:
-                df["紀錄ID"] = df.index.astype(str)
-            else:
-                df["紀錄ID"] = df["紀錄ID"].astype(str)
+    REPLICA_TABS = {"main": SHEET_TABS["main"], "appeals": SHEET_TABS["appeals"]}
+
+    @st.cache_resource
+    def get_sheet_replica() -> SheetReplica:
+        replica = SheetReplica(REPLICA_DB_PATH)
+        replica.register("main", EXPECTED_COLUMNS, indexed=("紀錄ID",), key="紀錄ID")
+        replica.register("appeals", APPEAL_COLUMNS, indexed=("對應紀錄ID",), key="登錄時間")
+        return replica
+
+    def approved_appeal_ids() -> set[str]:
+        """申訴已核可的紀錄ID（直接讀本機副本，背景同步執行緒也能用）。"""
+        return approved_record_ids(get_sheet_replica().read_frame("appeals"))
+
+    def rebuild_score_table(table: ScoreTable | None = None):
+        """以副本中的整份 main_data 重建成績彙總表（沒有紀錄ID的列以試算表列號識別，申訴已核可的紀錄不計）。"""
+        df = get_sheet_replica().read_frame("main")
+        (table or get_score_table()).rebuild(df, keys=[f"#{i + 2}" for i in range(len(df))],
+                                             excluded=approved_appeal_ids())
 
-            # 照片路徑處理
-            if "照片路徑" in df.columns:
-                df["照片路徑"] = df["照片路徑"].fillna("").astype(str)
+    @st.cache_resource
+    def get_score_table() -> ScoreTable:
+        table = ScoreTable(SCORE_DB_PATH)
+        if table.is_empty() and get_sheet_replica().meta("main")["row_count"] > 0:
+            rebuild_score_table(table)
+        return table
 
-            # 數值欄位轉型
-            numeric_cols = ["內掃原始分", "外掃原始分", "垃圾原始分", "晨間打掃原始分", "手機人數"]
-            for col in numeric_cols:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
+    @st.cache_resource
+    def get_replica_sync_event() -> threading.Event:
+        """設定後同步工作會立即執行一次（不用等到下一個週期）。"""
+        return threading.Event()
 
-            if "週次" in df.columns:
-                df["週次"] = pd.to_numeric(df["週次"], errors="coerce").fillna(0).astype(int)
+    def request_replica_sync():
+        get_replica_sync_event().set()
 
-            return df[EXPECTED_COLUMNS]
+    def sync_replica(dataset: str, full: bool = False, rebuild_scores: bool = True) -> bool:
+        """
+        把分頁同步到本機副本，回傳是否成功。平常只抓新增的列（tail），
+        full=True 或偵測到上方有刪改時整份重抓；刪除、審核等會改動既有列的操作應指定 full=True。
+        main 有變動時一併更新成績彙總表：tail 只套用新增的列，整份重抓則重建
+        （呼叫端已自行增減彙總表時以 rebuild_scores=False 略過重建）；
+        appeals 有變動時把已核可的申訴補進彙總表（例如在其他執行個體或直接在試算表審核）。
+        """
+        ws = get_worksheet(REPLICA_TABS[dataset])
+        if not ws:
+            return False
+        replica = get_sheet_replica()
+        try:
+            before = replica.meta(dataset)
+            mode = replica.sync_from_worksheet(dataset, ws, full=full)
+            after = replica.meta(dataset)
+            if after["version"] != before["version"]:
+                print(f"🔄 {REPLICA_TABS[dataset]} 副本已更新（{mode}，{after['row_count']} 列）")
+                if dataset == "main":
+                    if mode == "tail":
+                        get_score_table().upsert_entries(replica.read_frame("main", after=before["row_count"]))
+                    elif rebuild_scores:
+                        rebuild_score_table()
+                else:
+                    get_score_table().set_corrected(approved_appeal_ids())
+            return True
         except Exception as e:
-            st.error(f"讀取資料錯誤: {e}")
+            print(f"⚠️ {REPLICA_TABS[dataset]} 副本同步失敗: {e}")
+            return False
+
+    def replica_sync_worker(stop_event: threading.Event | None = None):
+        """背景同步工作：每 REPLICA_SYNC_SECONDS 秒（或被 request_replica_sync 喚醒時）同步一次副本。"""
+        event = get_replica_sync_event()
+        replica = get_sheet_replica()
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                break
+            event.clear()
+            for dataset in REPLICA_TABS:
+                last_full = replica.meta(dataset)["full_synced_at"] or 0
+                sync_replica(dataset, full=time.time() - last_full > REPLICA_FULL_SYNC_SECONDS)
+            event.wait(REPLICA_SYNC_SECONDS)
+
+    @st.cache_resource
+    def start_replica_sync():
+        stop_event = threading.Event()
+        t = threading.Thread(target=replica_sync_worker, args=(stop_event,), daemon=True)
+        t.start()
+        return stop_event
+
+    def load_main_data(include_pending: bool = True):
+        """
+        從本機副本讀取 main_data（頁面載入不直接呼叫 Sheets）；副本尚未建立時先同步一次。
+        include_pending=True 時，佇列中還沒寫進試算表的評分也會疊加進來（以紀錄ID去重），
+        送出後馬上就看得到，不必等背景寫入與同步。
+        """
+        if get_sheet_replica().meta("main")["synced_at"] is None:
+            sync_replica("main")
+        meta, df = _load_main_frame()
+        # 快取的 DataFrame 由所有 session 共用：淺複製後呼叫端新增欄位不會影響快取
+        df = df.copy(deep=False)
+        if not include_pending:
+            return df
+        pending = load_pending_main_entries(meta["read_at"])
+        if pending.empty:
+            return df
+        pending = pending[~pending["紀錄ID"].isin(df["紀錄ID"])]
+        if pending.empty:
+            return df
+        return pd.concat([df, pending], ignore_index=True)
+
+    def load_pending_main_entries(replica_read_at: float | None = None) -> pd.DataFrame:
+        """
+        佇列中 PENDING / RETRY / IN_PROGRESS 的 main_entry，轉成與 main_data 相同格式的 DataFrame。
+        已寫進試算表（DONE）但副本還沒同步到的也算：replica_read_at 為副本最後一次讀取試算表的時間，
+        在這之後才完成的任務都會疊加（副本還沒建立時為 None，所有 DONE 任務都算）。
+        """
+        rows = []
+        queue = get_task_queue()
+        done_since = replica_read_at or 0.0
+        for payload in queue.active_payloads("main_entry", done_since=done_since):
+            entry = dict(payload.get("entry") or {})
+            if not entry.get("照片路徑"):
+                # 照片還沒上傳，先顯示本機暫存檔
+                entry["照片路徑"] = ";".join(payload.get("image_paths") or [])
+            rows.append(_main_entry_to_row(entry))
+        for payload in queue.active_payloads("main_entry_bulk", done_since=done_since):
+            rows.extend(_main_entry_to_row(e) for e in payload.get("entries") or [])
+        if not rows:
             return pd.DataFrame(columns=EXPECTED_COLUMNS)
+        return _normalize_main_frame(pd.DataFrame(rows, columns=EXPECTED_COLUMNS).astype(str))
+
+    def _normalize_main_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """試算表讀出的字串欄位整理成前台使用的型別。"""
+        # 確保紀錄ID為字串
+        df["紀錄ID"] = df["紀錄ID"].astype(str)
+
+        # 照片路徑處理
+        df["照片路徑"] = df["照片路徑"].fillna("").astype(str)
+
+        # 數值欄位轉型
+        numeric_cols = ["內掃原始分", "外掃原始分", "垃圾原始分", "垃圾內掃原始分", "垃圾外掃原始分", "晨間打掃原始分", "手機人數"]
+        for col in numeric_cols:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
+
+        df["週次"] = pd.to_numeric(df["週次"], errors="coerce").fillna(0).astype(int)
+
+        return df[EXPECTED_COLUMNS]
+
+    @st.cache_resource
+    def _get_main_frame_cache() -> dict:
+        """
+        main_data 的 DataFrame 與重複評分索引，所有 session 共用。
+        副本只新增列時只讀新增的列接到後面（索引也只加入新的列）；整份重抓或改動既有列時才整份重建。
+        """
+        return {"lock": threading.Lock(), "meta": None, "frame": None, "dup_keys": None}
+
+    def _refresh_main_frame_cache(cache: dict):
+        """把快取更新到副本目前的版本（呼叫端需持有 cache["lock"]）。"""
+        replica = get_sheet_replica()
+        cached = cache["meta"]
+        if cached is not None and replica.meta("main")["version"] == cached["version"]:
+            return
+        meta, rows, incremental = replica.read_changes(
+            "main", cached["row_count"] if cached else 0, cached["rewrite_version"] if cached else -1
+        )
+        new = _normalize_main_frame(rows) if not rows.empty else pd.DataFrame(columns=EXPECTED_COLUMNS)
+        if incremental and cache["frame"] is not None:
+            if not new.empty:
+                cache["frame"] = new if cache["frame"].empty else pd.concat([cache["frame"], new], ignore_index=True)
+                if cache["dup_keys"] is not None:
+                    cache["dup_keys"] |= _duplicate_keys(new)
+        else:
+            cache["frame"], cache["dup_keys"] = new, None
+        cache["meta"] = meta
+
+    def _load_main_frame() -> tuple[dict, pd.DataFrame]:
+        """回傳 (副本 meta, main_data DataFrame)；兩者為同一個時間點。DataFrame 為共用快取，不可直接修改。"""
+        cache = _get_main_frame_cache()
+        with cache["lock"]:
+            try:
+                _refresh_main_frame_cache(cache)
+            except Exception as e:
+                st.error(f"讀取資料錯誤: {e}")
+                if cache["frame"] is None:
+                    return get_sheet_replica().meta("main"), pd.DataFrame(columns=EXPECTED_COLUMNS)
+            return cache["meta"], cache["frame"]
 
 
     def save_entry(new_entry, uploaded_files=None):
@@ -497,9 +1087,7 @@ try:
 
         # 確保紀錄ID存在（申訴對應會用到）
         if "紀錄ID" not in new_entry or not new_entry["紀錄ID"]:
-            unique_suffix = uuid.uuid4().hex[:6]
-            timestamp = datetime.now(TW_TZ).strftime("%Y%m%d%H%M%S")
-            new_entry["紀錄ID"] = f"{timestamp}_{unique_suffix}"
+            new_entry["紀錄ID"] = _new_record_id()
 
         payload = {
             "entry": new_entry,
@@ -507,12 +1095,51 @@ try:
             "filenames": file_names,
         }
         task_id = enqueue_task("main_entry", payload)
-        try:
-            st.cache_data.clear()
-        except Exception:
-            pass
         print(f"📥 main_entry 排入佇列 (Task ID: {task_id})")
 
+    def _new_record_id() -> str:
+        unique_suffix = uuid.uuid4().hex[:6]
+        timestamp = datetime.now(TW_TZ).strftime("%Y%m%d%H%M%S")
+        return f"{timestamp}_{unique_suffix}"
+
+    SCORE_FIELDS = ["內掃原始分", "外掃原始分", "垃圾原始分", "垃圾內掃原始分", "垃圾外掃原始分", "晨間打掃原始分", "手機人數"]
+
+    def validate_entry(entry: dict) -> list[str]:
+        """檢查一筆評分的必填欄位與分數，回傳錯誤訊息（沒有錯誤為空清單）。"""
+        errors = []
+        for col in ("日期", "班級", "評分項目"):
+            if not str(entry.get(col, "") or "").strip():
+                errors.append(f"缺少{col}")
+        for col in SCORE_FIELDS:
+            val = entry.get(col, 0)
+            try:
+                ok = int(val) == float(val) and int(val) >= 0
+            except (TypeError, ValueError):
+                ok = False
+            if not ok:
+                errors.append(f"{col}「{val}」不是非負整數")
+        return errors
+
+    def save_entries_bulk(entries: list[dict]) -> int:
+        """
+        一次送出多筆沒有照片的評分（垃圾檢查、晨掃等整批登錄）：
+        先檢查全部資料，有任何一筆不合格就整批不送；通過後整批放進同一筆 main_entry_bulk 任務
+        （一次 INSERT），worker 以一次 append_rows 寫入。回傳排入的筆數。
+        """
+        entries = [dict(e) for e in entries]
+        if not entries:
+            return 0
+        problems = [f"{e.get('班級', '?')}：{'、'.join(errs)}" for e in entries if (errs := validate_entry(e))]
+        if problems:
+            st.error("❌ 資料有誤，整批未送出：\n" + "\n".join(f"- {p}" for p in problems))
+            return 0
+        for e in entries:
+            if not e.get("紀錄ID"):
+                e["紀錄ID"] = _new_record_id()
+        task_id = enqueue_task("main_entry_bulk", {"entries": entries})
+        print(f"📥 main_entry_bulk {len(entries)} 筆排入佇列 (Task ID: {task_id})")
+        return len(entries)
+
 
     def save_appeal(entry, proof_file=None):
         """
@@ -567,216 +1194,276 @@ try:
             "image_file": image_info,  # 可能為 None
         }
         task_id = enqueue_task("appeal_entry", payload)
-        try:
-            st.cache_data.clear()
-        except Exception:
-            pass
         st.success("📩 申訴已排入背景處理")
         print(f"📥 appeal_entry 排入佇列 (Task ID: {task_id})")
         return True
 
 
-    @st.cache_data(ttl=60)
     def load_appeals():
-        ws = get_worksheet(SHEET_TABS["appeals"])
-        if not ws:
-            return pd.DataFrame(columns=APPEAL_COLUMNS)
-
+        """從本機副本讀取 appeals；副本尚未建立時先同步一次。"""
+        replica = get_sheet_replica()
+        if replica.meta("appeals")["synced_at"] is None:
+            sync_replica("appeals")
+        return _load_appeals_frame(replica.meta("appeals")["version"])
+
+    @st.cache_data(max_entries=2)
+    def _load_appeals_frame(version: int):
+        replica = get_sheet_replica()
         try:
-            records = ws.get_all_records()  # 以第一列為欄位名稱
-            df = pd.DataFrame(records)
+            df = replica.read_frame("appeals")
         except Exception:
             return pd.DataFrame(columns=APPEAL_COLUMNS)
 
-        # 確保所有定義好的欄位都存在
-        for col in APPEAL_COLUMNS:
-            if col not in df.columns:
-                if col == "處理狀態":
-                    df[col] = "待處理"
-                else:
-                    df[col] = ""
+        # 試算表沒有處理狀態欄位時，一律視為待處理
+        if "處理狀態" not in (replica.meta("appeals")["header"] or []):
+            df["處理狀態"] = "待處理"
 
         # 欄位順序整理成 APPEAL_COLUMNS
         df = df[APPEAL_COLUMNS]
 
         return df
 
+    def _coalesce_row_ranges(row_numbers) -> list[tuple[int, int]]:
+        """把列號合併成連續區間 [(起, 迄)]（含迄），由下往上排序，刪除時前面的列號才不會位移。"""
+        ranges = []
+        for r in sorted(set(row_numbers)):
+            if ranges and r == ranges[-1][1] + 1:
+                ranges[-1] = (ranges[-1][0], r)
+            else:
+                ranges.append((r, r))
+        return list(reversed(ranges))
+
     def delete_rows_by_ids(record_ids_to_delete):
+        """
+        依紀錄ID刪除 main_data 的列：只讀紀錄ID欄，合併成連續區間後以單一 batch_update 一次刪除。
+        成績彙總表直接扣掉被刪的紀錄；刪除後整份重抓時若多出其他來源新增的列就補進彙總表，
+        列數比預期少（期間別處也刪了列）才整份重建。
+        """
         ws = get_worksheet(SHEET_TABS["main"])
         if not ws: return False
+        replica = get_sheet_replica()
         try:
-            records = ws.get_all_records()
-            rows_to_delete = []
-            for i, record in enumerate(records):
-                if str(record.get("紀錄ID")) in record_ids_to_delete:
-                    rows_to_delete.append(i + 2)
-            
-            rows_to_delete.sort(reverse=True)
-            for row_idx in rows_to_delete:
-                ws.delete_rows(row_idx)
-                time.sleep(0.8)
-                
-            st.cache_data.clear()
+            before = replica.meta("main")["row_count"]
+            # 只讀表頭找紀錄ID欄，刪除時不會順手補表頭
+            header = [str(h).strip() for h in ws.row_values(1)]
+            if "紀錄ID" not in header:
+                raise RuntimeError(f"工作表 '{ws.title}' 找不到紀錄ID欄")
+            targets = {str(x) for x in record_ids_to_delete}
+            id_values = ws.col_values(header.index("紀錄ID") + 1)
+            rows_to_delete = [i + 1 for i, v in enumerate(id_values) if i > 0 and str(v) in targets]
+            if rows_to_delete:
+                requests = [
+                    {"deleteDimension": {"range": {
+                        "sheetId": ws.id, "dimension": "ROWS",
+                        "startIndex": start - 1, "endIndex": end,
+                    }}}
+                    for start, end in _coalesce_row_ranges(rows_to_delete)
+                ]
+                # 同一個 batch_update 內的請求依序套用，整批成功或整批失敗
+                ws.spreadsheet.batch_update({"requests": requests})
+
+            get_score_table().remove(targets)
+            expected = before - len(rows_to_delete)
+            if sync_replica("main", full=True, rebuild_scores=False):
+                after = replica.meta("main")["row_count"]
+                if after > expected:
+                    get_score_table().upsert_entries(replica.read_frame("main", after=expected))
+                elif after < expected:
+                    rebuild_score_table()
             return True
         except Exception as e:
             st.error(f"刪除失敗: {e}"); return False
 
-    def update_appeal_status(appeal_row_idx, status, record_id):
+    def _locate_rows(dataset: str, ws, key_col: str, keys, filters: dict | None = None) -> dict[str, int]:
+        """
+        以本機副本的索引找出每個 key 在試算表的第一個列號（先做一次增量同步）。
+        寫入前會用一次 batch_get 核對這些儲存格的值，對不上就整份重新同步後再查一次。
+        """
+        columns = EXPECTED_COLUMNS if dataset == "main" else APPEAL_COLUMNS
+        col_idx = columns.index(key_col) + 1
+        keys = [str(k) for k in keys if str(k)]
+        for attempt in range(2):
+            sync_replica(dataset, full=attempt > 0)
+            found = get_sheet_replica().find_rows(dataset, key_col, keys, filters)
+            located = {k: rows[0] for k, rows in found.items() if rows}
+            if not located:
+                return {}
+            cells = ws.batch_get([rowcol_to_a1(row, col_idx) for row in located.values()])
+            actual = [str(c[0][0]) if c and c[0] else "" for c in cells]
+            if actual == list(located.keys()):
+                return located
+        raise RuntimeError(f"{REPLICA_TABS[dataset]} 列號索引與試算表不一致，請稍後再試")
+
+    def review_appeals(decisions: list[tuple[dict, str]]) -> tuple[bool, str]:
+        """
+        批次審核申訴，decisions 為 (申訴列, "已核可" / "已駁回")，申訴列為 load_appeals 的一列：
+        - appeals：以對應紀錄ID找到申訴列（對應紀錄ID空白的改以該列的登錄時間 + 班級找），
+          所有處理狀態以一次 batch_update 寫回
+        - main_data：核可案件的「修正」以一次 batch_update 設為 TRUE（只是標記；
+          計分依申訴的核可狀態排除，不看「修正」欄，檢查人員勾選的修正單照常計分）
+        列號由副本索引查得（不必下載整張表），寫入後直接更新副本。
+        """
         ws_appeals = get_worksheet(SHEET_TABS["appeals"])
         ws_main = get_worksheet(SHEET_TABS["main"])
+        if not ws_appeals or not ws_main:
+            return False, "無法取得工作表"
         try:
-            appeals_data = ws_appeals.get_all_records()
-            target_row = None
-            for i, row in enumerate(appeals_data):
-                if str(row.get("對應紀錄ID")) == str(record_id) and str(row.get("處理狀態")) == "待處理":
-                    target_row = i + 2 
-                    break
-            if target_row:
-                col_idx = APPEAL_COLUMNS.index("處理狀態") + 1
-                ws_appeals.update_cell(target_row, col_idx, status)
-                if status == "已核可" and record_id:
-                    main_data = ws_main.get_all_records()
-                    main_target_row = None
-                    for j, m_row in enumerate(main_data):
-                        if str(m_row.get("紀錄ID")) == str(record_id):
-                            main_target_row = j + 2
-                            break
-                    if main_target_row:
-                        fix_col_idx = EXPECTED_COLUMNS.index("修正") + 1
-                        ws_main.update_cell(main_target_row, fix_col_idx, "TRUE")
-                st.cache_data.clear()
-                return True, "更新成功"
-            else: return False, "找不到對應的申訴列"
+            decided: dict[str, str] = {}
+            unlinked: dict[str, dict[str, str]] = {}  # 班級 → {登錄時間: 處理狀態}
+            for appeal, status in decisions:
+                rid = str(appeal.get("對應紀錄ID", "") or "").strip()
+                if rid:
+                    decided[rid] = status
+                else:
+                    unlinked.setdefault(str(appeal.get("班級", "")), {})[str(appeal.get("登錄時間", ""))] = status
+            _ensure_sheet_header(ws_appeals, APPEAL_COLUMNS)
+            appeal_rows = _locate_rows("appeals", ws_appeals, "對應紀錄ID", decided, {"處理狀態": "待處理"}) if decided else {}
+            updates = [(row, decided[rid]) for rid, row in appeal_rows.items()]
+            for cls, by_time in unlinked.items():
+                rows = _locate_rows("appeals", ws_appeals, "登錄時間", by_time,
+                                    {"處理狀態": "待處理", "班級": cls, "對應紀錄ID": ""})
+                updates.extend((row, by_time[ts]) for ts, row in rows.items())
+            if not updates:
+                return False, "找不到對應的申訴列"
+
+            status_col = APPEAL_COLUMNS.index("處理狀態") + 1
+            ws_appeals.batch_update(
+                [{"range": rowcol_to_a1(row, status_col), "values": [[status]]} for row, status in updates],
+                value_input_option="USER_ENTERED",
+            )
+            get_sheet_replica().update_cells("appeals", [(row, "處理狀態", status) for row, status in updates])
+
+            approved = [rid for rid in appeal_rows if decided[rid] == "已核可"]
+            if approved:
+                _ensure_sheet_header(ws_main, EXPECTED_COLUMNS)
+                main_rows = _locate_rows("main", ws_main, "紀錄ID", approved)
+                if main_rows:
+                    fix_col = EXPECTED_COLUMNS.index("修正") + 1
+                    ws_main.batch_update(
+                        [{"range": rowcol_to_a1(row, fix_col), "values": [["TRUE"]]} for row in main_rows.values()],
+                        value_input_option="USER_ENTERED",
+                    )
+                    get_sheet_replica().update_cells("main", [(row, "修正", "TRUE") for row in main_rows.values()])
+                    get_score_table().set_corrected(main_rows.keys())
+            return True, f"已更新 {len(updates)} 件申訴"
         except Exception as e: return False, str(e)
 
-    @st.cache_data(ttl=21600)
-    def load_roster_dict():
-        ws = get_worksheet(SHEET_TABS["roster"])
-        roster_dict = {}
-        if ws:
-            try:
-                df = pd.DataFrame(ws.get_all_records())
-                id_col = next((c for c in df.columns if "學號" in c), None)
-                class_col = next((c for c in df.columns if "班級" in c), None)
-                if id_col and class_col:
-                    for _, row in df.iterrows():
-                        sid = clean_id(row[id_col])
-                        if sid: roster_dict[sid] = str(row[class_col]).strip()
-            except: pass
-        return roster_dict
-        
-    @st.cache_data(ttl=3600)
-    def load_sorted_classes():
-        ws = get_worksheet(SHEET_TABS["roster"])
-        if not ws: return [], []
-        try:
-            df = pd.DataFrame(ws.get_all_records())
-            class_col = next((c for c in df.columns if "班級" in c), None)
-            if not class_col: return [], []
-            unique_classes = df[class_col].dropna().unique().tolist()
-            unique_classes = [c.strip() for c in unique_classes if c.strip()]
-            
-            def sort_key(name):
-                match = re.search(r'\d+', name)
-                grade = int(match.group()) if match else 99
-                return (grade, name)
-            
-            sorted_all = sorted(unique_classes, key=sort_key)
-            structured = []
-            for c in sorted_all:
-                match = re.search(r'\d+', c)
-                g_num = match.group() if match else "?"
-                g_label = f"{g_num}年級" if g_num != "?" else "其他"
-                structured.append({"grade": g_label, "name": c})
-            return sorted_all, structured
-        except: return [], []
-
-    @st.cache_data(ttl=21600)
-    def load_teacher_emails():
-        ws = get_worksheet(SHEET_TABS["teachers"])
-        email_dict = {}
-        if ws:
-            try:
-                df = pd.DataFrame(ws.get_all_records())
-                class_col = next((c for c in df.columns if "班級" in c), None)
-                mail_col = next((c for c in df.columns if "Email" in c or "信箱" in c or "郵件" in c), None)
-                name_col = next((c for c in df.columns if "導師" in c or "姓名" in c), None)
-                if class_col and mail_col:
-                    for _, row in df.iterrows():
-                        cls = str(row[class_col]).strip()
-                        mail = str(row[mail_col]).strip()
-                        name = str(row[name_col]).strip() if name_col else "老師"
-                        if cls and mail and "@" in mail:
-                            email_dict[cls] = {"email": mail, "name": name}
-            except: pass
-        return email_dict
-
-    @st.cache_data(ttl=21600)
-    def load_inspector_list():
-        ws = get_worksheet(SHEET_TABS["inspectors"])
-        default = [{"label": "測試人員", "allowed_roles": ["內掃檢查"], "assigned_classes": [], "id_prefix": "測"}]
-        if not ws: return default
+    def update_appeal_status(appeal, status):
+        return review_appeals([(appeal, status)])
+
+    # ------------------------------------------
+    # 快取版本：寫入只讓「自己動到的」資料集失效。
+    # main / appeals 以本機副本的版本為快取 key（同步到新內容就自動失效），
+    # settings 與名單類參考資料（roster / inspectors / teachers / duty）則由這裡的版本號控制；
+    # settings_base 為最近一次整批重抓時的 settings 版本，兩者相同表示 settings 直接用整批讀回的值。
+    # ------------------------------------------
+    @st.cache_resource
+    def _get_dataset_versions() -> dict:
+        return {"settings": 0, "reference": 0, "settings_base": 0}
+
+    def dataset_version(name: str) -> int:
+        return _get_dataset_versions()[name]
+
+    def invalidate_dataset(*names: str):
+        """讓指定資料集的快取失效（下次讀取時重新抓取），其餘資料集的快取不受影響。"""
+        versions = _get_dataset_versions()
+        for name in names:
+            versions[name] = versions.get(name, 0) + 1
+
+    # ------------------------------------------
+    # 參考資料：settings / roster / inspectors / teachers / duty 五個分頁
+    # 冷啟動以一次 values_batch_get 全部抓回，所有衍生結構都由同一份回應建出（原本每個分頁各一次，roster 還抓兩次）。
+    # - settings：save_setting 之後只重抓 settings，不會連名單一起重抓
+    # - duty：輪值表當天也可能調整，整批讀回的結果超過 DUTY_CACHE_TTL 秒後只重抓 duty
+    # ------------------------------------------
+    REFERENCE_TABS = ["settings", "roster", "inspectors", "teachers", "duty"]
+    REFERENCE_CACHE_TTL = 21600  # 名單在試算表上被直接修改時，最晚 6 小時後自動重抓（後台也可手動重新讀取）
+    DUTY_CACHE_TTL = 60          # 晨掃輪值表的快取秒數
+
+    def _fetch_reference_values(tabs: list[str]) -> dict:
+        """回傳 {資料集: 分頁全部值 (list of list)}；分頁不存在時為 None。"""
+        sheet = get_spreadsheet_object()
+        if not sheet: return {t: None for t in tabs}
         try:
-            df = pd.DataFrame(ws.get_all_records())
-            if df.empty: return default
-            inspectors = []
-            id_col = next((c for c in df.columns if "學號" in c or "編號" in c), None)
-            role_col = next((c for c in df.columns if "負責" in c or "項目" in c), None)
-            scope_col = next((c for c in df.columns if "班級" in c or "範圍" in c), None)
-            if id_col:
-                for _, row in df.iterrows():
-                    s_id = clean_id(row[id_col])
-                    s_role = str(row[role_col]).strip() if role_col else ""
-                    allowed = []
-                    if "組長" in s_role: allowed = ["內掃檢查", "外掃檢查", "垃圾/回收檢查", "晨間打掃"]
-                    elif "機動" in s_role: allowed = ["內掃檢查", "外掃檢查", "垃圾/回收檢查"]
-                    else:
-                        if "外掃" in s_role: allowed.append("外掃檢查")
-                        if "垃圾" in s_role: allowed.append("垃圾/回收檢查")
-                        if "晨" in s_role: allowed.append("晨間打掃")
-                        if "內掃" in s_role: allowed.append("內掃檢查")
-                    if not allowed: allowed = ["內掃檢查"]
-                    s_classes = []
-                    if scope_col and str(row[scope_col]):
-                        raw = str(row[scope_col])
-                        s_classes = [c.strip() for c in raw.replace("、", ";").replace(",", ";").split(";") if c.strip()]
-                    prefix = s_id[0] if len(s_id) > 0 else "X"
-                    inspectors.append({"label": f"學號: {s_id}", "allowed_roles": allowed, "assigned_classes": s_classes, "id_prefix": prefix})
-            return inspectors if inspectors else default
-        except: return default
-
-    @st.cache_data(ttl=60)
+            resp = sheet.values_batch_get([f"'{SHEET_TABS[t]}'" for t in tabs])
+            ranges = resp.get("valueRanges", [])
+            return {t: (ranges[i].get("values", []) if i < len(ranges) else []) for i, t in enumerate(tabs)}
+        except Exception as e:
+            # 有分頁不存在時整批請求會失敗，退回逐一讀取（get_worksheet 會補建缺少的分頁）
+            print(f"⚠️ 參考資料批次讀取失敗，改為逐一讀取: {e}")
+            values = {}
+            for t in tabs:
+                ws = get_worksheet(SHEET_TABS[t])
+                try: values[t] = ws.get_all_values() if ws else None
+                except Exception: values[t] = None
+            return values
+
+    def _parse_or(default, parser, *args):
+        """解析失敗（分頁格式被改壞）時退回預設值，不讓整個頁面掛掉。"""
+        try: return parser(*args)
+        except Exception as e:
+            print(f"⚠️ 參考資料解析失敗 ({parser.__name__}): {e}"); return default
+
+    def _settings_from_values(values) -> dict:
+        return _parse_or({"semester_start": "2025-08-25"}, parse_settings, values)
+
+    def _duty_from_values(values):
+        if values is None: return None, "error"
+        return _parse_or((None, "error"), parse_duty, values_to_frame(values))
+
+    @st.cache_data(ttl=REFERENCE_CACHE_TTL)
+    def load_reference_data(reference_version: int = 0) -> dict:
+        """
+        一次抓回全部參考資料分頁並建好所有衍生結構（fetched_at 為讀取時間）。
+        版本號為快取 key：「重新讀取快取」按鈕讓它失效。
+        """
+        values = _fetch_reference_values(REFERENCE_TABS)
+        duty_df, duty_status = _duty_from_values(values["duty"])
+        roster_df = values_to_frame(values["roster"])
+        return {
+            "settings": _settings_from_values(values["settings"]),
+            "roster": _parse_or({}, parse_roster, roster_df),
+            "classes": _parse_or(([], []), parse_sorted_classes, roster_df),
+            "inspectors": _parse_or(DEFAULT_INSPECTORS, parse_inspector_list, values_to_frame(values["inspectors"])),
+            "teachers": _parse_or({}, parse_teacher_emails, values_to_frame(values["teachers"])),
+            "duty": duty_df,
+            "duty_status": duty_status,
+            "fetched_at": time.time(),
+        }
+
+    @st.cache_data
+    def load_settings(settings_version: int) -> dict:
+        """save_setting 之後只重抓 settings 分頁；版本號為快取 key。"""
+        return _settings_from_values(_fetch_reference_values(["settings"])["settings"])
+
+    @st.cache_data(ttl=DUTY_CACHE_TTL)
+    def load_duty(reference_version: int = 0):
+        """只重抓晨掃輪值表，回傳 (duty_df, 狀態)；整批讀回的輪值表過期後使用。"""
+        return _duty_from_values(_fetch_reference_values(["duty"])["duty"])
+
+    def get_reference_data() -> dict:
+        versions = _get_dataset_versions()
+        ref = load_reference_data(versions["reference"])
+        if versions["settings"] != versions["settings_base"]:
+            ref["settings"] = load_settings(versions["settings"])
+        return ref
+
+    def reload_reference_data():
+        """「重新讀取快取」：下一次讀取時以一次批次請求重抓全部參考資料（含 settings）。"""
+        versions = _get_dataset_versions()
+        invalidate_dataset("reference")
+        versions["settings_base"] = versions["settings"]
+
     def get_daily_duty(target_date):
-        ws = get_worksheet(SHEET_TABS["duty"])
-        if not ws: return [], "error"
-        try:
-            df = pd.DataFrame(ws.get_all_records())
-            if df.empty: return [], "no_data"
-            date_col = next((c for c in df.columns if "日期" in c), None)
-            id_col = next((c for c in df.columns if "學號" in c), None)
-            loc_col = next((c for c in df.columns if "地點" in c), None)
-            if date_col and id_col:
-                df[date_col] = pd.to_datetime(df[date_col], errors='coerce').dt.date
-                t_date = target_date if isinstance(target_date, date) else target_date.date()
-                today_df = df[df[date_col] == t_date]
-                res = []
-                for _, row in today_df.iterrows():
-                    res.append({"學號": clean_id(row[id_col]), "掃地區域": str(row[loc_col]).strip() if loc_col else "", "已完成打掃": False})
-                return res, "success"
-            return [], "missing_cols"
-        except: return [], "error"
-
-    @st.cache_data(ttl=21600)
-    def load_settings():
-        ws = get_worksheet(SHEET_TABS["settings"])
-        config = {"semester_start": "2025-08-25"}
-        if ws:
-            try:
-                data = ws.get_all_values()
-                for row in data:
-                    if len(row)>=2 and row[0] == "semester_start": config["semester_start"] = row[1]
-            except: pass
-        return config
+        reference_version = dataset_version("reference")
+        ref = load_reference_data(reference_version)
+        if time.time() - ref["fetched_at"] < DUTY_CACHE_TTL: duty_df, duty_status = ref["duty"], ref["duty_status"]
+        else: duty_df, duty_status = load_duty(reference_version)
+        if duty_status != "success": return [], duty_status
+        t_date = target_date if isinstance(target_date, date) else target_date.date()
+        today_df = duty_df[duty_df["日期"] == t_date]
+        return [{"學號": sid, "掃地區域": loc, "已完成打掃": False}
+                for sid, loc in zip(today_df["學號"], today_df["掃地區域"])], "success"
 
     def save_setting(key, val):
         ws = get_worksheet(SHEET_TABS["settings"])
@@ -785,7 +1472,7 @@ try:
                 cell = ws.find(key)
                 if cell: ws.update_cell(cell.row, cell.col+1, val)
                 else: ws.append_row([key, val])
-                st.cache_data.clear()
+                invalidate_dataset("settings")
                 return True
             except: return False
         return False
@@ -816,25 +1503,55 @@ try:
         except Exception as e:
             return sent_count, str(e)
 
-    def check_duplicate_record(df, check_date, inspector, role, target_class=None):
-        if df.empty: return False
+    def _duplicate_keys(df: pd.DataFrame) -> set:
+        """評分紀錄的 (日期, 檢查人員, 評分項目, 班級) 集合；日期無法解析的列略過。"""
+        if df.empty: return set()
+        days = parse_dates(df["日期"])
+        valid = days.notna().to_numpy()
+        rows = df[valid]
+        return set(zip(days[valid].dt.date, rows["檢查人員"].astype(str), rows["評分項目"].astype(str), rows["班級"].astype(str)))
+
+    def _load_duplicate_index() -> tuple[dict, set]:
+        """
+        回傳 (副本 meta, 已寫入試算表的評分索引)。索引跟著 main_data 快取：第一次用到時整份建立，
+        之後副本新增的列在更新快取時直接加入，不會每次重建。回傳的集合為共用快取，不可修改。
+        """
+        cache = _get_main_frame_cache()
+        with cache["lock"]:
+            _refresh_main_frame_cache(cache)
+            if cache["dup_keys"] is None:
+                cache["dup_keys"] = _duplicate_keys(cache["frame"])
+            return cache["meta"], cache["dup_keys"]
+
+    def check_duplicate_record(check_date, inspector, role, target_class) -> bool:
+        """這位糾察當天是否已評過這個班的這個項目（含佇列中還沒寫進試算表的評分）。"""
         try:
-            df["日期Str"] = df["日期"].astype(str)
-            check_date_str = str(check_date)
-            mask = (df["日期Str"] == check_date_str) & (df["檢查人員"] == inspector) & (df["評分項目"] == role)
-            if target_class: mask = mask & (df["班級"] == target_class)
-            return not df[mask].empty
-        except: return False
+            if get_sheet_replica().meta("main")["synced_at"] is None:
+                sync_replica("main")
+            meta, index = _load_duplicate_index()
+            key = (check_date, str(inspector), str(role), str(target_class))
+            if key in index:
+                return True
+            # 佇列中（含已寫入但副本還沒同步到）的評分只有少量，每次直接建
+            return key in _duplicate_keys(load_pending_main_entries(meta["read_at"]))
+        except Exception as e:
+            print(f"⚠️ 重複評分檢查失敗: {e}")
+            return False
+
+    # 啟動背景 worker 與副本同步（放在所有函式定義之後，背景執行緒才不會呼叫到尚未定義的函式）
+    _worker_stop_event = start_background_worker()
+    _replica_stop_event = start_replica_sync()
 
     # ==========================================
     # 3. 主程式介面
     # ==========================================
-    SYSTEM_CONFIG = load_settings()
-    ROSTER_DICT = load_roster_dict()
-    INSPECTOR_LIST = load_inspector_list()
-    TEACHER_MAILS = load_teacher_emails()
+    REFERENCE_DATA = get_reference_data()
+    SYSTEM_CONFIG = REFERENCE_DATA["settings"]
+    ROSTER_DICT = REFERENCE_DATA["roster"]
+    INSPECTOR_LIST = REFERENCE_DATA["inspectors"]
+    TEACHER_MAILS = REFERENCE_DATA["teachers"]
     
-    all_classes, structured_classes = load_sorted_classes()
+    all_classes, structured_classes = REFERENCE_DATA["classes"]
     if not all_classes:
         all_classes = ["測試班級"]
         structured_classes = [{"grade": "其他", "name": "測試班級"}]
@@ -848,6 +1565,69 @@ try:
             return max(0, ((d - start).days // 7) + 1)
         except: return 0
 
+    @st.fragment
+    def render_class_records(c_df: pd.DataFrame, cls: str):
+        """
+        衛生股長頁的紀錄清單（依登錄時間新到舊）：每頁 RECORDS_PER_PAGE 筆，換頁或展開紀錄只重跑這一段。
+        紀錄展開時才載入照片與申訴表單；申訴表單只給 3 天申訴期內、有扣分的紀錄。
+        """
+        three_days_ago = date.today() - timedelta(days=3)
+        total_raw = c_df["內掃原始分"] + c_df["外掃原始分"] + c_df["垃圾原始分"] + c_df["晨間打掃原始分"]
+        # 日期無法解析的紀錄（NaT）比較結果為 False，視為已過申訴期
+        appealable = (parse_dates(c_df["日期"]) >= pd.Timestamp(three_days_ago)) & ((total_raw > 0) | (c_df["手機人數"] > 0))
+
+        f1, f2 = st.columns([3, 1])
+        only_open = f1.toggle(f"只顯示仍可申訴的紀錄（{int(appealable.sum())} 筆）", key=f"only_open_{cls}")
+        view = c_df[appealable] if only_open else c_df
+        if view.empty:
+            st.info("目前沒有可申訴的紀錄"); return
+        pages = max(1, -(-len(view) // RECORDS_PER_PAGE))
+        page = int(f2.number_input(f"頁次（共 {pages} 頁）", min_value=1, max_value=pages, value=1, step=1,
+                                   key=f"record_page_{cls}_{only_open}"))
+        start = (page - 1) * RECORDS_PER_PAGE
+        st.caption(f"共 {len(view)} 筆，第 {start + 1}–{min(start + RECORDS_PER_PAGE, len(view))} 筆")
+
+        for idx, r in view.iloc[start:start + RECORDS_PER_PAGE].iterrows():
+            raw = total_raw[idx]
+            phone_msg = f" | 📱手機: {r['手機人數']}" if r['手機人數'] > 0 else ""
+            exp = st.expander(f"{r['日期']} - {r['評分項目']} (扣分: {raw}){phone_msg}",
+                              key=f"record_{r['紀錄ID']}_{idx}", on_change="rerun")
+            if not exp.open:
+                continue
+            with exp:
+                st.write(f"📝 說明: {r['備註']}"); st.caption(f"檢查人員: {r['檢查人員']}")
+                raw_photo_path = str(r.get("照片路徑", "")).strip()
+                if raw_photo_path and raw_photo_path.lower() != "nan":
+                    path_list = [p.strip() for p in raw_photo_path.split(";") if p.strip()]
+                    valid_photos = [p for p in path_list if p != "UPLOAD_FAILED" and (p.startswith("http") or os.path.exists(p))]
+                    if valid_photos:
+                        captions = [f"違規照片 ({i+1})" for i in range(len(valid_photos))]
+                        st.image(photo_display_sources(valid_photos), caption=captions, width=300)
+                    elif "UPLOAD_FAILED" in path_list: st.warning("⚠️ 照片上傳失敗")
+
+                if raw > 2 and r['晨間打掃原始分'] == 0:
+                    st.info("💡系統提示：單項每日扣分上限為 2 分 (手機、晨掃除外)，最終成績將由後台自動計算上限。")
+
+                if appealable[idx]:
+                    st.markdown("---"); st.markdown("#### 🚨 我要申訴")
+                    form_key = f"appeal_form_{r['紀錄ID']}_{idx}"
+                    with st.form(form_key):
+                        reason = st.text_area("申訴理由", height=80, placeholder="詳細說明...")
+                        proof_file = st.file_uploader("上傳佐證 (必填)", type=["jpg", "png", "jpeg"], key=f"file_{r['紀錄ID']}_{idx}")
+                        if st.form_submit_button("提交申訴"):
+                            if not reason or not proof_file: st.error("❌ 請填寫理由並上傳照片")
+                            else:
+                                appeal_entry = {
+                                    "申訴日期": str(date.today()), "班級": cls, "違規日期": str(r["日期"]),
+                                    "違規項目": f"{r['評分項目']} ({r['備註']})", "原始扣分": str(raw),
+                                    "申訴理由": reason, "處理狀態": "待處理",
+                                    "登錄時間": datetime.now(TW_TZ).strftime("%Y-%m-%d %H:%M:%S"),
+                                    "對應紀錄ID": r['紀錄ID']
+                                }
+                                if save_appeal(appeal_entry, proof_file): st.success("✅ 申訴已提交！"); st.rerun()
+                                else: st.error("提交失敗")
+                elif raw > 0: st.caption("⏳ 已超過 3 天申訴期限。")
+
     now_tw = datetime.now(TW_TZ)
     today_tw = now_tw.date()
 
@@ -856,6 +1636,7 @@ try:
 
     if st.sidebar.button("💥 強制重置系統(清除快取)"):
         st.cache_data.clear()
+        invalidate_sheet_header()
         st.success("記憶體已清除，請重新操作！"); st.rerun()
 
     if st.sidebar.checkbox("顯示系統連線狀態", value=True):
@@ -901,7 +1682,6 @@ try:
                 
                 week_num = get_week_num(input_date)
                 st.caption(f"📅 第 {week_num} 週")
-                main_df = load_main_data()
 
                 if role == "垃圾/回收檢查":
                     st.info("🗑️ 全校垃圾檢查 (每日每班上限扣2分)")
@@ -911,15 +1691,15 @@ try:
                         edited_t_df = st.data_editor(pd.DataFrame(t_data), hide_index=True, height=400, use_container_width=True)
                         if st.form_submit_button("送出"):
                             base = {"日期": input_date, "週次": week_num, "檢查人員": inspector_name, "登錄時間": now_tw.strftime("%Y-%m-%d %H:%M:%S"), "修正": False}
-                            cnt = 0
+                            entries = []
                             for _, row in edited_t_df.iterrows():
                                 vios = []
                                 if row["無簽名"]: vios.append("無簽名")
                                 if row["無分類"]: vios.append("無分類")
                                 if vios:
-                                    save_entry({**base, "班級": row["班級"], "評分項目": role, "垃圾原始分": len(vios), "備註": f"{trash_cat}-{'、'.join(vios)}", "違規細項": trash_cat})
-                                    cnt += 1
-                            st.success(f"已排入背景處理： {cnt} 班" if cnt else "無違規"); st.rerun()
+                                    entries.append({**base, "班級": row["班級"], "評分項目": role, "垃圾原始分": len(vios), "備註": f"{trash_cat}-{'、'.join(vios)}", "違規細項": trash_cat})
+                            if not entries: st.success("無違規")
+                            elif save_entries_bulk(entries): st.success(f"已排入背景處理： {len(entries)} 班"); st.rerun()
                 else:
                     st.markdown("### 🏫選擇班級")
                     if assigned_classes: selected_class = st.radio("請點選班級", assigned_classes)
@@ -928,7 +1708,7 @@ try:
                         selected_class = st.radio("班級", [c["name"] for c in structured_classes if c["grade"] == g], horizontal=True)
                     
                     if selected_class:
-                        if check_duplicate_record(main_df, input_date, inspector_name, role, selected_class):
+                        if check_duplicate_record(input_date, inspector_name, role, selected_class):
                                 st.warning(f"⚠️ 注意：您今天已經評過「{selected_class}」了！")
                         st.info(f"📍 正在評分：**{selected_class}**")
                         with st.form("scoring_form", clear_on_submit=True):
@@ -960,48 +1740,10 @@ try:
             class_options = [c["name"] for c in structured_classes if c["grade"] == g]
             cls = st.radio("步驟 2：選擇班級", class_options, horizontal=True)
             st.divider()
-            c_df = df[df["班級"] == cls].sort_values("登錄時間", ascending=False)
-            three_days_ago = date.today() - timedelta(days=3)
-            
+            c_df = df[df["班級"] == cls].sort_values("登錄時間", ascending=False, kind="stable")
             if not c_df.empty:
                 st.subheader(f"📊 {cls}近期紀錄")
-                for idx, r in c_df.iterrows():
-                    total_raw = r['內掃原始分']+r['外掃原始分']+r['垃圾原始分']+r['晨間打掃原始分']
-                    phone_msg = f" | 📱手機: {r['手機人數']}" if r['手機人數'] > 0 else ""
-                    with st.expander(f"{r['日期']} - {r['評分項目']} (扣分: {total_raw}){phone_msg}"):
-                        st.write(f"📝 說明: {r['備註']}"); st.caption(f"檢查人員: {r['檢查人員']}")
-                        raw_photo_path = str(r.get("照片路徑", "")).strip()
-                        if raw_photo_path and raw_photo_path.lower() != "nan":
-                            path_list = [p.strip() for p in raw_photo_path.split(";") if p.strip()]
-                            valid_photos = [p for p in path_list if p != "UPLOAD_FAILED" and (p.startswith("http") or os.path.exists(p))]
-                            if valid_photos:
-                                captions = [f"違規照片 ({i+1})" for i in range(len(valid_photos))]
-                                st.image(valid_photos, caption=captions, width=300)
-                            elif "UPLOAD_FAILED" in path_list: st.warning("⚠️ 照片上傳失敗")
-
-                        if total_raw > 2 and r['晨間打掃原始分'] == 0:
-                            st.info("💡系統提示：單項每日扣分上限為 2 分 (手機、晨掃除外)，最終成績將由後台自動計算上限。")
-
-                        record_date_obj = pd.to_datetime(r['日期']).date() if isinstance(r['日期'], str) else r['日期']
-                        if record_date_obj >= three_days_ago and (total_raw > 0 or r['手機人數'] > 0):
-                            st.markdown("---"); st.markdown("#### 🚨 我要申訴")
-                            form_key = f"appeal_form_{r['紀錄ID']}_{idx}"
-                            with st.form(form_key):
-                                reason = st.text_area("申訴理由", height=80, placeholder="詳細說明...")
-                                proof_file = st.file_uploader("上傳佐證 (必填)", type=["jpg", "png", "jpeg"], key=f"file_{idx}")
-                                if st.form_submit_button("提交申訴"):
-                                    if not reason or not proof_file: st.error("❌ 請填寫理由並上傳照片")
-                                    else:
-                                        appeal_entry = {
-                                            "申訴日期": str(date.today()), "班級": cls, "違規日期": str(r["日期"]),
-                                            "違規項目": f"{r['評分項目']} ({r['備註']})", "原始扣分": str(total_raw),
-                                            "申訴理由": reason, "處理狀態": "待處理",
-                                            "登錄時間": datetime.now(TW_TZ).strftime("%Y-%m-%d %H:%M:%S"),
-                                            "對應紀錄ID": r['紀錄ID']
-                                        }
-                                        if save_appeal(appeal_entry, proof_file): st.success("✅ 申訴已提交！"); st.rerun()
-                                        else: st.error("提交失敗")
-                        elif total_raw > 0: st.caption("⏳ 已超過 3 天申訴期限。")
+                render_class_records(c_df, cls)
             else: st.info("無紀錄")
 
     # --- 模式3: 後台 ---
@@ -1012,6 +1754,9 @@ try:
             st.warning(f"🚀 背景系統忙碌中：尚有 {q_size} 筆資料排隊寫入（SQLite Queue）...")
         else:
             st.success("✅ 系統待機中：所有資料已同步完成")
+        with st.expander("📊 佇列分道狀況", expanded=q_size > 0):
+            st.dataframe(get_queue_lane_stats(), hide_index=True, use_container_width=True)
+            st.caption(f"優先順序：即時評分 > 申訴 > 整批登錄；每排隊 {QUEUE_AGING_SECONDS:.0f} 秒優先權提高一級，整批任務不會一直被插隊。")
 
         pwd = st.text_input("管理密碼", type="password")
         if pwd == st.secrets["system_config"]["admin_password"]:
@@ -1022,31 +1767,16 @@ try:
             
             with tab1: # 成績總表
                 st.subheader("成績排行榜與總表")
-                df = load_main_data()
-                all_classes_df = pd.DataFrame(all_classes, columns=["班級"])
-                if not df.empty:
-                    valid_weeks = sorted(df[df["週次"]>0]["週次"].unique())
+                if get_sheet_replica().meta("main")["synced_at"] is None:
+                    sync_replica("main")
+                # 直接查成績彙總表（背景寫入／刪除／申訴核可時已逐筆更新），不重算整份歷史
+                score_table = get_score_table()
+                valid_weeks = score_table.weeks()
+                if valid_weeks:
                     # [Fix]: Added key='week_select_summary' to avoid ID collision
                     selected_weeks = st.multiselect("選擇週次", valid_weeks, default=valid_weeks[-1:] if valid_weeks else [], key='week_select_summary')
                     if selected_weeks:
-                        wdf = df[df["週次"].isin(selected_weeks)].copy()
-                        daily_agg = wdf.groupby(["日期", "班級"]).agg({
-                            "內掃原始分": "sum", "外掃原始分": "sum", "垃圾原始分": "sum",
-                            "晨間打掃原始分": "sum", "手機人數": "sum"
-                        }).reset_index()
-                        daily_agg["內掃結算"] = daily_agg["內掃原始分"].apply(lambda x: min(x, 2))
-                        daily_agg["外掃結算"] = daily_agg["外掃原始分"].apply(lambda x: min(x, 2))
-                        daily_agg["垃圾結算"] = daily_agg["垃圾原始分"].apply(lambda x: min(x, 2))
-                        daily_agg["每日總扣分"] = (daily_agg["內掃結算"] + daily_agg["外掃結算"] + 
-                                                 daily_agg["垃圾結算"] + daily_agg["晨間打掃原始分"] + daily_agg["手機人數"])
-                        violation_report = daily_agg.groupby("班級").agg({
-                            "內掃結算": "sum", "外掃結算": "sum", "垃圾結算": "sum",
-                            "晨間打掃原始分": "sum", "手機人數": "sum", "每日總扣分": "sum"
-                        }).reset_index()
-                        violation_report.columns = ["班級", "內掃扣分", "外掃扣分", "垃圾扣分", "晨掃扣分", "手機扣分", "總扣分"]
-                        final_report = pd.merge(all_classes_df, violation_report, on="班級", how="left").fillna(0)
-                        final_report["總成績"] = 90 - final_report["總扣分"]
-                        final_report = final_report.sort_values("總成績", ascending=False)
+                        final_report = score_table.summary(selected_weeks, all_classes)
                         st.dataframe(final_report, column_config={
                             "總成績": st.column_config.ProgressColumn("總成績", format="%d", min_value=60, max_value=90),
                             "總扣分": st.column_config.NumberColumn("總扣分", format="%d 分")
@@ -1065,7 +1795,7 @@ try:
                     s_weeks = st.multiselect("選擇週次", valid_weeks, default=valid_weeks[-1:] if valid_weeks else [], key='week_select_detail')
                     if s_weeks:
                         detail_df = df[df["週次"].isin(s_weeks)].copy()
-                        detail_df["該筆扣分"] = detail_df["內掃原始分"] + detail_df["外掃原始分"] + detail_df["垃圾原始分"] + detail_df["晨間打掃原始分"] + detail_df["手機人數"]
+                        detail_df["該筆扣分"] = entry_deductions(detail_df, approved_record_ids(load_appeals()))
                         detail_df = detail_df[detail_df["該筆扣分"] > 0]
                         display_cols = ["日期", "班級", "評分項目", "該筆扣分", "備註", "檢查人員", "違規細項", "紀錄ID"]
                         detail_df = detail_df[display_cols].sort_values(["日期", "班級"])
@@ -1081,17 +1811,9 @@ try:
                 if "mail_preview" not in st.session_state: st.session_state.mail_preview = None
                 if st.button("🔍 搜尋當日違規"):
                     df = load_main_data()
-                    try:
-                        df["日期Obj"] = pd.to_datetime(df["日期"], errors='coerce').dt.date
-                        day_df = df[df["日期Obj"] == target_date]
-                    except: day_df = pd.DataFrame()
+                    day_df = filter_range(df, start=target_date, end=target_date)
                     if not day_df.empty:
-                        stats = day_df.groupby("班級")[["內掃原始分", "外掃原始分", "垃圾原始分", "晨間打掃原始分", "手機人數"]].sum().reset_index()
-                        stats["內掃"] = stats["內掃原始分"].clip(upper=2)
-                        stats["外掃"] = stats["外掃原始分"].clip(upper=2)
-                        stats["垃圾"] = stats["垃圾原始分"].clip(upper=2)
-                        stats["當日總扣分"] = stats["內掃"] + stats["外掃"] + stats["垃圾"] + stats["晨間打掃原始分"] + stats["手機人數"]
-                        violation_classes = stats[stats["當日總扣分"] > 0]
+                        violation_classes = day_totals(day_df, target_date, approved_record_ids(load_appeals()))
                         if not violation_classes.empty:
                             preview_data = []
                             for _, row in violation_classes.iterrows():
@@ -1130,6 +1852,21 @@ try:
                 pending = appeals_df[appeals_df["處理狀態"] == "待處理"]
                 if not pending.empty:
                     st.info(f"待審核: {len(pending)} 件")
+                    with st.expander("📦 批次審核"):
+                        bulk_opts = {i: f"{r['班級']} | {r['違規項目']} | 扣 {r['原始扣分']} 分" for i, r in pending.iterrows()}
+                        bulk_ids = st.multiselect("選擇申訴案件", list(bulk_opts.keys()), format_func=lambda x: bulk_opts[x], key="bulk_appeal_ids")
+                        bb1, bb2 = st.columns(2)
+                        if bb1.button("✅ 批次核可", disabled=not bulk_ids):
+                            succ, msg = review_appeals([(pending.loc[i], "已核可") for i in bulk_ids])
+                            if succ: st.success(msg); st.rerun()
+                            else: st.error(msg)
+                        if bb2.button("🚫 批次駁回", disabled=not bulk_ids):
+                            succ, msg = review_appeals([(pending.loc[i], "已駁回") for i in bulk_ids])
+                            if succ: st.warning(msg); st.rerun()
+                            else: st.error(msg)
+                    # 佐證照片一次取出（快取沒有的同時向 Drive 抓），不在迴圈裡逐張下載
+                    proof_urls = [u for u in pending["佐證照片"].astype(str) if u and u != "UPLOAD_FAILED"]
+                    proof_sources = dict(zip(proof_urls, photo_display_sources(proof_urls)))
                     for idx, row in pending.iterrows():
                         with st.container(border=True):
                             c1, c2 = st.columns([2, 1])
@@ -1138,13 +1875,13 @@ try:
                                 st.markdown(f"理由：{row['申訴理由']}")
                             with c2:
                                 url = row.get("佐證照片", "")
-                                if url and url != "UPLOAD_FAILED": st.image(url, width=150)
+                                if url and url != "UPLOAD_FAILED": st.image(proof_sources.get(str(url), url), width=150)
                             b1, b2 = st.columns(2)
                             if b1.button("✅ 核可", key=f"ok_{idx}"):
-                                succ, msg = update_appeal_status(idx, "已核可", row["對應紀錄ID"])
+                                succ, msg = update_appeal_status(row, "已核可")
                                 if succ: st.success("已核可"); time.sleep(1); st.rerun()
                             if b2.button("🚫 駁回", key=f"ng_{idx}"):
-                                succ, msg = update_appeal_status(idx, "已駁回", row["對應紀錄ID"])
+                                succ, msg = update_appeal_status(row, "已駁回")
                                 if succ: st.warning("已駁回"); time.sleep(1); st.rerun()
                 else: st.success("無待審核案件")
                 with st.expander("歷史案件"): st.dataframe(appeals_df[appeals_df["處理狀態"] != "待處理"])
@@ -1156,7 +1893,8 @@ try:
                 if st.button("更新開學日"): save_setting("semester_start", str(nd)); st.success("已更新")
                 st.divider()
                 st.markdown("### 🗑️ 資料維護 (安全刪除版)")
-                df = load_main_data()
+                # 只列出已寫進試算表的資料（佇列中的還不能刪）
+                df = load_main_data(include_pending=False)
                 if not df.empty:
                     del_mode = st.radio("刪除模式", ["單筆刪除", "日期區間刪除"])
                     if del_mode == "單筆刪除":
@@ -1179,7 +1917,7 @@ try:
 
             with tab6:
                 st.info("請至 Google Sheets 修改名單")
-                if st.button("🔄 重新讀取快取"): st.cache_data.clear(); st.success("OK")
+                if st.button("🔄 重新讀取快取"): reload_reference_data(); st.success("OK")
                 st.markdown(f"[開啟試算表]({SHEET_URL})")
 
             with tab7: # 晨掃管理
@@ -1194,13 +1932,13 @@ try:
                         score = st.number_input("扣分", min_value=1, value=1)
                         if st.form_submit_button("送出"):
                             base = {"日期": m_date, "週次": m_week, "檢查人員": "衛生組", "登錄時間": now_tw.strftime("%Y-%m-%d %H:%M:%S"), "修正": False}
-                            cnt = 0
+                            entries = []
                             for _, r in edited[edited["已完成打掃"] == False].iterrows():
                                 tid = clean_id(r["學號"])
                                 cls = ROSTER_DICT.get(tid, f"查無({tid})")
-                                save_entry({**base, "班級": cls, "評分項目": "晨間打掃", "晨間打掃原始分": score, "備註": f"未到-學號:{tid}", "晨掃未到者": tid})
-                                cnt += 1
-                            st.success(f"已排入背景：{cnt} 人"); st.rerun()
+                                entries.append({**base, "班級": cls, "評分項目": "晨間打掃", "晨間打掃原始分": score, "備註": f"未到-學號:{tid}", "晨掃未到者": tid})
+                            if not entries: st.success("全員已完成打掃")
+                            elif save_entries_bulk(entries): st.success(f"已排入背景：{len(entries)} 人"); st.rerun()
                 else: st.warning(f"無輪值資料 ({status})")
 
         else: st.error("密碼錯誤")
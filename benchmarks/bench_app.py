@@ -0,0 +1,354 @@
+"""
+整個 app.py 的離線基準測試：以 fake_google 的替身取代 Google Sheets / Drive / SMTP（可設定延遲與 429 比例），
+在同一個 process 內載入 app.py（streamlit bare mode，不開瀏覽器），依序量測：
+
+1. load_main_data：main_data 有 --rows 筆時的冷啟動（整份同步副本 + 成績彙總表重建 + 轉成 DataFrame）、快取命中、
+   新增一列後的增量更新，以及重複評分檢查
+2. save_entry：--inspectors 位糾察同時送出評分（部分附照片），每次呼叫的延遲與整體吞吐量
+3. background_worker：--workers 條 worker 消化佇列，從送出到寫進試算表的端對端延遲、API 呼叫數與 429 次數；
+   另以 save_entries_bulk 送出一輪全校垃圾檢查
+4. delete_rows_by_ids：刪除散落各處的紀錄
+5. 成績計算：scoring.daily_scores + class_summary 與 ScoreTable.summary
+6. send_bulk_emails：寄送全校導師通知
+
+    python benchmarks/bench_app.py --rows 100000 --inspectors 50
+    python benchmarks/bench_app.py --latency 0.3 --rate-limit 0.05 --backoff-scale 0.1
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import streamlit.logger
+from streamlit import config as st_config
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_google import Backend, FakeSpreadsheet, install  # noqa: E402
+from bench_scoring import make_frame  # noqa: E402
+from bench_images import make_photo  # noqa: E402
+
+REAL_STDOUT = sys.stdout
+
+SECRETS = """\
+[system_config]
+team_password = "team"
+admin_password = "admin"
+drive_folder_id = "bench-folder"
+worker_count = 0
+smtp_email = "bench@example.com"
+smtp_password = "secret"
+
+[gcp_service_account]
+type = "service_account"
+client_email = "bench@example.iam.gserviceaccount.com"
+"""
+
+
+def report(msg: str = ""):
+    print(msg, file=REAL_STDOUT, flush=True)
+
+
+def percentiles(samples) -> str:
+    if not len(samples):
+        return "（無資料）"
+    ms = np.asarray(samples, dtype=float) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return f"p50 {p50:8.1f} ms  p90 {p90:8.1f} ms  p99 {p99:8.1f} ms  max {ms.max():8.1f} ms"
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def seed_reference(sheet: FakeSpreadsheet, n_classes: int):
+    """放入參考資料分頁；回傳 (班級清單, 導師信箱清單)。"""
+    classes = [f"{g}{c:02d}" for g in (1, 2, 3) for c in range(1, n_classes // 3 + 1)]
+    sheet.seed("settings", [["key", "value"], ["semester_start", "2025-08-25"]])
+    sheet.seed("roster", [["學號", "班級"]] + [[str(110000 + i), classes[i % len(classes)]] for i in range(n_classes * 35)])
+    sheet.seed("inspectors", [["學號", "負責項目", "班級範圍"]] + [[str(120000 + i), "機動", ""] for i in range(60)])
+    sheet.seed("teachers", [["班級", "導師", "Email"]] + [[c, f"{c}導師", f"t{c}@example.com"] for c in classes])
+    sheet.seed("duty", [["日期", "學號", "掃地區域"]])
+    return classes, [f"t{c}@example.com" for c in classes]
+
+
+def seed_main(sheet: FakeSpreadsheet, columns: list[str], n_rows: int, n_classes: int):
+    """main_data 放入 n_rows 筆歷史評分（紀錄ID 為 seed0000000 起的流水號）。"""
+    rows = []
+    if n_rows:
+        df = make_frame(n_rows, n_classes=n_classes, n_days=120)
+        df["評分項目"] = "內掃檢查"
+        df["檢查人員"] = "學號: 120000"
+        df["修正"] = "FALSE"
+        df["紀錄ID"] = [f"seed{i:07d}" for i in range(n_rows)]
+        rows = df.reindex(columns=columns, fill_value="").astype(str).values.tolist()
+    return sheet.seed("main_data", [columns] + rows)
+
+
+def load_app(sheet: FakeSpreadsheet, drive: Backend, smtp: Backend) -> dict:
+    """安裝替身後以真的 streamlit（bare mode）執行 app.py，回傳其全域命名空間。"""
+    install(sheet, drive, smtp)
+    # bare mode 每次用到 session / cache 都會警告沒有 ScriptRunContext；設定檔解析時會重設 log 等級，先解析再調低
+    st_config.get_option("logger.level")
+    streamlit.logger.set_log_level("error")
+    ns = {"__name__": "__bench__", "__file__": os.path.join(ROOT, "app.py")}
+    with open(os.path.join(ROOT, "app.py"), encoding="utf-8") as f:
+        code = compile(f.read(), os.path.join(ROOT, "app.py"), "exec")
+    exec(code, ns)
+    return ns
+
+
+def stop_replica_thread(ns: dict):
+    """停掉 app.py 啟動的副本同步執行緒，之後由基準測試自己決定何時同步。"""
+    ns["_replica_stop_event"].set()
+    ns["request_replica_sync"]()
+    for t in threading.enumerate():
+        if "replica_sync_worker" in t.name:
+            t.join(timeout=30)
+
+
+def bench_load(ns: dict):
+    report("== load_main_data ==")
+    _, sec = timed(ns["sync_replica"], "main", full=True)
+    report(f"整份同步副本 + 重建成績彙總表 : {sec * 1000:9.1f} ms")
+    df, sec = timed(ns["load_main_data"])
+    report(f"load_main_data（快取未命中）   : {sec * 1000:9.1f} ms（{len(df):,} 列）")
+    _, sec = timed(ns["load_main_data"])
+    report(f"load_main_data（快取命中）     : {sec * 1000:9.1f} ms")
+    first = df.iloc[0]
+    key = (ns["parse_dates"](df["日期"].iloc[:1]).iloc[0].date(), first["檢查人員"], first["評分項目"], first["班級"])
+    _, sec = timed(ns["check_duplicate_record"], *key)
+    report(f"重複評分檢查（建立索引）       : {sec * 1000:9.1f} ms")
+
+    # 送出一筆後副本只同步到新增的列：快取的 DataFrame 與索引只接上新的列
+    ws = ns["get_worksheet"](ns["SHEET_TABS"]["main"])
+    on_append, ws.on_append = ws.on_append, None
+    ns["_append_main_entry_row"]({**make_entry(0, 0, [first["班級"]]), "紀錄ID": "bench-tail"})
+    ws.on_append = on_append
+    ns["sync_replica"]("main")
+    df, sec = timed(ns["load_main_data"])
+    report(f"load_main_data（新增 1 列後）  : {sec * 1000:9.1f} ms（{len(df):,} 列）")
+    _, sec = timed(ns["check_duplicate_record"], *key)
+    report(f"重複評分檢查（新增 1 列後）    : {sec * 1000:9.1f} ms")
+    return df
+
+
+def make_entry(i: int, inspector: int, classes: list[str]) -> dict:
+    return {
+        "日期": "2025-12-01", "週次": 15, "班級": classes[(i + inspector) % len(classes)],
+        "評分項目": "內掃檢查", "檢查人員": f"學號: {120000 + inspector}",
+        "內掃原始分": 1 + i % 2, "外掃原始分": 0, "垃圾原始分": 0, "垃圾內掃原始分": 0, "垃圾外掃原始分": 0,
+        "晨間打掃原始分": 0, "手機人數": 0, "備註": "", "違規細項": "桌面未清",
+        "照片路徑": "", "登錄時間": "2025-12-01 08:00:00", "修正": False, "晨掃未到者": "", "紀錄ID": "",
+    }
+
+
+def bench_inspectors(ns: dict, args, classes: list[str], enqueued_at: dict):
+    report(f"== save_entry：{args.inspectors} 位糾察同時送出，每人 {args.entries_per_inspector} 筆 ==")
+    body = make_photo(args.photo_width, args.photo_width * 3 // 4, seed=0)
+    latencies = [[] for _ in range(args.inspectors)]
+    barrier = threading.Barrier(args.inspectors)
+
+    def inspector(k: int):
+        barrier.wait()
+        for i in range(args.entries_per_inspector):
+            files = None
+            if args.photo_every and (i % args.photo_every == 0):
+                # JPEG 結尾後接幾個隨機位元組：每張內容雜湊不同（上傳端才不會合併成一次上傳），仍可正常解碼
+                f = io.BytesIO(body + os.urandom(16)); f.name = "photo.jpg"
+                files = [f]
+            started = time.perf_counter()
+            ns["save_entry"](make_entry(i, k, classes), files)
+            latencies[k].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=inspector, args=(k,)) for k in range(args.inspectors)]
+    started = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    wall = time.perf_counter() - started
+    flat = [x for per in latencies for x in per]
+    report(f"save_entry 延遲 : {percentiles(flat)}")
+    report(f"送出吞吐量      : {len(flat) / wall:9.1f} 筆/秒（{len(flat)} 筆，{wall:.2f} 秒）")
+    return len(flat)
+
+
+def bench_drain(ns: dict, args, expected: int, enqueued_at: dict, landed_at: dict, started: float):
+    """等 worker 把所有評分寫進試算表（或逾時），回報端對端延遲。"""
+    deadline = time.monotonic() + args.timeout
+    while len(landed_at) < expected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    wall = time.perf_counter() - started
+    e2e = [landed_at[k] - enqueued_at[k] for k in landed_at if k in enqueued_at]
+    report(f"== background_worker：{args.workers} 條 worker，批次 {args.batch} 筆 ==")
+    report(f"寫入完成       : {len(landed_at)}/{expected} 筆，{wall:.2f} 秒（{len(landed_at) / wall:.1f} 筆/秒）")
+    report(f"送出→寫入延遲  : {percentiles(e2e)}")
+    if len(landed_at) < expected:
+        report(f"⚠️ {args.timeout} 秒內未全部寫入，佇列剩 {ns['get_queue_pending_count']()} 筆")
+
+
+def bench_bulk(ns: dict, args, classes: list[str], sheets: Backend, landed_at: dict):
+    """整批垃圾檢查：全校每班一筆，經 save_entries_bulk 送出，應只有一次 append_rows。"""
+    report(f"== save_entries_bulk：垃圾檢查 {len(classes)} 班 ==")
+    base = {"日期": "2025-12-02", "週次": 15, "評分項目": "垃圾/回收檢查", "檢查人員": "學號: 120001",
+            "登錄時間": "2025-12-02 12:30:00", "修正": False, "違規細項": "一般垃圾"}
+    entries = [{**base, "班級": c, "垃圾原始分": 1, "備註": "一般垃圾-無簽名"} for c in classes]
+    sheets.reset_stats()
+    before = len(landed_at)
+    count, sec = timed(ns["save_entries_bulk"], entries)
+    report(f"save_entries_bulk : {sec * 1000:9.1f} ms（{count} 筆，1 筆任務）")
+    started = time.perf_counter()
+    deadline = time.monotonic() + args.timeout
+    while len(landed_at) < before + count and time.monotonic() < deadline:
+        time.sleep(0.02)
+    report(f"寫入完成          : {len(landed_at) - before}/{count} 筆，{(time.perf_counter() - started) * 1000:.0f} ms")
+    report(sheets.summary())
+
+
+def bench_delete(ns: dict, n_rows: int, n_delete: int):
+    report(f"== delete_rows_by_ids：{n_delete} 筆散落的紀錄 ==")
+    if not n_rows:
+        report("（沒有歷史紀錄，略過）")
+        return
+    rng = np.random.default_rng(1)
+    ids = [f"seed{i:07d}" for i in rng.choice(n_rows, size=min(n_delete, n_rows), replace=False)]
+    ok, sec = timed(ns["delete_rows_by_ids"], ids)
+    report(f"delete_rows_by_ids : {sec * 1000:9.1f} ms（{'成功' if ok else '失敗'}）")
+
+
+def bench_scoring(ns: dict, classes: list[str]):
+    from scoring import daily_scores, class_summary
+    report("== 成績計算 ==")
+    df = ns["load_main_data"]()
+    weeks = sorted(int(w) for w in df["週次"].unique())
+    _, sec = timed(lambda: class_summary(daily_scores(df, weeks=weeks[-1:]), classes))
+    report(f"daily_scores + class_summary（1 週）  : {sec * 1000:9.1f} ms（{len(df):,} 列）")
+    _, sec = timed(lambda: class_summary(daily_scores(df), classes))
+    report(f"daily_scores + class_summary（全部）  : {sec * 1000:9.1f} ms")
+    table = ns["get_score_table"]()
+    _, sec = timed(table.summary, weeks[-1:], classes)
+    report(f"ScoreTable.summary（1 週）            : {sec * 1000:9.1f} ms")
+    _, sec = timed(table.summary, None, classes)
+    report(f"ScoreTable.summary（全部）            : {sec * 1000:9.1f} ms")
+
+
+def bench_mail(ns: dict, emails: list[str]):
+    report(f"== send_bulk_emails：{len(emails)} 位導師 ==")
+    items = [{"email": e, "subject": "衛生評分通知", "body": "今日扣分 2 分"} for e in emails]
+    (sent, msg), sec = timed(ns["send_bulk_emails"], items)
+    report(f"send_bulk_emails : {sec * 1000:9.1f} ms（成功 {sent}/{len(items)}，{msg}）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="main_data 既有紀錄數")
+    parser.add_argument("--classes", type=int, default=60)
+    parser.add_argument("--inspectors", type=int, default=50, help="同時送出評分的糾察人數")
+    parser.add_argument("--entries-per-inspector", type=int, default=10)
+    parser.add_argument("--photo-every", type=int, default=3, help="每幾筆附一張照片（0 表示都不附）")
+    parser.add_argument("--photo-width", type=int, default=4032, help="模擬照片寬度（4:3）")
+    parser.add_argument("--workers", type=int, default=2, help="background_worker 執行緒數")
+    parser.add_argument("--batch", type=int, default=20, help="worker 每次領取的任務數")
+    parser.add_argument("--latency", type=float, default=0.15, help="Sheets API 每次呼叫延遲（秒）")
+    parser.add_argument("--drive-latency", type=float, default=0.4, help="Drive API 每次呼叫延遲（秒）")
+    parser.add_argument("--smtp-latency", type=float, default=0.05, help="SMTP 每封信延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="每次呼叫額外的隨機延遲上限（秒）")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Sheets / Drive 呼叫回 429 的比例")
+    parser.add_argument("--backoff-scale", type=float, default=1.0, help="重試退避時間的縮放倍率")
+    parser.add_argument("--delete", type=int, default=200, help="delete_rows_by_ids 刪除筆數")
+    parser.add_argument("--timeout", type=float, default=600, help="等待佇列消化的上限（秒）")
+    parser.add_argument("--verbose", action="store_true", help="顯示 app.py 的 log")
+    args = parser.parse_args()
+
+    sheets = Backend("sheets", args.latency, args.jitter, args.rate_limit, seed=1)
+    drive = Backend("drive", args.drive_latency, args.jitter, args.rate_limit, seed=2)
+    smtp = Backend("smtp", args.smtp_latency, args.jitter, 0.0, seed=3)
+    sheet = FakeSpreadsheet(sheets)
+
+    workdir = tempfile.TemporaryDirectory()
+    os.makedirs(os.path.join(workdir.name, ".streamlit"))
+    with open(os.path.join(workdir.name, ".streamlit", "secrets.toml"), "w", encoding="utf-8") as f:
+        f.write(SECRETS)
+    os.chdir(workdir.name)  # 佇列、副本資料庫與暫存照片都放在暫存目錄
+
+    classes, emails = seed_reference(sheet, args.classes)
+    sheet.seed("main_data", [])
+
+    log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with log:
+        ns = load_app(sheet, drive, smtp)
+        stop_replica_thread(ns)
+        if args.backoff_scale != 1.0:
+            backoff = ns["_exp_backoff_seconds"]
+            ns["_exp_backoff_seconds"] = lambda attempts: backoff(attempts) * args.backoff_scale
+
+        # 記錄每筆評分的送出時間與寫進 main_data 的時間（以紀錄ID對應）
+        enqueued_at, landed_at = {}, {}
+        enqueue = ns["enqueue_task"]
+
+        def timed_enqueue(task_type, payload):
+            # 先記時間再入列：worker 可能在 enqueue 回傳前就已寫入
+            enqueued_at[payload.get("entry", {}).get("紀錄ID")] = time.perf_counter()
+            return enqueue(task_type, payload)
+
+        ns["enqueue_task"] = timed_enqueue
+        id_col = ns["EXPECTED_COLUMNS"].index("紀錄ID")
+
+        def on_append(rows):
+            now = time.perf_counter()
+            for r in rows:
+                landed_at.setdefault(r[id_col], now)
+
+        ws = seed_main(sheet, ns["EXPECTED_COLUMNS"], args.rows, args.classes)
+        ws.on_append = on_append
+        report(f"main_data {args.rows:,} 筆，Sheets 延遲 {args.latency}s、Drive {args.drive_latency}s、"
+               f"429 比例 {args.rate_limit:.0%}")
+        report()
+
+        bench_load(ns)
+        report()
+
+        sheets.reset_stats(); drive.reset_stats()
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=ns["background_worker"], args=(stop, args.batch, f"bench-{i}"), daemon=True)
+            for i in range(args.workers)
+        ]
+        for t in workers: t.start()
+        started = time.perf_counter()
+        expected = bench_inspectors(ns, args, classes, enqueued_at)
+        bench_drain(ns, args, expected, enqueued_at, landed_at, started)
+        failed_photos = sum(r[ns["EXPECTED_COLUMNS"].index("照片路徑")].count("UPLOAD_FAILED") for r in ws.rows)
+        report(sheets.summary())
+        report(drive.summary())
+        if failed_photos:
+            report(f"⚠️ {failed_photos} 張照片上傳失敗（寫入 UPLOAD_FAILED）")
+        report()
+        bench_bulk(ns, args, classes, sheets, landed_at)
+        stop.set(); ns["get_queue_wakeup"]().set()
+        for t in workers: t.join(timeout=60)
+        report()
+
+        ns["sync_replica"]("main")
+        bench_delete(ns, args.rows, args.delete)
+        report()
+        bench_scoring(ns, classes)
+        report()
+        bench_mail(ns, emails)
+        report(smtp.summary())
+
+    os.chdir(ROOT)
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+照片處理基準：產生手機尺寸的模擬照片（4032x3024 JPEG 帶 EXIF、PNG 截圖），
+量測 image_processing.process_image 的處理時間與上傳大小、縮圖大小的縮減倍率。
+
+    python benchmarks/bench_images.py --count 10
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from image_processing import process_image  # noqa: E402
+
+
+def make_photo(width: int, height: int, seed: int, fmt: str = "JPEG") -> bytes:
+    """有漸層與雜訊的模擬照片（純色圖壓縮率太高，不像真的照片）；JPEG 會附上方向與 GPS 的 EXIF。"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([(x * 255 // width), (y * 255 // height), ((x + y) * 255 // (width + height))], axis=-1)
+    noise = rng.integers(-40, 40, size=(height, width, 3))
+    img = Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), "RGB")
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation：手機直拍
+        exif[0x010F] = "BenchPhone"
+        exif[0x8825] = {1: "N", 2: (25.0, 2.0, 0.0)}  # GPSInfo
+        img.save(buf, format="JPEG", quality=95, exif=exif)
+    else:
+        img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def run(label: str, photos: list[bytes]):
+    started = time.perf_counter()
+    results = [process_image(p) for p in photos]
+    ms = (time.perf_counter() - started) * 1000 / len(photos)
+    original = sum(len(p) for p in photos)
+    uploaded = sum(len(r["data"]) for r in results)
+    thumbs = sum(len(r["thumbnail"]) for r in results)
+    r = results[0]
+    print(f"{label:<22}: {ms:7.1f} ms/張  原檔 {original / len(photos) / 1024:7.0f} KB → 上傳 "
+          f"{uploaded / len(photos) / 1024:5.0f} KB（{original / uploaded:4.1f} 倍）→ 縮圖 "
+          f"{thumbs / len(photos) / 1024:4.0f} KB（{original / thumbs:5.0f} 倍），輸出 {r['width']}x{r['height']}")
+    exif = Image.open(io.BytesIO(r["data"])).getexif()
+    assert not exif, "輸出不應帶 EXIF"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=5)
+    args = parser.parse_args()
+
+    run("手機照片 4032x3024 JPEG", [make_photo(4032, 3024, seed=i) for i in range(args.count)])
+    run("截圖 1170x2532 PNG", [make_photo(1170, 2532, seed=i, fmt="PNG") for i in range(args.count)])
+
+
+if __name__ == "__main__":
+    main()
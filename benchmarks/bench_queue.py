@@ -0,0 +1,107 @@
+"""
+SQLite 佇列微基準：在 task_queue 已有大量 DONE 歷史資料時，量測入列／領取／計數的吞吐量。
+
+    python benchmarks/bench_queue.py --done-rows 100000 --tasks 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from task_queue import TaskQueue  # noqa: E402
+
+
+def seed_done_rows(queue: TaskQueue, n: int):
+    """灌入 n 筆已完成的歷史任務（模擬一整個學期沒有清理的佇列）。"""
+    start = datetime.utcnow() - timedelta(days=120)
+    rows = [
+        (str(uuid.uuid4()), "main_entry", (start + timedelta(seconds=i * 90)).isoformat() + "Z",
+         '{"entry": {}}', "DONE", 1)
+        for i in range(n)
+    ]
+    with queue._transaction() as conn:
+        conn.executemany(
+            "INSERT INTO task_queue (id, task_type, created_ts, payload_json, status, attempts) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def bench_enqueue(queue: TaskQueue, n: int) -> float:
+    payload = {"entry": {"班級": "101", "日期": "2025-09-01"}, "image_paths": [], "filenames": []}
+    _, elapsed = timed(lambda: [queue.enqueue("main_entry", payload) for _ in range(n)])
+    return n / elapsed
+
+
+def bench_claim(queue: TaskQueue, batch: int, worker_id: str) -> tuple[float, int]:
+    done = 0
+    started = time.perf_counter()
+    while True:
+        tasks = queue.claim(worker_id, batch)
+        if not tasks:
+            break
+        queue.update_statuses([(t["id"], "DONE", 1, None) for t in tasks], worker_id=worker_id)
+        done += len(tasks)
+    elapsed = time.perf_counter() - started
+    return (done / elapsed if elapsed else 0.0), done
+
+
+def bench_pending_count(queue: TaskQueue, n: int = 1000) -> float:
+    _, elapsed = timed(lambda: [queue.pending_count() for _ in range(n)])
+    return elapsed / n * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--done-rows", type=int, default=100_000)
+    parser.add_argument("--tasks", type=int, default=2_000)
+    parser.add_argument("--batch", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = TaskQueue(os.path.join(tmp, "bench_queue.db"))
+        _, seed_sec = timed(seed_done_rows, queue, args.done_rows)
+        print(f"歷史資料：{args.done_rows:,} 筆 DONE（灌入 {seed_sec:.1f} 秒）")
+
+        print(f"pending_count        : {bench_pending_count(queue):8.3f} ms/次")
+
+        rate = bench_enqueue(queue, args.tasks)
+        print(f"enqueue              : {rate:10,.0f} 筆/秒")
+        rate, n = bench_claim(queue, 1, "bench-single")
+        print(f"claim+done (batch=1) : {rate:10,.0f} 筆/秒 ({n} 筆)")
+
+        bench_enqueue(queue, args.tasks)
+        rate, n = bench_claim(queue, args.batch, "bench-batch")
+        print(f"claim+done (batch={args.batch}): {rate:10,.0f} 筆/秒 ({n} 筆)")
+
+        # 讀寫並行：後台一直查詢待處理筆數時，worker 的領取速度
+        bench_enqueue(queue, args.tasks)
+        stop = threading.Event()
+        reads = [0]
+
+        def reader():
+            while not stop.is_set():
+                queue.pending_count()
+                reads[0] += 1
+
+        t = threading.Thread(target=reader, daemon=True)
+        t.start()
+        rate, n = bench_claim(queue, args.batch, "bench-contended")
+        stop.set(); t.join()
+        print(f"claim+done + 讀取並行 : {rate:10,.0f} 筆/秒 ({n} 筆，同時完成 {reads[0]:,} 次計數查詢)")
+
+
+if __name__ == "__main__":
+    main()
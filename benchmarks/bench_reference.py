@@ -0,0 +1,164 @@
+"""
+參考資料解析基準：量測冷啟動時解析 roster / inspectors / teachers / duty 的時間，
+比較舊的逐列 iterrows + clean_id 寫法與 reference_data 的向量化寫法，並確認兩者結果相同。
+
+    python benchmarks/bench_reference.py --rows 2000 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from reference_data import (  # noqa: E402
+    clean_id, clean_ids, values_to_frame, parse_roster, parse_teacher_emails, parse_inspector_list, parse_duty,
+)
+
+ROLES = ["組長", "機動", "外掃", "垃圾", "晨掃", "內掃", "外掃、垃圾", ""]
+
+
+def make_values(n_roster: int, seed: int = 0) -> dict:
+    """依名冊列數產生一份模擬的參考分頁（值為字串，同 values_batch_get 回傳）。"""
+    rnd = random.Random(seed)
+    classes = [f"{g}{c:02d}" for g in (1, 2, 3) for c in range(1, 21)]
+    roster = [["學號", "姓名", "班級"]]
+    for i in range(n_roster):
+        sid = str(110000 + i)
+        roster.append([sid + (".0" if rnd.random() < 0.05 else ""), f"學生{i}", rnd.choice(classes)])
+    roster.append(["", "空白列", ""])
+    n_insp = max(20, n_roster // 40)
+    inspectors = [["學號", "負責項目", "班級範圍"]] + [
+        [str(210000 + i), rnd.choice(ROLES), "、".join(rnd.sample(classes, rnd.randint(0, 4)))]
+        for i in range(n_insp)
+    ]
+    teachers = [["班級", "導師", "Email"]] + [
+        [c, f"導師{c}", f"t{c}@school.edu" if rnd.random() < 0.9 else "未填"] for c in classes
+    ]
+    start = date(2025, 9, 1)
+    duty = [["日期", "學號", "地點"]] + [
+        [(start + timedelta(days=i % 120)).isoformat(), str(110000 + rnd.randrange(n_roster)), f"區域{i % 30}"]
+        for i in range(max(200, n_roster // 4))
+    ]
+    return {"roster": roster, "inspectors": inspectors, "teachers": teachers, "duty": duty}
+
+
+# --- 舊寫法（逐列 iterrows，保留作為比較基準） -------------------------------
+
+def legacy_roster(df):
+    roster_dict = {}
+    id_col = next((c for c in df.columns if "學號" in c), None)
+    class_col = next((c for c in df.columns if "班級" in c), None)
+    if id_col and class_col:
+        for _, row in df.iterrows():
+            sid = clean_id(row[id_col])
+            if sid: roster_dict[sid] = str(row[class_col]).strip()
+    return roster_dict
+
+
+def legacy_teachers(df):
+    email_dict = {}
+    class_col = next((c for c in df.columns if "班級" in c), None)
+    mail_col = next((c for c in df.columns if "Email" in c or "信箱" in c or "郵件" in c), None)
+    name_col = next((c for c in df.columns if "導師" in c or "姓名" in c), None)
+    if class_col and mail_col:
+        for _, row in df.iterrows():
+            cls = str(row[class_col]).strip()
+            mail = str(row[mail_col]).strip()
+            name = str(row[name_col]).strip() if name_col else "老師"
+            if cls and mail and "@" in mail:
+                email_dict[cls] = {"email": mail, "name": name}
+    return email_dict
+
+
+def legacy_inspectors(df):
+    inspectors = []
+    id_col = next((c for c in df.columns if "學號" in c or "編號" in c), None)
+    role_col = next((c for c in df.columns if "負責" in c or "項目" in c), None)
+    scope_col = next((c for c in df.columns if "班級" in c or "範圍" in c), None)
+    for _, row in df.iterrows():
+        s_id = clean_id(row[id_col])
+        s_role = str(row[role_col]).strip() if role_col else ""
+        allowed = []
+        if "組長" in s_role: allowed = ["內掃檢查", "外掃檢查", "垃圾/回收檢查", "晨間打掃"]
+        elif "機動" in s_role: allowed = ["內掃檢查", "外掃檢查", "垃圾/回收檢查"]
+        else:
+            if "外掃" in s_role: allowed.append("外掃檢查")
+            if "垃圾" in s_role: allowed.append("垃圾/回收檢查")
+            if "晨" in s_role: allowed.append("晨間打掃")
+            if "內掃" in s_role: allowed.append("內掃檢查")
+        if not allowed: allowed = ["內掃檢查"]
+        s_classes = []
+        if scope_col and str(row[scope_col]):
+            raw = str(row[scope_col])
+            s_classes = [c.strip() for c in raw.replace("、", ";").replace(",", ";").split(";") if c.strip()]
+        prefix = s_id[0] if len(s_id) > 0 else "X"
+        inspectors.append({"label": f"學號: {s_id}", "allowed_roles": allowed, "assigned_classes": s_classes, "id_prefix": prefix})
+    return inspectors
+
+
+def legacy_duty(df, target):
+    date_col, id_col, loc_col = "日期", "學號", "地點"
+    df = df.copy()
+    df[date_col] = pd.to_datetime(df[date_col], errors='coerce').dt.date
+    res = []
+    for _, row in df[df[date_col] == target].iterrows():
+        res.append({"學號": clean_id(row[id_col]), "掃地區域": str(row[loc_col]).strip(), "已完成打掃": False})
+    return res
+
+
+def vectorized_duty(df, target):
+    duty, _ = parse_duty(df)
+    today = duty[duty["日期"] == target]
+    return [{"學號": s, "掃地區域": loc, "已完成打掃": False} for s, loc in zip(today["學號"], today["掃地區域"])]
+
+
+def timed(fn, *args, repeat: int = 3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return result, best * 1000
+
+
+def check_clean_ids():
+    samples = ["110001", "110001.0", " 42 ", "", None, float("nan"), "1e3", "-3.7", "inf", "nan", "A123", 123, 4.0, "0012"]
+    expected = [clean_id(v) for v in samples]
+    got = clean_ids(samples).tolist()
+    assert got == expected, (got, expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[2000, 20000], help="名冊列數")
+    args = parser.parse_args()
+
+    check_clean_ids()
+    target = date(2025, 9, 15)
+    for n in args.rows:
+        values = make_values(n)
+        frames = {k: values_to_frame(v) for k, v in values.items()}
+        print(f"== 名冊 {n:,} 列（糾察 {len(frames['inspectors']):,}、導師 {len(frames['teachers']):,}、輪值 {len(frames['duty']):,}） ==")
+        total_old = total_new = 0.0
+        for name, old, new, extra in (
+            ("roster", legacy_roster, parse_roster, ()),
+            ("teachers", legacy_teachers, parse_teacher_emails, ()),
+            ("inspectors", legacy_inspectors, parse_inspector_list, ()),
+            ("duty*", legacy_duty, vectorized_duty, (target,)),
+        ):
+            old_res, old_ms = timed(old, frames[name.rstrip("*")], *extra)
+            new_res, new_ms = timed(new, frames[name.rstrip("*")], *extra)
+            assert old_res == new_res, f"{name} 結果不一致"
+            total_old += old_ms; total_new += new_ms
+            print(f"{name:<11}: iterrows {old_ms:9.1f} ms → 向量化 {new_ms:8.1f} ms（{old_ms / max(new_ms, 1e-9):5.1f} 倍）")
+        print(f"{'合計':<10}: iterrows {total_old:9.1f} ms → 向量化 {total_new:8.1f} ms（{total_old / max(total_new, 1e-9):5.1f} 倍）")
+        print("  * duty：舊寫法每查一天就重抓重解析一次（只 clean_id 當天的列）；新寫法整份解析一次後隨快取重複使用")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+計分基準：模擬多個學期累積的 main_data（預設 100 萬列），量測 scoring 模組的每日／每週／總表計算時間，
+並與原本成績總表的 groupby + apply(min) 寫法比較（兩者結果須一致）；最後量測 ScoreTable 物化表的重建與查詢。
+
+    python benchmarks/bench_scoring.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scoring import RAW_COLUMNS, daily_scores, weekly_scores, class_summary, day_totals  # noqa: E402
+from score_table import ScoreTable  # noqa: E402
+
+
+def make_frame(n: int, n_classes: int = 60, n_days: int = 600, seed: int = 0, trash_split: bool = True) -> pd.DataFrame:
+    """產生 n 筆模擬評分紀錄；trash_split=False 時垃圾內掃／外掃欄位全為 0（用來和舊寫法比對）。"""
+    rng = np.random.default_rng(seed)
+    start = date(2025, 8, 25)
+    days = np.array([(start + timedelta(days=int(d))).isoformat() for d in range(n_days)], dtype=object)
+    classes = np.array([f"{g}{c:02d}" for g in (1, 2, 3) for c in range(1, n_classes // 3 + 1)], dtype=object)
+    day_idx = rng.integers(0, n_days, n)
+    df = pd.DataFrame({
+        "日期": days[day_idx],
+        "週次": day_idx // 7 + 1,
+        "班級": classes[rng.integers(0, len(classes), n)],
+    })
+    for col in RAW_COLUMNS:
+        if col.startswith("垃圾") and col != "垃圾原始分" and not trash_split:
+            df[col] = 0
+        else:
+            df[col] = rng.choice([0, 0, 0, 0, 1, 2, 3], n)
+    return df
+
+
+def legacy_summary(df: pd.DataFrame, weeks, all_classes) -> pd.DataFrame:
+    """原本「成績總表」分頁的寫法（不含垃圾內掃／外掃欄位）。"""
+    wdf = df[df["週次"].isin(weeks)].copy()
+    daily_agg = wdf.groupby(["日期", "班級"]).agg({
+        "內掃原始分": "sum", "外掃原始分": "sum", "垃圾原始分": "sum",
+        "晨間打掃原始分": "sum", "手機人數": "sum"
+    }).reset_index()
+    daily_agg["內掃結算"] = daily_agg["內掃原始分"].apply(lambda x: min(x, 2))
+    daily_agg["外掃結算"] = daily_agg["外掃原始分"].apply(lambda x: min(x, 2))
+    daily_agg["垃圾結算"] = daily_agg["垃圾原始分"].apply(lambda x: min(x, 2))
+    daily_agg["每日總扣分"] = (daily_agg["內掃結算"] + daily_agg["外掃結算"] +
+                             daily_agg["垃圾結算"] + daily_agg["晨間打掃原始分"] + daily_agg["手機人數"])
+    violation_report = daily_agg.groupby("班級").agg({
+        "內掃結算": "sum", "外掃結算": "sum", "垃圾結算": "sum",
+        "晨間打掃原始分": "sum", "手機人數": "sum", "每日總扣分": "sum"
+    }).reset_index()
+    violation_report.columns = ["班級", "內掃扣分", "外掃扣分", "垃圾扣分", "晨掃扣分", "手機扣分", "總扣分"]
+    final_report = pd.merge(pd.DataFrame(all_classes, columns=["班級"]), violation_report, on="班級", how="left").fillna(0)
+    final_report["總成績"] = 90 - final_report["總扣分"]
+    return final_report
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def check_against_legacy():
+    df = make_frame(50000, trash_split=False, seed=1)
+    classes = sorted(df["班級"].unique())
+    weeks = [3, 4, 5]
+    old = legacy_summary(df, weeks, classes).sort_values("班級").reset_index(drop=True)
+    new = class_summary(daily_scores(df, weeks=weeks), classes).sort_values("班級").reset_index(drop=True)
+    pd.testing.assert_frame_equal(old.astype("float64", errors="ignore"), new.astype("float64", errors="ignore"),
+                                  check_dtype=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=600, help="模擬的天數（約 4 個學期）")
+    args = parser.parse_args()
+
+    check_against_legacy()
+    df = make_frame(args.rows, n_days=args.days)
+    classes = sorted(df["班級"].unique())
+    last_week = int(df["週次"].max())
+    print(f"== {len(df):,} 筆紀錄，{len(classes)} 班，{args.days} 天 ==")
+
+    _, ms = timed(legacy_summary, df, [last_week], classes)
+    print(f"舊寫法 成績總表（1 週）   : {ms:9.1f} ms")
+    _, ms = timed(legacy_summary, df, list(range(1, last_week + 1)), classes)
+    print(f"舊寫法 成績總表（全部週次）: {ms:9.1f} ms")
+
+    daily, ms = timed(daily_scores, df, weeks=[last_week])
+    _, ms2 = timed(class_summary, daily, classes)
+    print(f"成績總表（1 週）          : {ms + ms2:9.1f} ms")
+
+    daily, ms = timed(daily_scores, df)
+    print(f"daily_scores（全部）      : {ms:9.1f} ms（{len(daily):,} 班日）")
+    weekly, ms = timed(weekly_scores, daily)
+    print(f"weekly_scores（全部）     : {ms:9.1f} ms（{len(weekly):,} 班週）")
+    _, ms = timed(class_summary, daily, classes)
+    print(f"class_summary（全部）     : {ms:9.1f} ms")
+    target = date(2025, 8, 25) + timedelta(days=args.days // 2)
+    _, ms = timed(day_totals, df, target)
+    print(f"day_totals（單日）        : {ms:9.1f} ms")
+
+    # 物化的成績彙總表：重建一次之後，成績總表只是查表
+    df["紀錄ID"] = [f"r{i}" for i in range(len(df))]
+    with tempfile.TemporaryDirectory() as tmp:
+        table = ScoreTable(os.path.join(tmp, "scores.db"))
+        _, ms = timed(table.rebuild, df)
+        print(f"ScoreTable.rebuild       : {ms:9.1f} ms")
+        _, ms = timed(table.summary, [last_week], classes)
+        print(f"ScoreTable.summary（1 週）: {ms:9.1f} ms")
+        _, ms = timed(table.summary, None, classes)
+        print(f"ScoreTable.summary（全部）: {ms:9.1f} ms")
+        _, ms = timed(table.upsert_entries, df.iloc[:20])
+        print(f"ScoreTable.upsert（20 筆）: {ms:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+離線基準測試用的 Google Sheets / Drive / SMTP 替身（同一個 process 內執行，不連網）。
+
+每個替身都掛在一個 Backend 上，可設定每次呼叫的延遲（固定 + 隨機抖動）與 429 注入比例，
+並統計各 API 的呼叫次數與被注入的錯誤次數。install() 會把 gspread.authorize、
+ServiceAccountCredentials、googleapiclient.discovery.build 與 smtplib.SMTP 換成替身，
+之後載入的 app.py 不需任何修改就會使用它們。
+"""
+import random
+import re
+import smtplib
+import threading
+import time
+from collections import Counter
+
+import gspread
+import googleapiclient.discovery
+from gspread.utils import a1_to_rowcol
+from oauth2client.service_account import ServiceAccountCredentials
+
+
+class RateLimitError(Exception):
+    """模擬 Google API 的 429（訊息含 "429"，app.py 依字串判斷是否為配額錯誤）。"""
+
+
+class Backend:
+    """一組替身共用的延遲與錯誤注入設定，thread-safe。"""
+
+    def __init__(self, name: str, latency: float = 0.0, jitter: float = 0.0, rate_limit: float = 0.0, seed: int = 0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.errors = Counter()
+        self.bytes = 0  # 上傳內容的總位元組數（Drive）
+
+    def call(self, api: str, rate_limited: bool = True):
+        with self._lock:
+            self.calls[api] += 1
+            delay = self.latency + (self._rnd.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = rate_limited and self.rate_limit > 0 and self._rnd.random() < self.rate_limit
+            if fail:
+                self.errors[api] += 1
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise RateLimitError(f"APIError: [429]: Quota exceeded ({self.name}.{api})")
+
+    def add_bytes(self, n: int):
+        with self._lock:
+            self.bytes += n
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.errors.clear()
+            self.bytes = 0
+
+    def summary(self) -> str:
+        total = sum(self.calls.values())
+        parts = ", ".join(f"{k}={v}" for k, v in sorted(self.calls.items()))
+        errs = sum(self.errors.values())
+        uploaded = f"，上傳 {self.bytes / (1024 * 1024):.1f} MB" if self.bytes else ""
+        return f"{self.name}: {total} 次呼叫（{parts}），注入 429 {errs} 次{uploaded}"
+
+
+def _cell(v) -> str:
+    """值以 USER_ENTERED 寫入後讀回的字串形式。"""
+    if v is None: return ""
+    if isinstance(v, bool): return "TRUE" if v else "FALSE"
+    return str(v)
+
+
+def _trim(rows: list[list]) -> list[list]:
+    """Sheets API 回傳值會去掉每列尾端與最後面的空白。"""
+    out = []
+    for r in rows:
+        r = list(r)
+        while r and r[-1] == "":
+            r.pop()
+        out.append(r)
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+_RANGE_RE = re.compile(r"^([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+
+
+def _col_index(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+class FakeCell:
+    def __init__(self, row: int, col: int, value: str):
+        self.row, self.col, self.value = row, col, value
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet: "FakeSpreadsheet", title: str, sheet_id: int, rows=None):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.rows: list[list[str]] = [[_cell(v) for v in r] for r in (rows or [])]
+        self.lock = threading.Lock()
+        self.on_append = None  # callback(rows)：基準測試用來記錄資料落地時間
+
+    @property
+    def backend(self) -> Backend:
+        return self.spreadsheet.backend
+
+    # --- 讀取 ---
+    def get_all_values(self, **kwargs):
+        self.backend.call("get_all_values")
+        with self.lock:
+            width = max((len(r) for r in self.rows), default=0)
+            return [list(r) + [""] * (width - len(r)) for r in self.rows]
+
+    def get_all_records(self, **kwargs):
+        values = self.get_all_values()
+        if not values: return []
+        header = values[0]
+        return [dict(zip(header, r)) for r in values[1:]]
+
+    def row_values(self, row: int, **kwargs):
+        self.backend.call("row_values")
+        with self.lock:
+            return _trim([self.rows[row - 1]])[0] if len(self.rows) >= row and self.rows[row - 1] else []
+
+    def col_values(self, col: int, **kwargs):
+        self.backend.call("col_values")
+        with self.lock:
+            values = [r[col - 1] if len(r) >= col else "" for r in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def _read_range(self, rng: str) -> list[list]:
+        m = _RANGE_RE.match(rng.split("!")[-1].replace("$", ""))
+        if not m:
+            raise ValueError(f"不支援的範圍: {rng}")
+        c1, r1, c2, r2 = m.groups()
+        c2 = c2 or c1
+        r1 = int(r1) if r1 else 1
+        r2 = int(r2) if r2 else (r1 if m.group(3) is None else len(self.rows))
+        col_lo, col_hi = _col_index(c1), _col_index(c2)
+        with self.lock:
+            block = [r[col_lo - 1:col_hi] for r in self.rows[r1 - 1:r2]]
+        return _trim(block)
+
+    def get(self, rng=None, **kwargs):
+        self.backend.call("get")
+        return self._read_range(rng)
+
+    def batch_get(self, ranges, **kwargs):
+        self.backend.call("batch_get")
+        return [self._read_range(r) for r in ranges]
+
+    def find(self, query, **kwargs):
+        self.backend.call("find")
+        with self.lock:
+            for i, r in enumerate(self.rows):
+                for j, v in enumerate(r):
+                    if v == str(query):
+                        return FakeCell(i + 1, j + 1, v)
+        return None
+
+    # --- 寫入 ---
+    def append_rows(self, values, **kwargs):
+        self.backend.call("append_rows")
+        rows = [[_cell(v) for v in r] for r in values]
+        with self.lock:
+            self.rows.extend(rows)
+        if self.on_append:
+            self.on_append(rows)
+        return {}
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def _set(self, row: int, col: int, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        r = self.rows[row - 1]
+        while len(r) < col:
+            r.append("")
+        r[col - 1] = _cell(value)
+
+    def update_cell(self, row: int, col: int, value):
+        self.backend.call("update_cell")
+        with self.lock:
+            self._set(row, col, value)
+
+    def batch_update(self, data, **kwargs):
+        self.backend.call("batch_update")
+        with self.lock:
+            for item in data:
+                row, col = a1_to_rowcol(item["range"])
+                for i, vals in enumerate(item["values"]):
+                    for j, v in enumerate(vals):
+                        self._set(row + i, col + j, v)
+        return {}
+
+
+class FakeSpreadsheet:
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self._sheets: dict[str, FakeWorksheet] = {}
+        self._lock = threading.Lock()
+
+    def add_worksheet(self, title: str, rows: int = 100, cols: int = 20, **kwargs) -> FakeWorksheet:
+        self.backend.call("add_worksheet", rate_limited=False)
+        with self._lock:
+            ws = self._sheets.setdefault(title, FakeWorksheet(self, title, len(self._sheets) + 1))
+        return ws
+
+    def seed(self, title: str, rows) -> FakeWorksheet:
+        """直接放入分頁內容（不計入 API 呼叫）。"""
+        with self._lock:
+            ws = self._sheets[title] = FakeWorksheet(self, title, len(self._sheets) + 1, rows)
+        return ws
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.backend.call("worksheet")
+        with self._lock:
+            if title not in self._sheets:
+                raise gspread.WorksheetNotFound(title)
+            return self._sheets[title]
+
+    def values_batch_get(self, ranges, **kwargs):
+        self.backend.call("values_batch_get")
+        out = []
+        for rng in ranges:
+            title = rng.split("!")[0].strip("'")
+            with self._lock:
+                ws = self._sheets.get(title)
+            if ws is None:
+                raise RuntimeError(f"APIError: [400]: Unable to parse range: {rng}")
+            out.append({"range": rng, "values": ws._read_range(f"A1:ZZ")})
+        return {"valueRanges": out}
+
+    def batch_update(self, body, **kwargs):
+        self.backend.call("spreadsheet_batch_update")
+        by_id = {ws.id: ws for ws in self._sheets.values()}
+        for req in body.get("requests", []):
+            if "deleteDimension" in req:
+                rng = req["deleteDimension"]["range"]
+                ws = by_id[rng["sheetId"]]
+                with ws.lock:
+                    del ws.rows[rng["startIndex"]:rng["endIndex"]]
+            else:
+                raise NotImplementedError(list(req))
+        return {}
+
+
+class FakeClient:
+    def __init__(self, spreadsheet: FakeSpreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open_by_url(self, url):
+        self.spreadsheet.backend.call("open_by_url", rate_limited=False)
+        return self.spreadsheet
+
+
+class _Request:
+    def __init__(self, backend: Backend, api: str, result):
+        self.backend, self.api, self.result = backend, api, result
+
+    def execute(self, **kwargs):
+        self.backend.call(self.api)
+        return self.result
+
+    def next_chunk(self, **kwargs):
+        return None, self.execute()
+
+
+class FakeDriveService:
+    """Drive v3 service 替身：files().create(...).execute() 與 permissions().create(...).execute()。"""
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self._ids = iter(range(1, 1 << 62))
+        self._lock = threading.Lock()
+
+    def files(self):
+        return self
+
+    def permissions(self):
+        return _Permissions(self.backend)
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        size = 0
+        if media_body is not None:
+            size = media_body.size() if hasattr(media_body, "size") else 0
+        with self._lock:
+            file_id = f"fake{next(self._ids)}"
+        self.backend.add_bytes(size)
+        return _Request(self.backend, "files.create", {"id": file_id})
+
+
+class _Permissions:
+    def __init__(self, backend: Backend):
+        self.backend = backend
+
+    def create(self, **kwargs):
+        return _Request(self.backend, "permissions.create", {})
+
+
+class FakeSMTP:
+    """smtplib.SMTP 替身；backend 由 install() 設定。"""
+    backend: Backend = Backend("smtp")
+    sent = []
+
+    def __init__(self, host=None, port=None, **kwargs):
+        self.backend.call("connect", rate_limited=False)
+
+    def starttls(self, **kwargs):
+        self.backend.call("starttls", rate_limited=False)
+
+    def login(self, user, password):
+        self.backend.call("login", rate_limited=False)
+
+    def sendmail(self, from_addr, to_addrs, msg, **kwargs):
+        self.backend.call("sendmail")
+        FakeSMTP.sent.append(to_addrs)
+
+    def quit(self):
+        pass
+
+
+def install(spreadsheet: FakeSpreadsheet, drive_backend: Backend, smtp_backend: Backend):
+    """把 Google / SMTP 進入點換成替身；回傳還原用的函式。"""
+    saved = (
+        gspread.authorize,
+        ServiceAccountCredentials.__dict__["from_json_keyfile_dict"],
+        googleapiclient.discovery.build,
+        smtplib.SMTP,
+    )
+    gspread.authorize = lambda creds, **kwargs: FakeClient(spreadsheet)
+    ServiceAccountCredentials.from_json_keyfile_dict = classmethod(lambda cls, keyfile_dict, scopes=None, **kw: object())
+    googleapiclient.discovery.build = lambda *args, **kwargs: FakeDriveService(drive_backend)
+    FakeSMTP.backend = smtp_backend
+    smtplib.SMTP = FakeSMTP
+
+    def restore():
+        gspread.authorize, from_dict, googleapiclient.discovery.build, smtplib.SMTP = saved
+        ServiceAccountCredentials.from_json_keyfile_dict = from_dict
+
+    return restore
@@ -0,0 +1,83 @@
+"""
+上傳前的照片處理（Pillow）：辨識實際格式、依 EXIF 方向轉正後去除 EXIF（含 GPS）、
+長邊縮到上限並重新壓成 JPEG，另產生一張小縮圖給查詢頁面顯示。
+
+手機照片動輒 3~10 MB、4000 px 以上，頁面只以 300 px 寬顯示；縮到 1600 px 重新壓縮後通常只剩 200~400 KB。
+"""
+import io
+import math
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+DEFAULT_MAX_EDGE = 1600
+DEFAULT_QUALITY = 80
+DEFAULT_THUMBNAIL_EDGE = 320
+THUMBNAIL_QUALITY = 70
+
+MIMETYPES = {
+    "JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp",
+    "BMP": "image/bmp", "TIFF": "image/tiff", "HEIF": "image/heif", "MPO": "image/jpeg",
+}
+
+
+def detect_format(data: bytes) -> str | None:
+    """依檔案內容判斷圖片格式（"JPEG"、"PNG"…），無法辨識回傳 None；不看副檔名。"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return img.format
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return None
+
+
+def mimetype_for(fmt: str | None) -> str:
+    return MIMETYPES.get(fmt or "", "application/octet-stream")
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    """轉成 JPEG 可用的 RGB；有透明度的（PNG 截圖等）先鋪白底。"""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def _encode_jpeg(img: Image.Image, quality: int) -> bytes:
+    buf = io.BytesIO()
+    # 不傳 exif=，輸出檔就不帶任何 EXIF
+    img.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+def process_image(data: bytes, max_edge: int = DEFAULT_MAX_EDGE, quality: int = DEFAULT_QUALITY,
+                  thumbnail_edge: int = DEFAULT_THUMBNAIL_EDGE) -> dict | None:
+    """
+    縮圖並重新壓縮，回傳：
+    {"format": 原始格式, "data": JPEG bytes, "mimetype": "image/jpeg", "width", "height",
+     "thumbnail": 縮圖 JPEG bytes, "original_bytes": 原始大小}
+    不是圖片或無法解碼時回傳 None（呼叫端應改為上傳原檔）。
+    動圖只取第一格。
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            fmt = img.format
+            # JPEG 可在解碼時直接以 1/2、1/4、1/8 縮小，4000 px 的照片不必完整解碼
+            scale = max_edge / max(img.size)
+            if scale < 1:
+                img.draft("RGB", (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+            img = ImageOps.exif_transpose(img)
+            img = _flatten(img)
+            img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+            width, height = img.size
+            main = _encode_jpeg(img, quality)
+            thumb = img.copy()
+            thumb.thumbnail((thumbnail_edge, thumbnail_edge), Image.Resampling.LANCZOS)
+            thumbnail = _encode_jpeg(thumb, THUMBNAIL_QUALITY)
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return {
+        "format": fmt, "data": main, "mimetype": "image/jpeg",
+        "width": width, "height": height,
+        "thumbnail": thumbnail, "original_bytes": len(data),
+    }
@@ -0,0 +1,145 @@
+"""
+參考資料分頁（settings / roster / inspectors / teachers / duty）的解析。
+
+輸入為試算表的原始值（values_batch_get / get_all_values，第一列為表頭），
+全部以 pandas 向量化字串運算處理，不逐列 iterrows，也不逐列呼叫 clean_id；
+名冊數千列時冷啟動的解析時間才不會拖慢第一次畫面。
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_INSPECTORS = [{"label": "測試人員", "allowed_roles": ["內掃檢查"], "assigned_classes": [], "id_prefix": "測"}]
+
+
+def clean_id(val):
+    """單一學號正規化：數字（含 "110001.0" 這種被轉成浮點的）轉成整數字串，其餘去頭尾空白。"""
+    try:
+        if pd.isna(val) or val == "": return ""
+        return str(int(float(val))).strip()
+    except: return str(val).strip()
+
+
+def clean_ids(values) -> pd.Series:
+    """clean_id 的向量化版本，結果與逐一呼叫 clean_id 相同。"""
+    s = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+    text = s.fillna("").astype(str).str.strip()
+    out = text.to_numpy(dtype=object, copy=True)
+    # 絕大多數學號本來就是不帶前導 0 的整數字串，原樣保留；其餘（"110001.0"、"0012"…）才做數值轉換
+    rest = ~text.str.fullmatch(r"[1-9]\d{0,17}").to_numpy(dtype=bool)
+    if rest.any():
+        num = pd.to_numeric(text[rest], errors="coerce").to_numpy(dtype=float)
+        numeric = np.isfinite(num) & (np.abs(num) < 2 ** 63)
+        idx = np.flatnonzero(rest)[numeric]
+        out[idx] = np.trunc(num[numeric]).astype(np.int64).astype(str)
+    return pd.Series(out, index=s.index, dtype=object)
+
+
+def values_to_frame(values) -> pd.DataFrame:
+    """把分頁值（第一列為表頭）轉成 DataFrame，效果同 get_all_records；短列補空字串。"""
+    if not values: return pd.DataFrame()
+    header = [str(h).strip() for h in values[0]]
+    rows = [(list(r) + [""] * len(header))[:len(header)] for r in values[1:]]
+    return pd.DataFrame(rows, columns=header)
+
+
+def _find_col(df: pd.DataFrame, *keywords):
+    return next((c for c in df.columns if any(k in c for k in keywords)), None)
+
+
+def _text(df: pd.DataFrame, col) -> pd.Series:
+    return df[col].fillna("").astype(str).str.strip()
+
+
+def parse_settings(values) -> dict:
+    config = {"semester_start": "2025-08-25"}
+    for row in values or []:
+        if len(row)>=2 and row[0] == "semester_start": config["semester_start"] = row[1]
+    return config
+
+
+def parse_roster(df: pd.DataFrame) -> dict:
+    """學號 → 班級。"""
+    id_col = _find_col(df, "學號")
+    class_col = _find_col(df, "班級")
+    if not (id_col and class_col): return {}
+    ids = clean_ids(df[id_col])
+    keep = ids != ""
+    return dict(zip(ids[keep], _text(df, class_col)[keep]))
+
+
+def parse_sorted_classes(df: pd.DataFrame):
+    """回傳 (依年級排序的班級清單, [{"grade", "name"}])。"""
+    class_col = _find_col(df, "班級")
+    if not class_col: return [], []
+    names = df[class_col].dropna().astype(str).str.strip()
+    names = pd.Series(names[names != ""].unique(), dtype=object)
+    if names.empty: return [], []
+    g_num = names.str.extract(r'(\d+)', expand=False)
+    order = pd.DataFrame({"name": names, "g_num": g_num, "grade": pd.to_numeric(g_num).fillna(99)})
+    order = order.sort_values(["grade", "name"], kind="stable")
+    labels = (order["g_num"] + "年級").where(order["g_num"].notna(), "其他")
+    sorted_all = order["name"].tolist()
+    return sorted_all, [{"grade": g, "name": n} for g, n in zip(labels, sorted_all)]
+
+
+def parse_teacher_emails(df: pd.DataFrame) -> dict:
+    """班級 → {"email", "name"}；信箱不含 @ 的列略過。"""
+    class_col = _find_col(df, "班級")
+    mail_col = _find_col(df, "Email", "信箱", "郵件")
+    name_col = _find_col(df, "導師", "姓名")
+    if not (class_col and mail_col): return {}
+    cls = _text(df, class_col)
+    mail = _text(df, mail_col)
+    name = _text(df, name_col) if name_col else pd.Series("老師", index=df.index)
+    keep = (cls != "") & mail.str.contains("@", regex=False)
+    return {c: {"email": m, "name": n} for c, m, n in zip(cls[keep], mail[keep], name[keep])}
+
+
+def allowed_roles_for(role: str) -> list:
+    """負責項目文字 → 可評分項目。"""
+    if "組長" in role: return ["內掃檢查", "外掃檢查", "垃圾/回收檢查", "晨間打掃"]
+    if "機動" in role: return ["內掃檢查", "外掃檢查", "垃圾/回收檢查"]
+    allowed = []
+    if "外掃" in role: allowed.append("外掃檢查")
+    if "垃圾" in role: allowed.append("垃圾/回收檢查")
+    if "晨" in role: allowed.append("晨間打掃")
+    if "內掃" in role: allowed.append("內掃檢查")
+    return allowed or ["內掃檢查"]
+
+
+def parse_inspector_list(df: pd.DataFrame) -> list:
+    """糾察名單；負責項目只有少數幾種寫法，先對不重複的值算好再 map 回每一列。"""
+    if df.empty: return DEFAULT_INSPECTORS
+    id_col = _find_col(df, "學號", "編號")
+    role_col = _find_col(df, "負責", "項目")
+    scope_col = _find_col(df, "班級", "範圍")
+    if not id_col: return DEFAULT_INSPECTORS
+    ids = clean_ids(df[id_col])
+    roles = _text(df, role_col) if role_col else pd.Series("", index=df.index)
+    allowed = roles.map({r: allowed_roles_for(r) for r in roles.unique()})
+    if scope_col:
+        parts = df[scope_col].fillna("").astype(str).str.replace("、", ";").str.replace(",", ";").str.split(";")
+        scopes = [[c.strip() for c in p if c.strip()] for p in parts]
+    else:
+        scopes = [[] for _ in range(len(df))]
+    prefixes = ids.str[0].fillna("X")
+    inspectors = [
+        {"label": f"學號: {i}", "allowed_roles": list(a), "assigned_classes": c, "id_prefix": p}
+        for i, a, c, p in zip(ids, allowed, scopes, prefixes)
+    ]
+    return inspectors if inspectors else DEFAULT_INSPECTORS
+
+
+def parse_duty(df: pd.DataFrame) -> tuple[pd.DataFrame, str]:
+    """晨掃輪值表：回傳 (日期/學號/掃地區域 三欄的 DataFrame, 狀態)。"""
+    empty = pd.DataFrame(columns=["日期", "學號", "掃地區域"])
+    if df.empty: return empty, "no_data"
+    date_col = _find_col(df, "日期")
+    id_col = _find_col(df, "學號")
+    loc_col = _find_col(df, "地點")
+    if not (date_col and id_col): return empty, "missing_cols"
+    return pd.DataFrame({
+        "日期": pd.to_datetime(df[date_col], errors='coerce').dt.date,
+        "學號": clean_ids(df[id_col]),
+        "掃地區域": _text(df, loc_col) if loc_col else "",
+    }), "success"
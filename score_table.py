@@ -0,0 +1,235 @@
+"""
+成績彙總表（SQLite 物化表）：成績總表與 CSV 匯出直接查表，不必每次重跑整份歷史的 groupby。
+
+- score_entries：每筆紀錄（以紀錄ID為 key）對當日扣分的貢獻，未套上限
+- score_daily  ：(日期, 班級) 每日原始扣分合計（已排除申訴核可的紀錄），讀取時才套上限
+- score_weekly ：(週次, 班級) 週合計（已套每日上限），由受影響的每日列重算
+
+新增／重寫（upsert_entries）、刪除（remove）、申訴核可（set_corrected）都只調整受影響的
+班級日與班級週，同一筆紀錄重複套用也不會重複計分。整份試算表重新同步後以 rebuild 重建。
+"""
+import pandas as pd
+
+from scoring import (
+    CAPPED_CATEGORIES, DAILY_CAP, DEDUCTION_COLUMNS, entry_contributions, summarize_totals,
+)
+from sqlite_util import SQLiteStore, quote
+
+
+_CATS = ", ".join(quote(c) for c in DEDUCTION_COLUMNS)
+# 每日原始扣分 → 套上限後的扣分（SQL 運算式）
+_CAPPED = {
+    c: (f"MIN({quote(c)}, {DAILY_CAP})" if c[:-2] in CAPPED_CATEGORIES else quote(c))
+    for c in DEDUCTION_COLUMNS
+}
+
+
+class ScoreTable(SQLiteStore):
+    """成績彙總表存取物件。"""
+
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
+        super().__init__(db_path, busy_timeout)
+        cats_decl = ", ".join(f"{quote(c)} INTEGER NOT NULL DEFAULT 0" for c in DEDUCTION_COLUMNS)
+        conn = self.connection()
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS score_entries (
+                record_id TEXT PRIMARY KEY,
+                day TEXT NOT NULL,
+                class TEXT NOT NULL,
+                week INTEGER NOT NULL,
+                {cats_decl},
+                corrected INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS score_daily (
+                day TEXT NOT NULL,
+                class TEXT NOT NULL,
+                week INTEGER NOT NULL,
+                entries INTEGER NOT NULL DEFAULT 0,
+                {cats_decl},
+                PRIMARY KEY (day, class)
+            )
+        """)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS score_weekly (
+                week INTEGER NOT NULL,
+                class TEXT NOT NULL,
+                {cats_decl},
+                total INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (week, class)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_score_daily_week ON score_daily (week, class)")
+
+    # ------------------------------------------
+    # 寫入
+    # ------------------------------------------
+    def _add_daily(self, conn, day: str, cls: str, week: int, cats, sign: int, weeks_touched: set):
+        """把一筆紀錄的貢獻加進（sign=1）或移出（sign=-1）當日合計，並記下受影響的 (週次, 班級)。"""
+        before = conn.execute("SELECT week FROM score_daily WHERE day = ? AND class = ?", (day, cls)).fetchone()
+        if before: weeks_touched.add((before[0], cls))
+        if sign > 0:
+            conn.execute(
+                f"INSERT INTO score_daily (day, class, week, entries, {_CATS}) "
+                f"VALUES (?, ?, ?, 1, {', '.join('?' * len(DEDUCTION_COLUMNS))}) "
+                f"ON CONFLICT (day, class) DO UPDATE SET week = MAX(week, excluded.week), entries = entries + 1, "
+                + ", ".join(f"{quote(c)} = {quote(c)} + excluded.{quote(c)}" for c in DEDUCTION_COLUMNS),
+                (day, cls, week, *cats),
+            )
+        elif before:
+            conn.execute(
+                f"UPDATE score_daily SET entries = entries - 1, "
+                + ", ".join(f"{quote(c)} = {quote(c)} - ?" for c in DEDUCTION_COLUMNS)
+                + " WHERE day = ? AND class = ?",
+                (*cats, day, cls),
+            )
+            conn.execute("DELETE FROM score_daily WHERE day = ? AND class = ? AND entries <= 0", (day, cls))
+        after = conn.execute("SELECT week FROM score_daily WHERE day = ? AND class = ?", (day, cls)).fetchone()
+        if after: weeks_touched.add((after[0], cls))
+
+    def _refresh_weekly(self, conn, keys: set):
+        """由每日合計重算受影響的週合計（每個班級週最多 7 列，成本固定）。"""
+        capped_sum = ", ".join(f"SUM({expr})" for expr in _CAPPED.values())
+        total = " + ".join(f"SUM({expr})" for expr in _CAPPED.values())
+        for week, cls in keys:
+            conn.execute("DELETE FROM score_weekly WHERE week = ? AND class = ?", (week, cls))
+            conn.execute(
+                f"INSERT INTO score_weekly (week, class, {_CATS}, total) "
+                f"SELECT week, class, {capped_sum}, {total} FROM score_daily "
+                f"WHERE week = ? AND class = ? GROUP BY week, class",
+                (week, cls),
+            )
+
+    def _apply(self, conn, record_id: str, new: tuple | None, weeks_touched: set):
+        """
+        以 new = (day, class, week, cats, corrected) 取代該紀錄原本的貢獻；new 為 None 表示刪除。
+        corrected 為 None 時沿用該紀錄原本的申訴核可狀態（新紀錄為未核可）。
+        """
+        old = conn.execute(
+            f"SELECT day, class, week, {_CATS}, corrected FROM score_entries WHERE record_id = ?", (record_id,)
+        ).fetchone()
+        if old:
+            day, cls, week, *rest = old
+            cats, corrected = rest[:-1], rest[-1]
+            if not corrected:
+                self._add_daily(conn, day, cls, week, cats, -1, weeks_touched)
+            conn.execute("DELETE FROM score_entries WHERE record_id = ?", (record_id,))
+        if new is not None:
+            day, cls, week, cats, corrected = new
+            if corrected is None:
+                corrected = bool(old and old[-1])
+            conn.execute(
+                f"INSERT INTO score_entries (record_id, day, class, week, {_CATS}, corrected) "
+                f"VALUES (?, ?, ?, ?, {', '.join('?' * len(DEDUCTION_COLUMNS))}, ?)",
+                (record_id, day, cls, week, *cats, int(corrected)),
+            )
+            if not corrected:
+                self._add_daily(conn, day, cls, week, cats, 1, weeks_touched)
+
+    def upsert_entries(self, entries, excluded=None) -> int:
+        """
+        新增或重寫紀錄（list of dict 或 DataFrame，欄位同 main_data）；以紀錄ID識別，沒有紀錄ID的略過。
+        excluded 為申訴已核可的紀錄ID；None 表示沿用各紀錄原本的核可狀態。回傳實際套用的筆數。
+        """
+        df = entries if isinstance(entries, pd.DataFrame) else pd.DataFrame(list(entries))
+        if df.empty or "紀錄ID" not in df.columns:
+            return 0
+        contrib = entry_contributions(df, excluded=excluded)
+        contrib = contrib[contrib["紀錄ID"] != ""]
+        touched: set = set()
+        with self._transaction() as conn:
+            for rec in contrib.itertuples(index=False):
+                rid, day, week, cls, *rest = rec
+                cats = tuple(int(v) for v in rest[:-1])
+                corrected = bool(rest[-1]) if excluded is not None else None
+                self._apply(conn, rid, (day, cls, int(week), cats, corrected), touched)
+            self._refresh_weekly(conn, touched)
+        return len(contrib)
+
+    def remove(self, record_ids) -> int:
+        """刪除紀錄並扣回其貢獻；回傳實際存在而被刪除的筆數。"""
+        touched: set = set()
+        removed = 0
+        with self._transaction() as conn:
+            for rid in dict.fromkeys(str(r) for r in record_ids if str(r)):
+                exists = conn.execute("SELECT 1 FROM score_entries WHERE record_id = ?", (rid,)).fetchone()
+                if exists:
+                    self._apply(conn, rid, None, touched)
+                    removed += 1
+            self._refresh_weekly(conn, touched)
+        return removed
+
+    def set_corrected(self, record_ids, corrected: bool = True) -> int:
+        """申訴核可：該紀錄不再計分（corrected=False 恢復計分）；回傳狀態有改變的筆數。"""
+        touched: set = set()
+        changed = 0
+        with self._transaction() as conn:
+            for rid in dict.fromkeys(str(r) for r in record_ids if str(r)):
+                row = conn.execute(
+                    f"SELECT day, class, week, {_CATS}, corrected FROM score_entries WHERE record_id = ?", (rid,)
+                ).fetchone()
+                if not row or bool(row[-1]) == corrected:
+                    continue
+                day, cls, week, *rest = row
+                self._apply(conn, rid, (day, cls, week, tuple(rest[:-1]), corrected), touched)
+                changed += 1
+            self._refresh_weekly(conn, touched)
+        return changed
+
+    def rebuild(self, df: pd.DataFrame, keys=None, excluded=None):
+        """
+        以整份 main_data 重建三張表（試算表整份重新同步後使用）。
+        keys 用來識別沒有紀錄ID的列（例如試算表列號）；紀錄ID重複的列只計一次。
+        excluded 為申訴已核可的紀錄ID，這些紀錄不計分。
+        """
+        contrib = entry_contributions(df, keys=keys, excluded=excluded) if not df.empty else None
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM score_entries")
+            conn.execute("DELETE FROM score_daily")
+            conn.execute("DELETE FROM score_weekly")
+            if contrib is not None:
+                contrib = contrib[contrib["紀錄ID"] != ""].drop_duplicates("紀錄ID", keep="last")
+                conn.executemany(
+                    f"INSERT INTO score_entries (record_id, day, week, class, {_CATS}, corrected) "
+                    f"VALUES (?, ?, ?, ?, {', '.join('?' * len(DEDUCTION_COLUMNS))}, ?)",
+                    zip(*(contrib[c].astype(int if c == "申訴核可" else contrib[c].dtype).tolist() for c in contrib.columns)),
+                )
+            conn.execute(
+                f"INSERT INTO score_daily (day, class, week, entries, {_CATS}) "
+                f"SELECT day, class, MAX(week), COUNT(*), {', '.join(f'SUM({quote(c)})' for c in DEDUCTION_COLUMNS)} "
+                f"FROM score_entries WHERE corrected = 0 GROUP BY day, class"
+            )
+            conn.execute(
+                f"INSERT INTO score_weekly (week, class, {_CATS}, total) "
+                f"SELECT week, class, {', '.join(f'SUM({e})' for e in _CAPPED.values())}, "
+                f"{' + '.join(f'SUM({e})' for e in _CAPPED.values())} FROM score_daily GROUP BY week, class"
+            )
+
+    # ------------------------------------------
+    # 讀取
+    # ------------------------------------------
+    def is_empty(self) -> bool:
+        return self.connection().execute("SELECT 1 FROM score_entries LIMIT 1").fetchone() is None
+
+    def weeks(self) -> list[int]:
+        """有紀錄的週次（> 0），由小到大。"""
+        rows = self.connection().execute("SELECT DISTINCT week FROM score_weekly WHERE week > 0 ORDER BY week")
+        return [r[0] for r in rows]
+
+    @staticmethod
+    def _week_filter(weeks) -> tuple[str, tuple]:
+        if weeks is None:
+            return "", ()
+        weeks = [int(w) for w in weeks]
+        return f"WHERE week IN ({','.join('?' * len(weeks))})", tuple(weeks)
+
+    def summary(self, weeks=None, classes=None) -> pd.DataFrame:
+        """選定週次的成績總表（同 scoring.class_summary），只加總週合計表。"""
+        where, params = self._week_filter(weeks)
+        totals = pd.read_sql_query(
+            f"SELECT class AS 班級, {', '.join(f'SUM({quote(c)}) AS {quote(c)}' for c in DEDUCTION_COLUMNS)}, "
+            f"SUM(total) AS 總扣分 FROM score_weekly {where} GROUP BY class",
+            self.connection(), params=params,
+        ).set_index("班級")
+        return summarize_totals(totals, classes)
@@ -0,0 +1,208 @@
+"""
+衛生評分計分規則（純函式、全向量化）。
+
+- 同一班級同一天：內掃、外掃、垃圾各自加總後上限 2 分（垃圾含「垃圾內掃」「垃圾外掃」兩欄）
+- 晨掃、手機人數不設上限
+- 總成績 = 90 − 總扣分
+- 申訴已核可的紀錄（appeals 的對應紀錄ID）不計扣分；檢查人員勾選的「修正」單照常計分
+
+成績總表、詳細明細、寄送通知都用這裡的函式，規則只寫一次。
+"""
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+BASE_SCORE = 90
+DAILY_CAP = 2
+
+# 扣分類別 → 原始分欄位；CAPPED_CATEGORIES 內的類別每日加總後套上限
+CATEGORY_COLUMNS = {
+    "內掃": ["內掃原始分"],
+    "外掃": ["外掃原始分"],
+    "垃圾": ["垃圾原始分", "垃圾內掃原始分", "垃圾外掃原始分"],
+    "晨掃": ["晨間打掃原始分"],
+    "手機": ["手機人數"],
+}
+CAPPED_CATEGORIES = ("內掃", "外掃", "垃圾")
+RAW_COLUMNS = [c for cols in CATEGORY_COLUMNS.values() for c in cols]
+DEDUCTION_COLUMNS = [f"{cat}扣分" for cat in CATEGORY_COLUMNS]
+DAILY_COLUMNS = ["日期", "週次", "班級", *DEDUCTION_COLUMNS, "每日總扣分"]
+SUMMARY_COLUMNS = ["班級", *DEDUCTION_COLUMNS, "總扣分", "總成績"]
+
+
+def _day_codes(values: pd.Series):
+    """
+    日期欄 → (每列的日期代碼, 代碼對應的 DatetimeIndex)。
+    只解析不重複的值（百萬列也只需解析幾百個日期），寫法不同的同一天（2025/9/1、2025-09-01）歸為同一代碼，
+    空值與無法解析的日期共用一個 NaT 代碼。
+    """
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(pd.Index(uniques).astype(str), errors="coerce", format="mixed").normalize()
+    parsed = parsed.append(pd.DatetimeIndex([pd.NaT]))
+    codes = np.where(codes < 0, len(uniques), codes)
+    day_codes, days = pd.factorize(parsed, use_na_sentinel=False)
+    return day_codes[codes], pd.DatetimeIndex(days)
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """日期欄（字串 / date）轉成 datetime64，無法解析為 NaT。"""
+    row_day, days = _day_codes(values)
+    return pd.Series(days.take(row_day), index=values.index)
+
+
+def _raw_column(df: pd.DataFrame, col: str) -> np.ndarray:
+    """原始分欄位轉成 int64 陣列（缺欄補 0；已是整數型別就不再轉換）。"""
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=np.int64)
+    s = df[col]
+    if pd.api.types.is_integer_dtype(s.dtype):
+        return s.to_numpy(dtype=np.int64)
+    # 試算表讀出的是字串，分數只有少數幾種值：只轉換不重複的值再對回每一列
+    codes, uniques = pd.factorize(s)
+    parsed = pd.to_numeric(pd.Series(uniques, dtype=object), errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+    return np.where(codes < 0, 0, parsed[codes] if len(parsed) else 0)
+
+
+def approved_record_ids(appeals: pd.DataFrame) -> set[str]:
+    """申訴表中「處理狀態」為已核可的對應紀錄ID（對應紀錄ID空白的略過）。"""
+    if appeals.empty or "處理狀態" not in appeals.columns or "對應紀錄ID" not in appeals.columns:
+        return set()
+    approved = appeals.loc[appeals["處理狀態"].astype(str).str.strip() == "已核可", "對應紀錄ID"]
+    return set(approved.fillna("").astype(str).str.strip()) - {""}
+
+
+def excluded_mask(df: pd.DataFrame, excluded=None) -> np.ndarray:
+    """紀錄ID在 excluded（申訴已核可的紀錄ID）中的列。"""
+    if not excluded or "紀錄ID" not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    return df["紀錄ID"].fillna("").astype(str).str.strip().isin(excluded).to_numpy()
+
+
+def _category_arrays(df: pd.DataFrame, excluded=None) -> dict:
+    """{類別扣分欄名: 每列該類別的原始分合計}；紀錄ID在 excluded 中的列計為 0。"""
+    keep = ~excluded_mask(df, excluded)
+    return {
+        f"{cat}扣分": sum(_raw_column(df, c) for c in cols) * keep for cat, cols in CATEGORY_COLUMNS.items()
+    }
+
+
+def entry_contributions(df: pd.DataFrame, keys=None, excluded=None) -> pd.DataFrame:
+    """
+    每筆紀錄對每日扣分的貢獻（未套上限），供成績彙總表逐筆增減。
+    欄位：紀錄ID、日期（YYYY-MM-DD，無法解析為空字串）、週次、班級、各類別扣分、申訴核可（紀錄ID在 excluded 中）。
+    keys 給定時用來取代空白的紀錄ID（例如以試算表列號當作識別）。
+    """
+    row_day, days = _day_codes(df["日期"])
+    day_text = np.asarray(days.strftime("%Y-%m-%d").fillna(""), dtype=object)[row_day] if len(days) else []
+    ids = df["紀錄ID"].fillna("").astype(str).str.strip() if "紀錄ID" in df.columns else pd.Series("", index=df.index)
+    if keys is not None:
+        ids = ids.where(ids != "", pd.Series(list(keys), index=df.index, dtype=object))
+    out = pd.DataFrame({
+        "紀錄ID": ids.to_numpy(dtype=object),
+        "日期": day_text,
+        "週次": pd.to_numeric(df["週次"], errors="coerce").fillna(0).to_numpy(dtype=np.int64),
+        "班級": df["班級"].fillna("").astype(str).to_numpy(dtype=object),
+        **_category_arrays(df),
+        "申訴核可": excluded_mask(df, excluded),
+    })
+    return out
+
+
+def entry_deductions(df: pd.DataFrame, excluded=None) -> pd.Series:
+    """每一筆紀錄未套上限的扣分（詳細明細的「該筆扣分」）；excluded 為申訴已核可的紀錄ID。"""
+    return pd.Series(sum(_category_arrays(df, excluded).values()), index=df.index, dtype="int64")
+
+
+def _to_timestamp(d):
+    if d is None: return None
+    if isinstance(d, (date, datetime)): return pd.Timestamp(d).normalize()
+    return pd.Timestamp(str(d)).normalize()
+
+
+def filter_range(df: pd.DataFrame, weeks=None, start=None, end=None) -> pd.DataFrame:
+    """依週次清單及／或日期區間（含頭尾）篩選紀錄；條件為 None 表示不限。"""
+    mask = np.ones(len(df), dtype=bool)
+    if weeks is not None:
+        wk = df["週次"] if pd.api.types.is_integer_dtype(df["週次"].dtype) else pd.to_numeric(df["週次"], errors="coerce")
+        mask &= np.isin(wk.to_numpy(), np.asarray(list(weeks), dtype=float))
+    if start is not None or end is not None:
+        row_day, days = _day_codes(df["日期"])
+        ok = np.ones(len(days), dtype=bool)
+        if start is not None: ok &= np.asarray(days >= _to_timestamp(start))
+        if end is not None: ok &= np.asarray(days <= _to_timestamp(end))
+        mask &= ok[row_day]
+    return df if mask.all() else df[mask]
+
+
+def daily_scores(df: pd.DataFrame, weeks=None, start=None, end=None, excluded=None) -> pd.DataFrame:
+    """
+    (日期, 班級) 每日扣分：各類別當日加總，內掃／外掃／垃圾套上限；紀錄ID在 excluded 中的紀錄不計。
+    日期欄為 datetime64（解析失敗為 NaT，仍保留為一組）。
+    日期與班級先各自編成整數代碼，組成單一 int64 key 後以 bincount 加總，不對字串欄位做 groupby。
+    """
+    df = filter_range(df, weeks, start, end)
+    if df.empty:
+        return pd.DataFrame(columns=DAILY_COLUMNS)
+    row_day, days = _day_codes(df["日期"])
+    cls_codes, classes = pd.factorize(df["班級"], use_na_sentinel=False)
+    key = row_day.astype(np.int64) * len(classes) + cls_codes
+    n_keys = len(days) * len(classes)
+    if n_keys > 4 * len(key):
+        # 日期或班級寫法異常多時，組合空間太大，先壓成連續代碼
+        present, key = np.unique(key, return_inverse=True)
+        n_keys = len(present)
+    else:
+        present = None
+
+    counts = np.bincount(key, minlength=n_keys)
+    week = np.zeros(n_keys, dtype=np.int64)
+    np.maximum.at(week, key, pd.to_numeric(df["週次"], errors="coerce").fillna(0).to_numpy(dtype=np.int64))
+    used = np.flatnonzero(counts)
+    combo = used if present is None else present[used]
+    daily = pd.DataFrame({
+        "日期": days.take(combo // len(classes)),
+        "週次": week[used],
+        "班級": pd.Index(classes).astype(str).take(combo % len(classes)),
+    })
+    total = np.zeros(len(used), dtype=np.int64)
+    for col, values in _category_arrays(df, excluded).items():
+        summed = np.bincount(key, weights=values, minlength=n_keys)[used].astype(np.int64)
+        if col[:-2] in CAPPED_CATEGORIES: summed = np.minimum(summed, DAILY_CAP)
+        daily[col] = summed
+        total += summed
+    daily["每日總扣分"] = total
+    return daily.sort_values(["日期", "班級"], kind="stable", ignore_index=True)[DAILY_COLUMNS]
+
+
+def weekly_scores(daily: pd.DataFrame) -> pd.DataFrame:
+    """(週次, 班級) 週扣分與週成績，由 daily_scores 的結果彙總。"""
+    weekly = daily.groupby(["週次", "班級"], sort=True)[[*DEDUCTION_COLUMNS, "每日總扣分"]].sum().reset_index()
+    weekly = weekly.rename(columns={"每日總扣分": "總扣分"})
+    weekly["總成績"] = BASE_SCORE - weekly["總扣分"]
+    return weekly
+
+
+def class_summary(daily: pd.DataFrame, classes=None) -> pd.DataFrame:
+    """
+    選定範圍內每班的扣分合計與總成績（成績總表），依總成績由高到低排序。
+    classes 為完整班級清單時，沒有紀錄的班級也會列出（扣分 0）。
+    """
+    totals = daily.groupby("班級", sort=False)[[*DEDUCTION_COLUMNS, "每日總扣分"]].sum()
+    return summarize_totals(totals.rename(columns={"每日總扣分": "總扣分"}), classes)
+
+
+def summarize_totals(totals: pd.DataFrame, classes=None) -> pd.DataFrame:
+    """以 班級 為 index、含各類別扣分與總扣分的合計表 → 成績總表（補齊班級、算總成績、排序）。"""
+    if classes is not None:
+        totals = totals.reindex(pd.Index(list(classes), name="班級"), fill_value=0)
+    report = totals.reset_index()
+    report["總成績"] = BASE_SCORE - report["總扣分"]
+    return report[SUMMARY_COLUMNS].sort_values("總成績", ascending=False, kind="stable")
+
+
+def day_totals(df: pd.DataFrame, target, excluded=None) -> pd.DataFrame:
+    """單日各班「當日總扣分」（寄送通知用），只列出有扣分的班級；excluded 為申訴已核可的紀錄ID。"""
+    daily = daily_scores(df, start=target, end=target, excluded=excluded)
+    daily = daily[daily["每日總扣分"] > 0]
+    return daily[["班級", "每日總扣分"]].rename(columns={"每日總扣分": "當日總扣分"}).reset_index(drop=True)
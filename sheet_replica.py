@@ -0,0 +1,287 @@
+"""
+Google Sheet 的本機唯讀副本 (SQLite)。
+
+背景同步工作把分頁內容寫進這裡，前台頁面只讀本機副本，
+頁面載入不再受 Sheets 延遲與配額影響。每個分頁一張表，欄位即表頭欄位，
+_row 為該列在試算表中的列號（表頭為第 1 列）。
+
+main_data / appeals 幾乎只會往下新增，所以同步預設只抓「上次同步的最後一列」之後的範圍；
+同一次 batch_get 也讀回表頭與識別欄（register 的 key），表頭、識別欄或最後一列對不上
+（中間有刪除、插入、重新排序或改了表頭）時才整份重抓。其他儲存格在試算表上直接修改不會被 tail 同步發現，
+要等下一次整份同步。
+"""
+import json
+import time
+
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+
+from sqlite_util import SQLiteStore, quote
+
+
+def _col_letter(col: int) -> str:
+    """欄號 → 欄位字母（1 → A）。"""
+    return "".join(ch for ch in rowcol_to_a1(1, max(1, col)) if ch.isalpha())
+
+
+def _trim_header(header) -> list[str]:
+    """表頭去掉前後空白與尾端的空欄（API 回傳值不含尾端空白儲存格）。"""
+    out = [str(h).strip() for h in header]
+    while out and out[-1] == "":
+        out.pop()
+    return out
+
+
+class SheetReplica(SQLiteStore):
+    """本機副本存取物件。"""
+
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
+        super().__init__(db_path, busy_timeout)
+        self._columns: dict[str, list[str]] = {}
+        self._keys: dict[str, str] = {}
+        conn = self.connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS replica_meta (
+                dataset TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL DEFAULT 0,   -- 已同步的資料列數（不含表頭）
+                version INTEGER NOT NULL DEFAULT 0,     -- 每次內容變動 +1，前台快取以此為 key
+                rewrite_version INTEGER NOT NULL DEFAULT 0,  -- 既有列被改動（整份覆蓋、改儲存格）時 +1，只新增列時不變
+                synced_at REAL,                         -- 最後一次同步成功時間 (epoch 秒)
+                header_json TEXT,                       -- 最後一次整份同步時的試算表表頭
+                full_synced_at REAL,                    -- 最後一次整份同步時間 (epoch 秒)
+                read_at REAL                            -- 最後一次同步開始讀取試算表的時間；在這之前寫入的列都已在副本中
+            )
+        """)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(replica_meta)")}
+        for col, decl in (("header_json", "TEXT"), ("full_synced_at", "REAL"), ("read_at", "REAL"),
+                          ("rewrite_version", "INTEGER NOT NULL DEFAULT 0")):
+            if col not in existing:
+                conn.execute(f"ALTER TABLE replica_meta ADD COLUMN {col} {decl}")
+
+    def register(self, dataset: str, columns: list[str], indexed: tuple[str, ...] = (), key: str | None = None):
+        """
+        登記一個分頁及其欄位，並建立對應的資料表；indexed 中的欄位另建索引（查列號用）。
+        key 為識別欄（例如紀錄ID），tail 同步前整欄與副本核對，上方有刪除或插入就改為整份重抓。
+        """
+        self._columns[dataset] = list(columns)
+        if key:
+            self._keys[dataset] = key
+        cols_sql = ", ".join(f"{quote(c)} TEXT" for c in columns)
+        conn = self.connection()
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {quote('rows_' + dataset)} (_row INTEGER PRIMARY KEY, {cols_sql})")
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({quote('rows_' + dataset)})")}
+        for c in columns:
+            if c not in existing:
+                conn.execute(f"ALTER TABLE {quote('rows_' + dataset)} ADD COLUMN {quote(c)} TEXT")
+        for c in indexed:
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {quote(f'idx_{dataset}_{columns.index(c)}')} "
+                f"ON {quote('rows_' + dataset)} ({quote(c)})"
+            )
+        conn.execute("INSERT OR IGNORE INTO replica_meta (dataset) VALUES (?)", (dataset,))
+
+    def meta(self, dataset: str, conn=None) -> dict:
+        row = (conn or self.connection()).execute(
+            "SELECT row_count, version, synced_at, header_json, full_synced_at, read_at, rewrite_version "
+            "FROM replica_meta WHERE dataset = ?",
+            (dataset,),
+        ).fetchone()
+        if not row:
+            return {"row_count": 0, "version": 0, "synced_at": None, "header": None, "full_synced_at": None,
+                    "read_at": None, "rewrite_version": 0}
+        return {
+            "row_count": row[0],
+            "version": row[1],
+            "synced_at": row[2],
+            "header": json.loads(row[3]) if row[3] else None,
+            "full_synced_at": row[4],
+            "read_at": row[5],
+            "rewrite_version": row[6],
+        }
+
+    def _project(self, dataset: str, header: list[str], rows: list[list]) -> list[tuple]:
+        """依表頭把試算表的列轉成資料表欄位順序（缺欄補空字串，多的欄位忽略）。"""
+        columns = self._columns[dataset]
+        header = [str(h).strip() for h in header]
+        positions = [header.index(c) if c in header else None for c in columns]
+        projected = []
+        for r in rows:
+            projected.append(tuple(
+                (str(r[p]) if p is not None and p < len(r) else "") for p in positions
+            ))
+        return projected
+
+    def _rows(self, dataset: str, conn=None, where: str = "") -> list[tuple]:
+        columns = self._columns[dataset]
+        cur = (conn or self.connection()).execute(
+            f"SELECT {', '.join(quote(c) for c in columns)} FROM {quote('rows_' + dataset)} {where} ORDER BY _row"
+        )
+        return [tuple(r) for r in cur.fetchall()]
+
+    def column_values(self, dataset: str, column: str) -> list[str]:
+        """副本中某一欄的所有值（依列號排序）。"""
+        cur = self.connection().execute(f"SELECT {quote(column)} FROM {quote('rows_' + dataset)} ORDER BY _row")
+        return [r[0] for r in cur.fetchall()]
+
+    def last_row(self, dataset: str) -> tuple | None:
+        """副本中的最後一列（用來確認試算表上方沒有被刪改）。"""
+        rows = self._rows(dataset, where=f"WHERE _row = (SELECT MAX(_row) FROM {quote('rows_' + dataset)})")
+        return rows[0] if rows else None
+
+    def find_rows(self, dataset: str, column: str, values, filters: dict | None = None) -> dict[str, list[int]]:
+        """查詢 column 為 values 之一的列號（試算表列號，由小到大），可再以 filters {欄位: 值} 篩選。"""
+        values = list(dict.fromkeys(str(v) for v in values))
+        table = quote("rows_" + dataset)
+        extra = "".join(f" AND {quote(c)} = ?" for c in (filters or {}))
+        found: dict[str, list[int]] = {}
+        conn = self.connection()
+        for i in range(0, len(values), 500):
+            chunk = values[i:i + 500]
+            cur = conn.execute(
+                f"SELECT {quote(column)}, _row FROM {table} "
+                f"WHERE {quote(column)} IN ({','.join('?' * len(chunk))}){extra} ORDER BY _row",
+                (*chunk, *(filters or {}).values()),
+            )
+            for value, row in cur.fetchall():
+                found.setdefault(value, []).append(row)
+        return found
+
+    def update_cells(self, dataset: str, updates: list[tuple[int, str, str]]):
+        """把已寫回試算表的儲存格同步改到副本，updates 為 (列號, 欄位, 值)；不必整份重抓。"""
+        if not updates:
+            return
+        table = quote("rows_" + dataset)
+        with self._transaction() as conn:
+            for row, column, value in updates:
+                conn.execute(f"UPDATE {table} SET {quote(column)} = ? WHERE _row = ?", (str(value), row))
+            conn.execute(
+                "UPDATE replica_meta SET version = version + 1, rewrite_version = rewrite_version + 1 WHERE dataset = ?",
+                (dataset,),
+            )
+
+    def replace_all(self, dataset: str, header: list[str], rows: list[list], read_at: float | None = None) -> bool:
+        """
+        以整份分頁內容（不含表頭）覆蓋副本；內容沒變時不動資料也不升版本。回傳是否有變動。
+        read_at 為開始讀取試算表的時間（預設為現在）。
+        """
+        projected = self._project(dataset, header, rows)
+        columns = self._columns[dataset]
+        table = quote("rows_" + dataset)
+        now = time.time()
+        with self._transaction() as conn:
+            changed = self._rows(dataset, conn) != projected
+            if changed:
+                conn.execute(f"DELETE FROM {table}")
+                conn.executemany(
+                    f"INSERT INTO {table} (_row, {', '.join(quote(c) for c in columns)}) "
+                    f"VALUES (?, {', '.join('?' * len(columns))})",
+                    [(i + 2, *vals) for i, vals in enumerate(projected)],
+                )
+                conn.execute(
+                    "UPDATE replica_meta SET row_count = ?, version = version + 1, rewrite_version = rewrite_version + 1 "
+                    "WHERE dataset = ?",
+                    (len(projected), dataset),
+                )
+            conn.execute(
+                "UPDATE replica_meta SET synced_at = ?, full_synced_at = ?, read_at = ?, header_json = ? WHERE dataset = ?",
+                (now, now, now if read_at is None else read_at,
+                 json.dumps([str(h).strip() for h in header], ensure_ascii=False), dataset),
+            )
+        return changed
+
+    def append(self, dataset: str, rows: list[list], expected_row_count: int, read_at: float | None = None) -> int:
+        """
+        把試算表新增的列接在副本最後面（使用上次整份同步的表頭對應欄位）。
+        expected_row_count 為讀取試算表時副本的列數，期間被別的同步改過就放棄（回傳 -1）。
+        read_at 為開始讀取試算表的時間（預設為現在）。
+        """
+        meta = self.meta(dataset)
+        projected = self._project(dataset, meta["header"] or self._columns[dataset], rows)
+        columns = self._columns[dataset]
+        with self._transaction() as conn:
+            current = conn.execute(
+                "SELECT row_count FROM replica_meta WHERE dataset = ?", (dataset,)
+            ).fetchone()[0]
+            if current != expected_row_count:
+                return -1
+            if projected:
+                conn.executemany(
+                    f"INSERT INTO {quote('rows_' + dataset)} (_row, {', '.join(quote(c) for c in columns)}) "
+                    f"VALUES (?, {', '.join('?' * len(columns))})",
+                    [(current + 2 + i, *vals) for i, vals in enumerate(projected)],
+                )
+                conn.execute(
+                    "UPDATE replica_meta SET row_count = row_count + ?, version = version + 1 WHERE dataset = ?",
+                    (len(projected), dataset),
+                )
+            now = time.time()
+            conn.execute("UPDATE replica_meta SET synced_at = ?, read_at = ? WHERE dataset = ?",
+                         (now, now if read_at is None else read_at, dataset))
+        return len(projected)
+
+    def sync_from_worksheet(self, dataset: str, ws, full: bool = False) -> str:
+        """
+        從 gspread worksheet 同步副本，回傳實際做了哪一種同步：
+        - "tail"：只抓上次最後一列（用來比對）之後的範圍，接到副本後面
+        - "full"：第一次同步、指定 full、或表頭／識別欄／最後一列對不上（上方有刪改）時整份重抓
+        """
+        meta = self.meta(dataset)
+        read_at = time.time()
+        if full or meta["synced_at"] is None or not meta["header"]:
+            values = ws.get_all_values()
+            header = values[0] if values else self._columns[dataset]
+            self.replace_all(dataset, header, values[1:], read_at=read_at)
+            return "full"
+
+        n = meta["row_count"]
+        header = meta["header"]
+        last_col = _col_letter(len(header))
+        if n == 0:
+            # 只有表頭：從第 2 列開始抓，表頭本身也順便確認
+            values = ws.get(f"A1:{last_col}")
+            if not values or _trim_header(values[0]) != _trim_header(header):
+                return self.sync_from_worksheet(dataset, ws, full=True)
+            new_rows = values[1:]
+        else:
+            # 一次 batch_get：表頭、從副本最後一列（試算表第 n+1 列）開始的範圍（第一列拿來比對）、識別欄
+            key = self._keys.get(dataset)
+            ranges = [f"A1:{last_col}1", f"A{n + 1}:{last_col}"]
+            if key in header:
+                key_col = _col_letter(header.index(key) + 1)
+                ranges.append(f"{key_col}2:{key_col}{n + 1}")
+            head, values, *key_values = ws.batch_get(ranges)
+            if not head or _trim_header(head[0]) != _trim_header(header):
+                return self.sync_from_worksheet(dataset, ws, full=True)
+            if not values or self._project(dataset, header, values[:1])[0] != self.last_row(dataset):
+                return self.sync_from_worksheet(dataset, ws, full=True)
+            if key_values:
+                # API 會去掉尾端的空白儲存格，補回 n 列再比對
+                sheet_keys = [str(r[0]) if r else "" for r in key_values[0]]
+                sheet_keys += [""] * (n - len(sheet_keys))
+                if sheet_keys != self.column_values(dataset, key):
+                    return self.sync_from_worksheet(dataset, ws, full=True)
+            new_rows = values[1:]
+
+        if self.append(dataset, new_rows, expected_row_count=n, read_at=read_at) < 0:
+            return self.sync_from_worksheet(dataset, ws, full=True)
+        return "tail"
+
+    def read_frame(self, dataset: str, after: int = 0) -> pd.DataFrame:
+        """
+        讀出副本內容（依試算表列號排序），欄位為 register 時的欄位，值皆為字串。
+        after > 0 時只讀第 after 筆資料列之後的部分（增量同步後取出新增的列）。
+        """
+        where = f"WHERE _row > {int(after) + 1}" if after else ""
+        return pd.DataFrame(self._rows(dataset, where=where), columns=self._columns[dataset])
+
+    def read_changes(self, dataset: str, row_count: int, rewrite_version: int) -> tuple[dict, pd.DataFrame, bool]:
+        """
+        給已經讀過 row_count 筆、當時 rewrite_version 的快取用：在同一個讀取交易中取出 (meta, 列, 是否為增量)。
+        之後只有新增列時只回傳第 row_count 筆之後的列（增量）；既有列被改動過則回傳全部的列。
+        """
+        with self._transaction("DEFERRED") as conn:
+            meta = self.meta(dataset, conn)
+            incremental = meta["rewrite_version"] == rewrite_version and meta["row_count"] >= row_count
+            where = f"WHERE _row > {int(row_count) + 1}" if incremental else ""
+            rows = self._rows(dataset, conn, where=where)
+        return meta, pd.DataFrame(rows, columns=self._columns[dataset]), incremental
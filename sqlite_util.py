@@ -0,0 +1,49 @@
+"""
+SQLite 存取物件的共用部分：每條執行緒各自一個連線（WAL、autocommit），交易以 _transaction 明確控制。
+
+task_queue、sheet_replica、score_table、thumbnail_cache 的存取物件都繼承 SQLiteStore。
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+def quote(name: str) -> str:
+    """SQL 識別字（表名、欄名）加上雙引號；欄名是中文表頭，可能含空白或引號。"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class SQLiteStore:
+    """可在多條執行緒間共用，每條執行緒會自動取得自己的連線。"""
+
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        """取得目前執行緒專用的連線（autocommit，交易由 _transaction 明確控制）。"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # timeout：多個 process 共用同一個檔案時，等待對方交易結束而不是直接報錯
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self, mode: str = "IMMEDIATE"):
+        """
+        交易：正常結束 COMMIT，發生例外 ROLLBACK。
+        寫入用 IMMEDIATE（一開始就取得寫入鎖）；只讀不寫時用 DEFERRED，整段讀到同一個快照。
+        """
+        conn = self.connection()
+        conn.execute(f"BEGIN {mode}")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
@@ -0,0 +1,403 @@
+"""
+SQLite 背景佇列 (Durable Queue) 的儲存層。
+
+- WAL 模式：讀取（例如後台的待處理筆數）不會擋住寫入
+- 每條執行緒各自一個連線，不再靠全域鎖串行化所有操作
+- (status, next_attempt_at, created_ts) 複合索引，領取任務與計數只掃描仍在處理中的任務
+- 領取任務以 BEGIN IMMEDIATE 交易完成，多個 worker / process 共用同一個檔案也不會重複處理
+- 優先順序分道（即時單筆 > 申訴 > 整批）；排隊越久的任務優先權逐步提高，低優先的任務不會被餓死
+- 已結束（DONE / FAILED）的舊任務定期搬到封存檔並以 incremental vacuum 回收空間，佇列只保留進行中的任務
+"""
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlite_util import SQLiteStore
+
+DEFAULT_LEASE_SECONDS = 120  # 任務租約長度，worker 當掉後超過此時間任務會被其他 worker 接手
+
+# 優先順序分道：數字越小越先處理
+PRIORITY_INTERACTIVE = 0  # 糾察單筆評分（使用者正在等）
+PRIORITY_APPEAL = 1       # 申訴（有 3 天期限）
+PRIORITY_BULK = 2         # 整批登錄（垃圾檢查、晨掃）
+LANE_NAMES = {PRIORITY_INTERACTIVE: "即時評分", PRIORITY_APPEAL: "申訴", PRIORITY_BULK: "整批登錄"}
+DEFAULT_AGING_SECONDS = 30.0  # 每排隊這麼久，優先權提高一級（防止低優先任務餓死）
+
+ACTIVE_STATUSES = ("PENDING", "RETRY", "IN_PROGRESS")
+FINISHED_STATUSES = ("DONE", "FAILED")
+
+_TASK_COLUMNS = "id, task_type, created_ts, payload_json, status, attempts, last_error"
+
+
+def _row_to_task(row) -> dict:
+    task_id, task_type, created_ts, payload_json, status, attempts, last_error = row
+    try:
+        payload = json.loads(payload_json)
+    except Exception:
+        payload = {}
+    return {
+        "id": task_id,
+        "task_type": task_type,
+        "created_ts": created_ts,
+        "payload": payload,
+        "status": status,
+        "attempts": attempts,
+        "last_error": last_error,
+    }
+
+
+def _ensure_column(conn, table: str, column: str, decl: str):
+    """舊版資料庫缺欄位時補上（ALTER TABLE ADD COLUMN）。"""
+    cols = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in cols:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+class TaskQueue(SQLiteStore):
+    """task_queue.db 的存取物件。"""
+
+    def __init__(self, db_path: str, busy_timeout: float = 30.0, archive_path: str | None = None,
+                 aging_seconds: float = DEFAULT_AGING_SECONDS):
+        super().__init__(db_path, busy_timeout)
+        self.archive_path = archive_path or f"{os.path.splitext(db_path)[0]}_archive.db"
+        self.aging_seconds = aging_seconds
+        self._init_schema()
+
+    # ------------------------------------------
+    # 資料表
+    # ------------------------------------------
+    def _init_schema(self):
+        conn = self.connection()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # auto_vacuum 只能在建表前設定，舊檔案需要完整 VACUUM 一次才會生效
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_queue (
+                    id TEXT PRIMARY KEY,
+                    task_type TEXT NOT NULL,
+                    created_ts TEXT NOT NULL,
+                    payload_json TEXT NOT NULL,
+                    status TEXT NOT NULL,          -- PENDING / IN_PROGRESS / RETRY / DONE / FAILED
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    lease_owner TEXT,              -- 目前持有任務的 worker id
+                    lease_expires_at REAL,         -- 租約到期時間 (epoch 秒)
+                    next_attempt_at REAL,          -- 重試最早可執行時間 (epoch 秒)，NULL 表示立即
+                    priority INTEGER NOT NULL DEFAULT 0,  -- 優先順序分道（PRIORITY_*）
+                    enqueued_at REAL,              -- 入列時間 (epoch 秒)，用於計算等待時間與優先權老化
+                    claim_key REAL,                -- 領取順序 = enqueued_at + priority × aging_seconds，越小越先領取
+                    started_at REAL,               -- 第一次被領取的時間 (epoch 秒)
+                    finished_at REAL               -- 變成 DONE / FAILED 的時間 (epoch 秒)，封存以此計算保留期限
+                )
+            """)
+            _ensure_column(conn, "task_queue", "lease_owner", "TEXT")
+            _ensure_column(conn, "task_queue", "lease_expires_at", "REAL")
+            _ensure_column(conn, "task_queue", "next_attempt_at", "REAL")
+            _ensure_column(conn, "task_queue", "priority", "INTEGER NOT NULL DEFAULT 0")
+            _ensure_column(conn, "task_queue", "enqueued_at", "REAL")
+            _ensure_column(conn, "task_queue", "claim_key", "REAL")
+            _ensure_column(conn, "task_queue", "started_at", "REAL")
+            _ensure_column(conn, "task_queue", "finished_at", "REAL")
+            # 舊版任務沒有 enqueued_at：以 created_ts（UTC ISO 字串）換算，
+            # 不能當成 0，否則等於已等了 50 多年，會插到所有即時任務前面
+            conn.execute("UPDATE task_queue SET enqueued_at = (julianday(created_ts) - 2440587.5) * 86400.0 "
+                         "WHERE enqueued_at IS NULL")
+            conn.execute("UPDATE task_queue SET claim_key = enqueued_at + priority * ? WHERE claim_key IS NULL",
+                         (self.aging_seconds,))
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_task_queue_status_due "
+                "ON task_queue (status, next_attempt_at, created_ts)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_task_queue_started ON task_queue (started_at)")
+            # 只收進行中的任務：領取時依 claim_key 順序掃描，湊滿 limit 筆就停，不必排序整個待處理集合
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_task_queue_claim ON task_queue (claim_key, created_ts) "
+                "WHERE status IN ('PENDING', 'RETRY', 'IN_PROGRESS')"
+            )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS upload_checkpoints (
+                    content_hash TEXT PRIMARY KEY,  -- 照片內容 SHA-256
+                    file_id TEXT NOT NULL,          -- Drive file id
+                    link TEXT NOT NULL,
+                    filename TEXT,
+                    created_ts TEXT NOT NULL,
+                    task_id TEXT                    -- 上傳這張照片的任務，任務封存時一併刪除
+                )
+            """)
+            _ensure_column(conn, "upload_checkpoints", "task_id", "TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_checkpoints_task ON upload_checkpoints (task_id)")
+
+    # ------------------------------------------
+    # 任務
+    # ------------------------------------------
+    def enqueue(self, task_type: str, payload: dict, priority: int = PRIORITY_INTERACTIVE) -> str:
+        """將任務寫入佇列（持久化），回傳 task id。priority 為優先順序分道（PRIORITY_*）。"""
+        task_id = str(uuid.uuid4())
+        created_ts = datetime.utcnow().isoformat() + "Z"
+        # default=str：表單的日期欄位是 datetime.date，寫入試算表時本來就會轉成字串
+        payload_json = json.dumps(payload, ensure_ascii=False, default=str)
+        now = time.time()
+        self.connection().execute(
+            "INSERT INTO task_queue (id, task_type, created_ts, payload_json, status, attempts, last_error, "
+            "priority, enqueued_at, claim_key) VALUES (?, ?, ?, ?, 'PENDING', 0, NULL, ?, ?, ?)",
+            (task_id, task_type, created_ts, payload_json, int(priority), now,
+             now + int(priority) * self.aging_seconds)
+        )
+        return task_id
+
+    def claim(self, worker_id: str, limit: int = 1, max_attempts: int = 6,
+              lease_seconds: float = DEFAULT_LEASE_SECONDS) -> list[dict]:
+        """
+        原子性地領取最多 limit 筆任務（已到 next_attempt_at 的 PENDING / RETRY，或租約已過期的 IN_PROGRESS），
+        在同一個 BEGIN IMMEDIATE 交易中標記為 IN_PROGRESS 並寫入租約。
+        依「priority − 已等待秒數 / aging_seconds」由小到大領取：高優先分道先處理，
+        但低優先的任務每等 aging_seconds 秒就提高一級，一直有新的即時任務進來也不會被餓死。
+        這個順序與 enqueued_at + priority × aging_seconds 相同（與現在時間無關），入列時就存成 claim_key，
+        領取時指定走 idx_task_queue_claim 部分索引（沒有統計資料時 SQLite 會改用狀態索引再整批排序）。
+        回傳的 attempts 為本次領取前的嘗試次數。
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # 租約過期且已用完重試次數的任務直接標記為失敗，避免永遠卡在 IN_PROGRESS
+            conn.execute(
+                """
+                UPDATE task_queue
+                SET status = 'FAILED', lease_owner = NULL, lease_expires_at = NULL, finished_at = ?,
+                    last_error = COALESCE(last_error, 'lease expired')
+                WHERE status = 'IN_PROGRESS'
+                  AND (lease_expires_at IS NULL OR lease_expires_at < ?)
+                  AND attempts >= ?
+                """,
+                (now, now, max_attempts),
+            )
+            rows = conn.execute(
+                f"""
+                SELECT {_TASK_COLUMNS}
+                FROM task_queue INDEXED BY idx_task_queue_claim
+                WHERE status IN ('PENDING', 'RETRY', 'IN_PROGRESS')
+                  AND ((status IN ('PENDING', 'RETRY') AND (next_attempt_at IS NULL OR next_attempt_at <= ?))
+                       OR (status = 'IN_PROGRESS' AND (lease_expires_at IS NULL OR lease_expires_at < ?)))
+                  AND attempts < ?
+                ORDER BY claim_key ASC, created_ts ASC
+                LIMIT ?
+                """,
+                (now, now, max_attempts, max(1, int(limit))),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE task_queue SET status = 'IN_PROGRESS', attempts = attempts + 1, "
+                "lease_owner = ?, lease_expires_at = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                [(worker_id, now + lease_seconds, now, row[0]) for row in rows],
+            )
+        return [_row_to_task(row) for row in rows]
+
+    def renew_leases(self, worker_id: str, task_ids: list[str], lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        """心跳：延長此 worker 仍在處理中的任務租約。"""
+        if not task_ids:
+            return
+        expires = time.time() + lease_seconds
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE task_queue SET lease_expires_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = 'IN_PROGRESS'",
+                [(expires, task_id, worker_id) for task_id in task_ids],
+            )
+
+    def update_statuses(self, updates: list[tuple], worker_id: str | None = None) -> list[str]:
+        """
+        批次更新多筆任務狀態，updates 為 (task_id, status, attempts, last_error[, next_attempt_at])，
+        單一交易送出並釋放租約。next_attempt_at（epoch 秒）為 RETRY 任務最早可再領取的時間。
+        指定 worker_id 時，租約已被其他 worker 接手的任務不會被覆寫。回傳實際有更新的 task id。
+        """
+        if not updates:
+            return []
+        sql = ("UPDATE task_queue SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?, finished_at = ?, "
+               "lease_owner = NULL, lease_expires_at = NULL WHERE id = ?")
+        now = time.time()
+        params = []
+        for u in updates:
+            task_id, status, attempts, last_error = u[:4]
+            next_attempt_at = u[4] if len(u) > 4 else None
+            finished_at = now if status in FINISHED_STATUSES else None
+            params.append((status, attempts, last_error, next_attempt_at, finished_at, task_id))
+        if worker_id is not None:
+            sql += " AND lease_owner = ?"
+            params = [p + (worker_id,) for p in params]
+        updated = []
+        with self._transaction() as conn:
+            for p in params:
+                if conn.execute(sql, p).rowcount:
+                    updated.append(p[5])
+        return updated
+
+    def seconds_until_next_due(self, max_attempts: int = 6) -> float | None:
+        """距離最早一筆排程重試的任務到期還有幾秒；沒有等待中的任務回傳 None。"""
+        row = self.connection().execute(
+            "SELECT MIN(COALESCE(next_attempt_at, 0)) FROM task_queue "
+            "WHERE status IN ('PENDING', 'RETRY') AND attempts < ?",
+            (max_attempts,),
+        ).fetchone()
+        if not row or row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def pending_count(self) -> int:
+        """回傳目前尚未處理完的任務數（PENDING / RETRY / IN_PROGRESS）。"""
+        row = self.connection().execute(
+            f"SELECT COUNT(*) FROM task_queue WHERE status IN ({','.join('?' * len(ACTIVE_STATUSES))})",
+            ACTIVE_STATUSES,
+        ).fetchone()
+        return row[0] if row else 0
+
+    def lane_stats(self, window_seconds: float = 3600) -> list[dict]:
+        """
+        各優先順序分道的狀況（後台顯示用），每個分道一筆：
+        queued（等待中）、in_progress（處理中）、oldest_wait（等待中最久的已等幾秒）、
+        recent_started / avg_wait / max_wait（最近 window_seconds 秒內開始處理的任務數與其入列到開始的等待秒數）。
+        """
+        now = time.time()
+        conn = self.connection()
+        stats = {}
+
+        def lane(p):
+            return stats.setdefault(p, {"priority": p, "lane": LANE_NAMES.get(p, f"優先 {p}"), "queued": 0,
+                                        "in_progress": 0, "oldest_wait": 0.0, "recent_started": 0,
+                                        "avg_wait": 0.0, "max_wait": 0.0})
+
+        for p in LANE_NAMES:
+            lane(p)
+
+        for p, status, count, oldest in conn.execute(
+            "SELECT priority, status, COUNT(*), MIN(enqueued_at) FROM task_queue "
+            "WHERE status IN (?, ?, ?) GROUP BY priority, status",
+            ACTIVE_STATUSES,
+        ):
+            s = lane(p)
+            if status == "IN_PROGRESS":
+                s["in_progress"] += count
+            else:
+                s["queued"] += count
+                if oldest is not None:
+                    s["oldest_wait"] = max(s["oldest_wait"], now - oldest)
+        for p, count, avg_wait, max_wait in conn.execute(
+            "SELECT priority, COUNT(*), AVG(started_at - enqueued_at), MAX(started_at - enqueued_at) "
+            "FROM task_queue WHERE started_at >= ? AND enqueued_at IS NOT NULL GROUP BY priority",
+            (now - window_seconds,),
+        ):
+            s = lane(p)
+            s.update(recent_started=count, avg_wait=avg_wait or 0.0, max_wait=max_wait or 0.0)
+        return [stats[p] for p in sorted(stats)]
+
+    def active_payloads(self, task_type: str | None = None, done_since: float | None = None) -> list[dict]:
+        """
+        回傳進行中任務（PENDING / RETRY / IN_PROGRESS）的 payload，依建立時間排序；
+        可用 task_type 篩選。用於判斷暫存照片是否仍被引用，以及把還沒寫進試算表的資料疊加到畫面上。
+        指定 done_since（epoch 秒）時，在這之後才完成的 DONE 任務也一併回傳。
+        """
+        sql = f"SELECT payload_json FROM task_queue WHERE (status IN ({','.join('?' * len(ACTIVE_STATUSES))})"
+        params = list(ACTIVE_STATUSES)
+        if done_since is not None:
+            sql += " OR (status = 'DONE' AND finished_at >= ?)"
+            params.append(done_since)
+        sql += ")"
+        if task_type is not None:
+            sql += " AND task_type = ?"
+            params.append(task_type)
+        rows = self.connection().execute(sql + " ORDER BY created_ts", params).fetchall()
+        payloads = []
+        for (payload_json,) in rows:
+            try:
+                payloads.append(json.loads(payload_json))
+            except Exception:
+                continue
+        return payloads
+
+    # ------------------------------------------
+    # 封存與空間回收
+    # ------------------------------------------
+    def archive_finished(self, older_than_seconds: float, batch_size: int = 500) -> int:
+        """
+        把結束（DONE / FAILED）超過 older_than_seconds 的任務搬到封存檔 (archive_path)，
+        其照片上傳紀錄一併刪除，再以 incremental vacuum 歸還空出的頁面。
+        分批處理，避免長時間鎖住佇列。回傳搬移筆數。
+        """
+        cutoff = time.time() - older_than_seconds
+        # 舊版資料庫沒有 finished_at 的任務與上傳紀錄，退回以建立時間判斷
+        cutoff_ts = (datetime.utcnow() - timedelta(seconds=older_than_seconds)).isoformat() + "Z"
+        placeholders = ",".join("?" * len(FINISHED_STATUSES))
+        conn = self.connection()
+        conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+        moved = 0
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS archive.task_queue_archive (
+                    id TEXT PRIMARY KEY,
+                    task_type TEXT NOT NULL,
+                    created_ts TEXT NOT NULL,
+                    payload_json TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    archived_ts TEXT NOT NULL
+                )
+            """)
+            while True:
+                with self._transaction() as tx:
+                    ids = [row[0] for row in tx.execute(
+                        f"SELECT id FROM task_queue WHERE status IN ({placeholders}) "
+                        f"AND (finished_at < ? OR (finished_at IS NULL AND created_ts < ?)) LIMIT ?",
+                        (*FINISHED_STATUSES, cutoff, cutoff_ts, batch_size),
+                    )]
+                    if not ids:
+                        break
+                    id_list = ",".join("?" * len(ids))
+                    tx.execute(
+                        f"INSERT OR REPLACE INTO archive.task_queue_archive ({_TASK_COLUMNS}, archived_ts) "
+                        f"SELECT {_TASK_COLUMNS}, ? FROM task_queue WHERE id IN ({id_list})",
+                        (datetime.utcnow().isoformat() + "Z", *ids),
+                    )
+                    tx.execute(f"DELETE FROM task_queue WHERE id IN ({id_list})", ids)
+                    tx.execute(f"DELETE FROM upload_checkpoints WHERE task_id IN ({id_list})", ids)
+                moved += len(ids)
+                if len(ids) < batch_size:
+                    break
+            with self._transaction() as tx:
+                tx.execute("DELETE FROM upload_checkpoints WHERE task_id IS NULL AND created_ts < ?", (cutoff_ts,))
+        finally:
+            conn.execute("DETACH DATABASE archive")
+        if moved:
+            # incremental_vacuum 每個 step 只釋放一頁；executescript 會一路執行到完成
+            conn.executescript("PRAGMA incremental_vacuum;")
+            # WAL 模式下要 checkpoint 後主檔才會實際縮小
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return moved
+
+    # ------------------------------------------
+    # 照片上傳紀錄
+    # ------------------------------------------
+    def get_upload_checkpoints(self, hashes: list[str]) -> dict[str, tuple[str, str]]:
+        """查詢已上傳過的照片，回傳 {content_hash: (file_id, link)}。"""
+        hashes = list(dict.fromkeys(h for h in hashes if h))
+        found = {}
+        conn = self.connection()
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            cur = conn.execute(
+                f"SELECT content_hash, file_id, link FROM upload_checkpoints "
+                f"WHERE content_hash IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            found.update({h: (fid, link) for h, fid, link in cur.fetchall()})
+        return found
+
+    def save_upload_checkpoint(self, content_hash: str, file_id: str, link: str, filename: str,
+                               task_id: str | None = None):
+        """記錄已成功上傳的照片，重試或相同照片就不必再傳一次；task_id 的任務封存時這筆紀錄會被刪除。"""
+        self.connection().execute(
+            "INSERT OR REPLACE INTO upload_checkpoints (content_hash, file_id, link, filename, created_ts, task_id) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (content_hash, file_id, link, filename, datetime.utcnow().isoformat() + "Z", task_id),
+        )
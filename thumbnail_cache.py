@@ -0,0 +1,90 @@
+"""
+照片縮圖的本機快取（SQLite，依總大小上限做 LRU 淘汰）。
+
+worker 上傳照片時就把產生的縮圖放進來；查詢頁面第一次看到沒有縮圖的照片（舊資料、其他機器上傳的）
+才去 Drive 抓一次，之後同一張照片的顯示都直接讀本機，不再連外。
+目前總大小記在 thumbnail_usage，寫入時跟著增減，不必每次加總整張表。
+"""
+import sqlite3
+import time
+
+from sqlite_util import SQLiteStore
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+TOUCH_INTERVAL = 60.0  # 同一張縮圖短時間內重複讀取時不重寫 last_used，減少寫入
+
+
+class ThumbnailCache(SQLiteStore):
+    """縮圖快取。"""
+
+    def __init__(self, db_path: str, max_bytes: int = DEFAULT_MAX_BYTES, busy_timeout: float = 30.0):
+        super().__init__(db_path, busy_timeout)
+        self.max_bytes = max_bytes
+        conn = self.connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS thumbnails (
+                key TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_thumbnails_last_used ON thumbnails (last_used)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS thumbnail_usage (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total_bytes INTEGER NOT NULL
+            )
+        """)
+        # 舊檔案第一次開啟時加總一次既有縮圖
+        conn.execute("INSERT OR IGNORE INTO thumbnail_usage (id, total_bytes) "
+                     "SELECT 1, COALESCE(SUM(size), 0) FROM thumbnails")
+
+    def get_many(self, keys) -> dict[str, bytes]:
+        """一次取出多張縮圖，回傳 {key: bytes}（只含有快取的）。"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        conn = self.connection()
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            marks = ", ".join("?" * len(chunk))
+            found.update(conn.execute(f"SELECT key, data FROM thumbnails WHERE key IN ({marks})", chunk).fetchall())
+        if found:
+            now = time.time()
+            conn.executemany("UPDATE thumbnails SET last_used = ? WHERE key = ? AND last_used < ?",
+                             [(now, k, now - TOUCH_INTERVAL) for k in found])
+        return {k: bytes(v) for k, v in found.items()}
+
+    def put(self, key: str, data: bytes):
+        """存入縮圖；總大小超過上限時從最久沒用到的開始刪除。"""
+        if not data or len(data) > self.max_bytes:
+            return
+        with self._transaction() as conn:
+            old = conn.execute("SELECT size FROM thumbnails WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT INTO thumbnails (key, data, size, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET data = excluded.data, size = excluded.size, last_used = excluded.last_used",
+                (key, sqlite3.Binary(data), len(data), time.time()),
+            )
+            total = self._add_usage(conn, len(data) - (old[0] if old else 0))
+            if total > self.max_bytes:
+                self._evict(conn, total)
+
+    def _add_usage(self, conn, delta: int) -> int:
+        """調整目前總大小並回傳調整後的值。"""
+        conn.execute("UPDATE thumbnail_usage SET total_bytes = total_bytes + ? WHERE id = 1", (delta,))
+        return conn.execute("SELECT total_bytes FROM thumbnail_usage WHERE id = 1").fetchone()[0]
+
+    def _evict(self, conn, total: int):
+        # 一次多刪到上限的 90%，避免之後每次寫入都要淘汰
+        target = total - int(self.max_bytes * 0.9)
+        victims, freed = [], 0
+        for key, size in conn.execute("SELECT key, size FROM thumbnails ORDER BY last_used"):
+            if freed >= target:
+                break
+            victims.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM thumbnails WHERE key = ?", victims)
+        self._add_usage(conn, -freed)